@@ -189,7 +189,17 @@
 #####################################################################################################
 
 import os, sys, io
-import json
+import array
+import struct
+try:
+  import heapq
+except ImportError:
+  import uheapq as heapq
+
+try:
+  import ujson as json
+except ImportError:
+  import json
 import M5
 from M5 import *
 from unit import CardKBUnit
@@ -197,11 +207,32 @@ from hardware import *
 from unit import MIDIUnit
 from unit import Encoder8Unit
 import time
+import micropython
+from micropython import const
 from hardware import sdcard
 import _thread
 
+# Print the trace messages (0: the compiler drops them)
+DEBUG = const(0)
+
 ## GUI
 
+# Colors used often (0xRRGGBB)
+COLOR_BG    = const(0x222222)   # Screen background
+COLOR_WHITE = const(0xffffff)
+COLOR_CYAN  = const(0x00ccff)
+COLOR_AQUA  = const(0x00ffcc)
+COLOR_PINK  = const(0xff8080)
+COLOR_RED   = const(0xff4040)
+
+# Label color pairs (fore, back), None: background not changed
+COLORS_LABEL = (COLOR_AQUA, COLOR_BG)
+COLORS_VALUE = (COLOR_WHITE, COLOR_BG)
+COLORS_MENU = (COLOR_PINK, COLOR_BG)
+COLORS_MENU_SELECTED = (COLOR_RED, 0x555555)
+COLORS_KEY = (COLOR_CYAN, None)
+COLORS_KEY_EDIT = (COLOR_RED, None)
+
 # Tile labels
 title_smf = None
 title_smf_params = None
@@ -232,11 +263,147 @@ label_midi_parameter = None
 label_midi_parm_value = None
 label_midi_parm_title = None
 
+# Last text shown on each label {id(label): text}
+label_text_cache = {}
+
+# Labels to draw at label_draw_resume() while drawing is suspended {id(label): label}
+label_draw_pending = None
+
+# Set text to a label only if the text is changed
+def label_set_text(label, text):
+  global label_text_cache
+
+  key = id(label)
+  if label_text_cache.get(key) != text:
+    if label_draw_pending is None:
+      label.setText(text)
+    else:
+      label_draw_pending[key] = label
+
+    label_text_cache[key] = text
+
+
+# Last colors set to each label {id(label): (fore, back)}
+label_color_cache = {}
+
+# Set colors to a label only if the colors are changed
+#   colors: (Foreground (text) color, Background color (None: not change)), see COLORS_*
+def label_set_color(label, colors):
+  global label_color_cache
+
+  key = id(label)
+  if label_color_cache.get(key) != colors:
+    label_color_cache[key] = colors
+    if label_draw_pending is None:
+      label_draw_colors(label, colors)
+    else:
+      label_draw_pending[key] = label
+
+
+# Set colors (fore, back) to a label
+def label_draw_colors(label, colors):
+  if colors[1] is None:
+    label.setColor(colors[0])
+  else:
+    label.setColor(colors[0], colors[1])
+
+
+# Draw a label with its last colors and text if its drawing is pending
+def label_draw_flush(label):
+  key = id(label)
+  if label_draw_pending is None or label_draw_pending.pop(key, None) is None:
+    return
+
+  colors = label_color_cache.get(key)
+  if colors is not None:
+    label_draw_colors(label, colors)
+
+  text = label_text_cache.get(key)
+  if text is not None:
+    label.setText(text)
+
+
+# Suspend drawing labels, label_set_text() and label_set_color() only keep the last values
+def label_draw_suspend():
+  global label_draw_pending
+
+  if label_draw_pending is None:
+    label_draw_pending = {}
+
+
+# Resume drawing labels, draw each pending label once with its last colors and text
+def label_draw_resume():
+  global label_draw_pending
+
+  if label_draw_pending is not None:
+    for label in list(label_draw_pending.values()):
+      label_draw_flush(label)
+
+    label_draw_pending = None
+
+
+# Show or hide a label after drawing its pending text
+def label_set_visible(label, visible):
+  label_draw_flush(label)
+  label.setVisible(visible)
+
+
+# Create labels as global variables, the variable name is also the label name
+#   label_defs: ((global variable name, x, y, foreground color),...), background color is COLOR_BG
+def create_labels(label_defs):
+  new_label = Widgets.Label
+  font = Widgets.FONTS.DejaVu18
+  labels = globals()
+  for (name, x, y, fore) in label_defs:
+    labels[name] = new_label(name, x, y, 1.0, fore, COLOR_BG, font)
+
+
+# Zero padded 3 digits strings of 0..999 to show numbers without formatting
+num3_strs = tuple(['{:03d}'.format(n) for n in range(1000)])
+
+# Get a zero padded 3 digits string of a number
+def num3_str(n):
+  return num3_strs[n] if 0 <= n and n <= 999 else '{:03d}'.format(n)
+
+
+# Zero padded 2 digits strings of 0..99
+num2_strs = tuple(['{:02d}'.format(n) for n in range(100)])
+
+# Get a zero padded 2 digits string of a number
+def num2_str(n):
+  return num2_strs[n] if 0 <= n and n <= 99 else '{:02d}'.format(n)
+
+
+# Signed 2 digits strings of -99..+99
+sign3_strs = tuple(['{:0=+3d}'.format(n) for n in range(-99, 100)])
+
+# Get a signed 2 digits string of a number
+def sign3_str(n):
+  return sign3_strs[n + 99] if -99 <= n and n <= 99 else '{:0=+3d}'.format(n)
+
+
+# SMF player speed strings of x0.1..x5.0
+speed_strs = tuple(['x{:3.1f}'.format(n / 10) for n in range(51)])
+
+# Get a SMF player speed string
+def speed_str(f):
+  n = int(f * 10 + 0.5)
+  return speed_strs[n] if 1 <= n and n <= 50 and abs(f * 10 - n) < 0.01 else 'x{:3.1f}'.format(f)
+
+
 # I2C
 i2c0 = None                 # I2C object
 
 # 8encoders unit
+ENC8_I2C_ADDR = 0x41        # I2C address of 8encoder
+ENC8_REG_COUNTER = 0x00     # Counter registers of 8 encoders (int32 little endian each)
+ENC8_REG_BUTTON = 0x50      # Button registers of 8 encoders (0: pressed)
 encoder8_0 = None           # 8encoder object
+enc_counter_buf = bytearray(32)             # Counters read at once
+enc_button_buf = bytearray(8)               # Buttons read at once
+enc_bulk_read = False       # Read all counters and buttons at once (True) or each encoder (False)
+ENC_POLL_INTERVAL = 10      # Interval to update M5 and read the encoders in msec (the unit has no interrupt line)
+enc_poll_time = 0           # Last time the encoders were read in ticks_ms
 enc_button_ch = [False]*8   # Previous status of 8 push switches (on:True, off:False)
 enc_slide_switch = None     # 8encoder slide switch status (on:True, off:False)
 
@@ -275,7 +442,9 @@ enc_midi_set_ctrl  = MIDI_SET_FILE_NOP      # Currnet MIDI IN setting file opera
 # Effector control parameters
 enc_parameter_info = None                   # Information to change program task for the effector controle menu
                                             # Data definition is in setup(), see setup(). 
-enc_total_parameters = 0                    # Sum of enc_parameter_info[*]['params'] array size, see setup()
+enc_total_parameters = 0                    # Number of the effector parameters (enc_parameter_table size), see setup()
+enc_parameter_table = ()                    # Flat parameter definitions of each parameter number, see setup()
+                                            #   (title, label, key, parameter index in the effector, MAX, DECADE, set_smf, set_midi)
 EFFECTOR_PARM_INIT  = 0                     # Initial parameter index
 enc_parm = EFFECTOR_PARM_INIT               # Current parameter index
 
@@ -291,11 +460,16 @@ synth_0 = None                              # Unit-MIDI synthesizer object
 
 # MIDI-IN player
 midi_in_settings = []                       # MIDI IN settings for each channel, see setup()
+MIDI_IN_CHANNEL_INIT = (('program', 0), ('gmbank', 0), ('reverb', (0,0,0)), ('chorus', (0,0,0,0)), ('vibrate', (0,0,0)))
+                                            # Initial MIDI IN settings of a channel (key, value), tuple values are kept in bytearrays
                                             # Each channel has following data structure
-                                            #     {'program':0, 'gmbank':0, 'reverb':[0,0,0], 'chorus':[0,0,0,0], 'vibrate':[0,0,0]}
+                                            #     {'program':0, 'gmbank':0, 'reverb':bytearray(3), 'chorus':bytearray(4), 'vibrate':bytearray(3)}
                                             #     {'program':PROGRAM, 'gmbank':GM BANK, 'reverb':[PROGRAM,LEVEL,FEEDBACK], 'chorus':[PROGRAM,LEVEL,FEEDBACK,DELAY], 'vibrate':[RATE,DEPTH,DELAY]}
 midi_in_ch = 0                              # MIDI IN channel to edit
 midi_in_file_path = '/sd//SYNTH/MIDIUNIT/'  # MIDI IN setting files path
+MIDI_IN_SET_BIN_VERSION = 1                 # Binary copy of a MIDI IN setting file: version byte
+MIDI_IN_SET_BIN_CHANNEL = '<12B'            # Binary copy of a MIDI IN setting file: program, gmbank, reverb x3, chorus x4, vibrate x3 of a channel
+MIDI_IN_SET_BIN_SIZE = 1 + 16 * 12          # Binary copy of a MIDI IN setting file: file size
 midi_in_set_num = 0                         # MIDI IN setting file number to load/save
 
 # MIDI master volume
@@ -315,11 +489,19 @@ smf_gmbank = 0                              # GM bank number (normally 0, option
 #smf_gmbank = 127
 smf_transpose = 0                           # Key transpose for SMF player
                                             # Effector settings for SMF player
-smf_settings = {'reverb':[0,0,0], 'chorus': [0,0,0,0], 'vibrate': [0,0,0]}
+smf_settings = {'reverb':bytearray(3), 'chorus': bytearray(4), 'vibrate': bytearray(3)}
+smf_effector_sent = {}                      # Effector values last sent to all MIDI channels ({'reverb': bytes,...}, None: unknown)
 
 # MIDI IN/OUT
 midi_uart = False                           # MIDI UART object of Unit-MIDI
 midi_received = False                       # Received MIDI IN data or not
+MIDI_IN_RING_SIZE = 512                     # MIDI IN ring buffer size (power of 2)
+midi_in_ring = bytearray(MIDI_IN_RING_SIZE) # MIDI IN ring buffer filled by the UART IRQ
+midi_in_ring_mv = memoryview(midi_in_ring)
+midi_in_ring_head = 0                       # Next index in the ring buffer to send
+midi_in_ring_tail = 0                       # Next index in the ring buffer to receive
+midi_in_ring_full = False                   # Data is left in the UART as the ring buffer was full
+midi_in_irq = False                         # Receive MIDI IN with the UART IRQ or polling
 
 ##### MIDI Sequencer Data Structure #####
 
@@ -432,6 +614,10 @@ seq_score = None
 seq_score_sign = None
 seq_parm_repeat = None
 
+# Signs on the score by time {<Signs on time>: <sign in seq_score_sign>} (rebuilt after the signs are edited)
+seq_score_sign_by_time = None
+seq_score_sign_by_time_list = None     # seq_score_sign which the dict is made from
+
 # SEQUENCER title labels
 title_seq_track1 = None
 title_seq_track2 = None
@@ -456,8 +642,9 @@ label_seq_program2 = None
 # Display mode to draw note on sequencer
 SEQ_NOTE_DISP_NORMAL = 0
 SEQ_NOTE_DISP_HIGHLIGHT = 1
-seq_note_color = [[0x00ff88,0x8888ff], [0xff4040,0xffff00]]   # Note colors [frame,fill] for each display mode
+seq_note_color = [[0x00ff88,0x8888ff], [COLOR_RED,0xffff00]]   # Note colors [frame,fill] for each display mode
 seq_draw_area = [[20,40,319,129],[20,150,319,239]]      # Display area for each track
+seq_velocity_height = [[int((area[3] - area[1] - 2) * velo / 127) for velo in range(128)] for area in seq_draw_area]   # Velocity bar height for each track
 
 # Set up the sequencer
 def setup_sequencer():
@@ -468,20 +655,21 @@ def setup_sequencer():
   global seq_score_sign
 
   # Initialize the sequencer channels
-  seq_channel = []
-  for ch in range(16):
-    seq_channel.append({'gmbank': smf_gmbank, 'program': ch, 'volume': 100})
+  channel_template = {'gmbank': smf_gmbank, 'program': 0, 'volume': 100}
+  seq_channel = [dict(channel_template, program = ch) for ch in range(16)]
 
   # Clear score
   seq_score = []
   seq_score_sign = []
 
-  # SEQUENCER title labels
-  title_seq_track1        = Widgets.Label('title_seq_track1', 0, 20, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  title_seq_track2        = Widgets.Label('title_seq_track2', 0, 131, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  title_seq_file          = Widgets.Label('title_seq_file', 0, 0, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  title_seq_time          = Widgets.Label('title_seq_time', 100, 0, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  title_seq_master_volume = Widgets.Label('title_seq_master_volume', 230, 0, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
+  # SEQUENCER title labels: (global variable name, x, y, foreground color)
+  create_labels((
+      ('title_seq_track1', 0, 20, COLOR_CYAN),
+      ('title_seq_track2', 0, 131, COLOR_CYAN),
+      ('title_seq_file', 0, 0, COLOR_CYAN),
+      ('title_seq_time', 100, 0, COLOR_CYAN),
+      ('title_seq_master_volume', 230, 0, COLOR_CYAN),
+    ))
 
   title_seq_track1.setText('CH')
   title_seq_track2.setText('CH')
@@ -495,43 +683,45 @@ def setup_sequencer():
   title_seq_time.setVisible(False)
   title_seq_master_volume.setVisible(False)
 
-  # SEQUENCER data labels
-  label_seq_track1        = Widgets.Label('label_seq_track1', 30, 20, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_track2        = Widgets.Label('label_seq_track2', 30, 131, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_key1          = Widgets.Label('label_seq_key1', 57, 20, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_key2          = Widgets.Label('label_seq_key2', 57, 131, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_file          = Widgets.Label('label_seq_file', 40, 0, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_file_op       = Widgets.Label('label_seq_file_op', 80, 0, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_time          = Widgets.Label('label_seq_time', 140, 0, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_master_volume = Widgets.Label('label_seq_master_volume', 280, 0, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_parm_name     = Widgets.Label('label_seq_parm_name', 215, 20, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_parm_value    = Widgets.Label('label_seq_parm_value', 280, 20, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_program1      = Widgets.Label('label_seq_program1', 100, 20, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_seq_program2      = Widgets.Label('label_seq_program2', 100, 131, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-
-  label_seq_track1.setText('{:02d}'.format(seq_track_midi[0]+1))
-  label_seq_track2.setText('{:02d}'.format(seq_track_midi[1]+1))
-  label_seq_key1.setText(seqencer_key_name(seq_control['key_cursor'][0]))
-  label_seq_key1.setColor(0xff4040 if seq_edit_track == 0 else 0x00ccff)
-  label_seq_key2.setText(seqencer_key_name(seq_control['key_cursor'][1]))
-  label_seq_key2.setColor(0xff4040 if seq_edit_track == 1 else 0x00ccff)
-  label_seq_file.setText('{:03d}'.format(seq_file_number))
-  label_seq_file_op.setText(seq_file_ctrl_label[seq_file_ctrl])
-  label_seq_time.setText('{:03d}/{:03d}'.format(seq_control['time_cursor'],int(seq_control['time_cursor']/seq_control['time_per_bar']) + 1))
-  label_seq_master_volume.setText('{:02d}'.format(master_volume))
+  # SEQUENCER data labels: (global variable name, x, y, foreground color)
+  create_labels((
+      ('label_seq_track1', 30, 20, COLOR_WHITE),
+      ('label_seq_track2', 30, 131, COLOR_WHITE),
+      ('label_seq_key1', 57, 20, COLOR_CYAN),
+      ('label_seq_key2', 57, 131, COLOR_CYAN),
+      ('label_seq_file', 40, 0, COLOR_WHITE),
+      ('label_seq_file_op', 80, 0, COLOR_CYAN),
+      ('label_seq_time', 140, 0, COLOR_WHITE),
+      ('label_seq_master_volume', 280, 0, COLOR_WHITE),
+      ('label_seq_parm_name', 215, 20, COLOR_CYAN),
+      ('label_seq_parm_value', 280, 20, COLOR_WHITE),
+      ('label_seq_program1', 100, 20, COLOR_WHITE),
+      ('label_seq_program2', 100, 131, COLOR_WHITE),
+    ))
+
+  label_set_text(label_seq_track1, num2_str(seq_track_midi[0]+1))
+  label_set_text(label_seq_track2, num2_str(seq_track_midi[1]+1))
+  label_set_text(label_seq_key1, seqencer_key_name(seq_control['key_cursor'][0]))
+  label_set_color(label_seq_key1, COLORS_KEY_EDIT if seq_edit_track == 0 else COLORS_KEY)
+  label_set_text(label_seq_key2, seqencer_key_name(seq_control['key_cursor'][1]))
+  label_set_color(label_seq_key2, COLORS_KEY_EDIT if seq_edit_track == 1 else COLORS_KEY)
+  label_set_text(label_seq_file, num3_str(seq_file_number))
+  label_set_text(label_seq_file_op, seq_file_ctrl_label[seq_file_ctrl])
+  label_set_text(label_seq_time, num3_str(seq_control['time_cursor']) + '/' + num3_str(int(seq_control['time_cursor']/seq_control['time_per_bar']) + 1))
+  label_set_text(label_seq_master_volume, num2_str(master_volume))
 
   ch = seq_track_midi[0]
   prg = get_gm_program_name(seq_control['gmbank'][ch], seq_control['program'][ch])
   prg = prg[:9]
-  label_seq_program1.setText(prg)
+  label_set_text(label_seq_program1, prg)
 
   ch = seq_track_midi[1]
   prg = get_gm_program_name(seq_control['gmbank'][ch], seq_control['program'][ch])
   prg = prg[:9]
-  label_seq_program2.setText(prg)
+  label_set_text(label_seq_program2, prg)
   
-  label_seq_parm_name.setText(seq_parameter_names[seq_parm])
-  label_seq_parm_value.setText('')
+  label_set_text(label_seq_parm_name, seq_parameter_names[seq_parm])
+  label_set_text(label_seq_parm_value, '')
 
   label_seq_track1.setVisible(False)
   label_seq_track2.setVisible(False)
@@ -555,8 +745,9 @@ def sequencer_save_file():
   fpath = seq_file_path + 'SEQSC{:0=3d}.json'.format(seq_file_number)
   try:
     print('SAVE SEQ:', fpath)
+    json_text = json.dumps({'channel': seq_channel, 'control': seq_control, 'score': seq_score, 'sign': seq_score_sign}, separators=(',', ':'))
     with open(fpath, 'w') as f:
-      json.dump({'channel': seq_channel, 'control': seq_control, 'score': seq_score, 'sign': seq_score_sign}, f)
+      f.write(json_text)
 
     f.close()
     print('SAVED')
@@ -575,11 +766,10 @@ def sequencer_load_file():
   rdjson = None
   fpath = seq_file_path + 'SEQSC{:0=3d}.json'.format(seq_file_number)
   try:
+    # Parse from the file stream not to hold the whole text and the parsed score in the memory at the same time
     with open(fpath, 'r') as f:
       seq_data = json.load(f)
 
-    f.close()
-
     seq_show_cursor(0, False, False)
     seq_show_cursor(1, False, False)
 
@@ -612,7 +802,7 @@ def sequencer_load_file():
       seq_control = {'tempo': 120, 'mini_note': 4, 'time_per_bar': 4, 'disp_time': [0,12], 'disp_key': [[57,74],[57,74]], 'time_cursor': 0, 'key_cursor': [60,60], 'program':[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15], 'gmbank':[0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0]}
 
     if 'channel' in seq_data.keys():
-      if not seq_data['channel'] is None:
+      if seq_data['channel'] is not None:
         seq_channel = seq_data['channel']
         for ch in range(16):
           if not 'gmbank' in seq_channel[ch]:
@@ -626,18 +816,17 @@ def sequencer_load_file():
     enc_slide_switch = None
     sequencer_draw_keyboard(0)
     sequencer_draw_keyboard(1)
-    sequencer_draw_track(0)
-    sequencer_draw_track(1)
+    sequencer_draw_all()
     sequencer_draw_playtime(0)
     sequencer_draw_playtime(1)
     seq_show_cursor(0, True, True)
     seq_show_cursor(1, True, True)
 
     disp = 'NON'
-    if not seq_parm_repeat is None:
+    if seq_parm_repeat is not None:
       rept = sequencer_get_repeat_control(seq_parm_repeat)
       disp = 'NON'
-      if not rept is None:
+      if rept is not None:
         if rept['loop']:
           disp = 'LOP'
         elif rept['skip']:
@@ -645,16 +834,16 @@ def sequencer_load_file():
         elif rept['repeat']:
           disp = 'RPT'
 
-    label_seq_parm_value.setText(disp)
+    label_set_text(label_seq_parm_value, disp)
 
     for trk in range(2):
       ch = seq_track_midi[trk]
       prg = get_gm_program_name(seq_control['gmbank'][ch], seq_control['program'][ch])
       prg = prg[:9]
       if trk == 0:
-        label_seq_program1.setText(prg)
+        label_set_text(label_seq_program1, prg)
       else:
-        label_seq_program2.setText(prg)
+        label_set_text(label_seq_program2, prg)
 
       send_all_sequencer_settings()
 
@@ -670,25 +859,116 @@ def seqencer_key_name(key_num):
   return names[key_num % 12] + ('' if octave < 0 else str(octave))
 
 
+# Index of the first value equal or larger than val in a sorted list
+#   key: Compare values[i][key] instead of values[i] (None: compare values[i])
+def bisect_left(values, val, key = None):
+  lo = 0
+  hi = len(values)
+  while lo < hi:
+    mid = (lo + hi) >> 1
+    if (values[mid] if key is None else values[mid][key]) < val:
+      lo = mid + 1
+    else:
+      hi = mid
+
+  return lo
+
+
+# Index of the first score at note-on time equal or later than time
+def sequencer_score_index(note_on_time):
+  global seq_score
+  return bisect_left(seq_score, note_on_time, 'time')
+
+
+# Per MIDI channel index of the score (rebuilt after the score is edited)
+#   seq_index[channel]: [(<Note on time>, <score>, [<note_data of the channel>, ..]), ..] in time order
+#   seq_index_times[channel]: [<Note on time>, ..] of seq_index[channel]
+#   seq_index_max_duration[channel]: Maximum duration of the notes in the channel
+#   seq_index_notes[channel]: Notes of the channel in arrays to draw
+#     (note_start, note_nums, durations, velocities, note_refs)
+#     Notes of seq_index[channel][i] are from note_start[i] to note_start[i+1]-1.
+#     note_refs is the list of note_data to find the cursor note.
+seq_index = None
+seq_index_times = None
+seq_index_max_duration = None
+seq_index_notes = None
+seq_index_score = None          # seq_score which the index is made from
+
+# Clear the score index to rebuild it
+def sequencer_index_invalidate():
+  global seq_index
+  seq_index = None
+
+
+# Get the score index of a MIDI channel
+#   Returns (seq_index[channel], seq_index_times[channel], seq_index_max_duration[channel], seq_index_notes[channel])
+def sequencer_get_index(channel):
+  global seq_score, seq_index, seq_index_times, seq_index_max_duration, seq_index_notes, seq_index_score
+
+  # Rebuild the index
+  if seq_index is None or not seq_index_score is seq_score:
+    seq_index = [[] for ch in range(16)]
+    seq_index_max_duration = [0] * 16
+    for score in seq_score:
+      notes_per_channel = {}
+      for note_data in score['notes']:
+        notes_per_channel.setdefault(note_data['channel'], []).append(note_data)
+        if note_data['duration'] > seq_index_max_duration[note_data['channel']]:
+          seq_index_max_duration[note_data['channel']] = note_data['duration']
+
+      for ch, notes in notes_per_channel.items():
+        seq_index[ch].append((score['time'], score, notes))
+
+    seq_index_times = [[entry[0] for entry in seq_index[ch]] for ch in range(16)]
+
+    # Notes data arrays
+    seq_index_notes = []
+    for ch in range(16):
+      note_start = array.array('H', [0])
+      note_nums = array.array('B')
+      durations = array.array('H')
+      velocities = array.array('B')
+      note_refs = []
+      for entry in seq_index[ch]:
+        for note_data in entry[2]:
+          note_nums.append(note_data['note'])
+          durations.append(note_data['duration'])
+          velocities.append(note_data['velocity'])
+          note_refs.append(note_data)
+
+        note_start.append(len(note_refs))
+
+      seq_index_notes.append((note_start, note_nums, durations, velocities, note_refs))
+
+    seq_index_score = seq_score
+
+  return (seq_index[channel], seq_index_times[channel], seq_index_max_duration[channel], seq_index_notes[channel])
+
+
 # Find note
 def sequencer_find_note(track, seq_time, seq_note):
   global seq_track_midi, seq_score
 
   channel = seq_track_midi[track]
-  for score in seq_score:
-    note_on_tm = score['time']
-    note_off_max = note_on_tm + score['max_duration']
-    if note_on_tm <= seq_time and seq_time <= note_off_max:
-      for note_data in score['notes']:
-        if note_data['channel'] == channel and note_data['note'] == seq_note:
-          if note_on_tm + note_data['duration'] > seq_time:
-            return (score, note_data)
+  channel_index, channel_times, channel_max_duration, channel_notes = sequencer_get_index(channel)
+
+  # Only the scores starting in the maximum duration before the time can have the note
+  for idx in range(bisect_left(channel_times, seq_time - channel_max_duration + 1), len(channel_index)):
+    note_on_tm = channel_times[idx]
+    if note_on_tm > seq_time:
+      break
+
+    score = channel_index[idx][1]
+    for note_data in channel_index[idx][2]:
+      if note_data['note'] == seq_note and note_on_tm + note_data['duration'] > seq_time:
+        return (score, note_data)
 
   return None
 
 
 # Update maximum duration
 def sequencer_duration_update(score):
+  sequencer_index_invalidate()
   max_dur = 0
   for note_data in score['notes']:
     max_dur = max(max_dur, note_data['duration'])
@@ -698,6 +978,8 @@ def sequencer_duration_update(score):
 
 # Delete a note
 def sequencer_delete_note(score, note_data):
+  sequencer_index_invalidate()
+  sequencer_request_draw_channel(note_data['channel'], score['time'], score['time'] + note_data['duration'])
   score['notes'].remove(note_data)
   if len(score['notes']) == 0:
     seq_score.remove(score)
@@ -706,48 +988,42 @@ def sequencer_delete_note(score, note_data):
 
 
 # Add new note
+#   velocity: Note velocity (-1: same as the neighbor note at the same time, or 127 for a new time)
 def sequencer_new_note(channel, note_on_time, note_key, velocity = -1, duration = 1):
   global seq_score, seq_cursor_note
 
-  sc = 0
-  scores = len(seq_score)
-  while sc < scores:
-    # Add the note to the existing score
+  sequencer_index_invalidate()
+  sequencer_request_draw_channel(channel, note_on_time, note_on_time + duration)
+  sc = sequencer_score_index(note_on_time)
+  if velocity > 127:
+    velocity = 127
+
+  # Add the note to the existing score
+  if sc < len(seq_score) and seq_score[sc]['time'] == note_on_time:
     current = seq_score[sc]
-    if current['time'] == note_on_time:
-      # Inset new note at sorted order by key
-      nt = 0
-      notes_len = len(current['notes'])
-      for nt in range(notes_len):
-        if current['notes'][nt]['note'] > note_key:
-          current['notes'].insert(nt, {'channel': channel, 'note': note_key, 'velocity': max(velocity, current['notes'][nt]['velocity']), 'duration': duration})
-          seq_cursor_note = current['notes'][nt]
-          if duration > seq_score[sc]['max_duration']:
-            seq_score[sc]['max_duration'] = duration
-
-          return (current, seq_cursor_note)
-
-      # New note is the highest tone
-      current['notes'].append({'channel': channel, 'note': note_key, 'velocity': max(velocity, current['notes'][notes_len-1]['velocity']), 'duration': duration})
-      seq_cursor_note = current['notes'][len(current['notes']) - 1]
-      if duration > seq_score[sc]['max_duration']:
-        seq_score[sc]['max_duration'] = duration
-
-      return (current, seq_cursor_note)
-
-    # Insert the note as new score at new note-on time
-    elif current['time'] > note_on_time:
-      seq_score.insert(sc, {'time': note_on_time, 'max_duration': duration, 'notes': [{'channel': channel, 'note': note_key, 'velocity': max(velocity, 127), 'duration': duration}]})
-      current = seq_score[sc]
-      seq_cursor_note = current['notes'][0]
-      return (current, seq_cursor_note)
-
-    # Next note on time
-    sc = sc + 1
-
-  # Append the note as new latest note-on time
-  seq_score.append({'time': note_on_time, 'max_duration': duration, 'notes': [{'channel': channel, 'note': note_key, 'velocity': max(velocity, 127), 'duration': duration}]})
-  current = seq_score[len(seq_score) - 1]
+
+    # Inset new note at sorted order by key
+    notes_len = len(current['notes'])
+    for nt in range(notes_len):
+      if current['notes'][nt]['note'] > note_key:
+        current['notes'].insert(nt, {'channel': channel, 'note': note_key, 'velocity': velocity if velocity >= 0 else current['notes'][nt]['velocity'], 'duration': duration})
+        seq_cursor_note = current['notes'][nt]
+        if duration > current['max_duration']:
+          current['max_duration'] = duration
+
+        return (current, seq_cursor_note)
+
+    # New note is the highest tone
+    current['notes'].append({'channel': channel, 'note': note_key, 'velocity': velocity if velocity >= 0 else current['notes'][notes_len-1]['velocity'], 'duration': duration})
+    seq_cursor_note = current['notes'][len(current['notes']) - 1]
+    if duration > current['max_duration']:
+      current['max_duration'] = duration
+
+    return (current, seq_cursor_note)
+
+  # Insert the note as new score at new note-on time
+  seq_score.insert(sc, {'time': note_on_time, 'max_duration': duration, 'notes': [{'channel': channel, 'note': note_key, 'velocity': velocity if velocity >= 0 else 127, 'duration': duration}]})
+  current = seq_score[sc]
   seq_cursor_note = current['notes'][0]
   return (current, seq_cursor_note)
 
@@ -756,7 +1032,7 @@ def sequencer_new_note(channel, note_on_time, note_key, velocity = -1, duration
 def sequencer_change_midi_channel(delta):
   global seq_edit_track, seq_track_midi, seq_cursor_note
 
-  channel = (seq_track_midi[seq_edit_track] + delta) % 16
+  channel = (seq_track_midi[seq_edit_track] + delta) & 15
   seq_track_midi[seq_edit_track] = channel
   
   seq_show_cursor(seq_edit_track, False, False)
@@ -767,11 +1043,11 @@ def sequencer_change_midi_channel(delta):
   prg = prg[:9]
 
   if   seq_edit_track == 0:
-    label_seq_track1.setText('{:02d}'.format(seq_track_midi[0]+1))
-    label_seq_program1.setText(prg)
+    label_set_text(label_seq_track1, num2_str(seq_track_midi[0]+1))
+    label_set_text(label_seq_program1, prg)
   elif seq_edit_track == 1:
-    label_seq_track2.setText('{:02d}'.format(seq_track_midi[1]+1))
-    label_seq_program2.setText(prg)
+    label_set_text(label_seq_track2, num2_str(seq_track_midi[1]+1))
+    label_set_text(label_seq_program2, prg)
 
 
 # Change time span to display score
@@ -785,8 +1061,7 @@ def sequencer_timespan(delta):
   seq_show_cursor(0, False, False)
   seq_show_cursor(1, False, False)
   seq_control['disp_time'][1] = end
-  sequencer_draw_track(0)
-  sequencer_draw_track(1)
+  sequencer_draw_all()
   seq_show_cursor(0, True, True)
   seq_show_cursor(1, True, True)
 
@@ -800,6 +1075,7 @@ def sequencer_velocity(delta):
     return False
 
   # Change velocity of a note selected
+  sequencer_index_invalidate()
   note_data = seq_cursor_note[1]
   note_data['velocity'] = note_data['velocity'] + delta
   if note_data['velocity'] < 1:
@@ -813,6 +1089,7 @@ def sequencer_velocity(delta):
 def sequencer_insert_time(channel, time_cursor, ins_times):
   global seq_score
 
+  sequencer_index_invalidate()
   affected = False
   for sc_index in list(range(len(seq_score)-1,-1,-1)):
     score = seq_score[sc_index]
@@ -845,6 +1122,10 @@ def sequencer_insert_time(channel, time_cursor, ins_times):
               note_data['duration'] = note_data['duration'] + ins_times
               affected = True
 
+  # Redraw the tracks of the channel
+  if affected:
+    sequencer_request_draw_channel(channel)
+
   return affected
 
 
@@ -855,6 +1136,8 @@ def sequencer_delete_time(channel, time_cursor, del_times):
   # Can not delete
   if time_cursor <= 0:
     return False
+
+  sequencer_index_invalidate()
   
   # Adjust times to delete
   times_to_delete = time_cursor - del_times
@@ -901,6 +1184,10 @@ def sequencer_delete_time(channel, time_cursor, del_times):
   for note_time, note_key, velosity, duration in notes_moved:
     sequencer_new_note(channel, note_time, note_key, velosity, duration)
 
+  # Redraw the tracks of the channel
+  if affected:
+    sequencer_request_draw_channel(channel)
+
   return affected
 
 
@@ -908,48 +1195,59 @@ def sequencer_delete_time(channel, time_cursor, del_times):
 def sequencer_resolution(res_up):
   global seq_score, seq_score_sign
 
+  sequencer_index_invalidate()
+  sequencer_sign_index_invalidate()
+
   # Reolution up
   if res_up:
     for score in seq_score:
-      score['time'] = score['time'] * 2
+      score['time'] <<= 1
 
     for score in seq_score_sign:
-      score['time'] = score['time'] * 2
+      score['time'] <<= 1
 
-  # Resolution down
+  # Resolution down (only when all times are even)
   else:
+    if any(score['time'] & 1 for score in seq_score) or any(score['time'] & 1 for score in seq_score_sign):
+      return
+
     for score in seq_score:
-      if score['time'] % 2 != 0:
-        return
+      score['time'] >>= 1
 
     for score in seq_score_sign:
-      if score['time'] % 2 != 0:
-        return
+      score['time'] >>= 1
 
-    for score in seq_score:
-      score['time'] = int(score['time'] / 2)
 
-    for score in seq_score_sign:
-      score['time'] = int(score['time'] / 2)
+# Clear the signs dict to rebuild it
+def sequencer_sign_index_invalidate():
+  global seq_score_sign_by_time
+  seq_score_sign_by_time = None
+  sequencer_track_background_invalidate()
 
 
 # Get signs on score at tc(time cursor)
 def sequencer_get_repeat_control(tc):
-  global seq_score_sign
+  global seq_score_sign, seq_score_sign_by_time, seq_score_sign_by_time_list
   
-  if not seq_score_sign is None:
+  if seq_score_sign is None:
+    return None
+
+  # Rebuild the signs dict
+  if seq_score_sign_by_time is None or not seq_score_sign_by_time_list is seq_score_sign:
+    seq_score_sign_by_time = {}
     for sc_sign in seq_score_sign:
-      if sc_sign['time'] == tc:
-        return sc_sign
+      seq_score_sign_by_time[sc_sign['time']] = sc_sign
 
-  return None
+    seq_score_sign_by_time_list = seq_score_sign
+
+  return seq_score_sign_by_time.get(tc)
 
 
 # Add or change score signs at a time
 def sequencer_edit_signs(sign_data):
   global seq_score_sign
   
-  if not sign_data is None:
+  if sign_data is not None:
     tm = sign_data['time']
     sc_sign = sequencer_get_repeat_control(tm)
 
@@ -965,6 +1263,7 @@ def sequencer_edit_signs(sign_data):
       if flg == False:
         return
 
+      sequencer_sign_index_invalidate()
       idx = 0
       for idx in range(len(seq_score_sign)):
         if seq_score_sign[idx]['time'] > tm:
@@ -980,6 +1279,8 @@ def sequencer_edit_signs(sign_data):
       for ky in sign_data.keys():
         sc_sign[ky] = sign_data[ky]
 
+      sequencer_track_background_invalidate()
+
       # Sign status check
       flg = False
       for ky in sign_data.keys():
@@ -988,9 +1289,13 @@ def sequencer_edit_signs(sign_data):
       
       # No sign is True
       if flg == False:
-        seq_score_sign.remove(sign_data)
+        sequencer_sign_index_invalidate()
+        seq_score_sign.remove(sc_sign)
 
 
+# Number of note off events pre-allocated for the sequencer player
+SEQ_NOTE_OFF_POOL = const(64)
+
 # Play sequencer score
 def play_sequencer():
   global synth_0, seq_control, seq_channel, seq_score
@@ -999,34 +1304,43 @@ def play_sequencer():
   global seq_score_sign
 
   print('SEQUENCER STARTS.')
+  # Notes off events in a heap queue: [<Note off time>, <MIDI channel>, <Note number>]
   note_off_events = []
 
-  # Insert a note off event in the notes off list
-  def insert_note_off(time, channel, note_num):
-    len_evt = len(note_off_events)
-    if len_evt == 0:
-      note_off_events.append({'time': time, 'notes': [{'channel': channel, 'note': note_num}]})
-      return
+  # Free note off events to recycle (pre-allocated not to allocate in the play loop)
+  note_off_pool = [[0, 0, 0] for _ in range(SEQ_NOTE_OFF_POOL)]
 
-    for evt_index in range(len_evt):
-      evt = note_off_events[evt_index]
-      if   evt['time'] == time:
-        evt['notes'].append({'channel': channel, 'note': note_num})
-        return
+  # Notes to turn off at once per MIDI channel
+  notes_per_channel = [[] for _ in range(16)]
 
-      elif evt['time'] > time:
-        note_off_events.insert(evt_index,{'time': time, 'notes': [{'channel': channel, 'note': note_num}]})
-        return
+  # Insert a note off event in the notes off heap queue
+  def insert_note_off(time, channel, note_num):
+    if len(note_off_pool) > 0:
+      evt = note_off_pool.pop()
+      evt[0] = time
+      evt[1] = channel
+      evt[2] = note_num
+    else:
+      if DEBUG:
+        print('SEQUENCER: Note off pool is empty.')
+      evt = [time, channel, note_num]
 
-    note_off_events.append({'time': time, 'notes': [{'channel': channel, 'note': note_num}]})
+    heapq.heappush(note_off_events, evt)
 
 
-  # Notes off the first event in the notes off event list
+  # Notes off the events at the earliest time in the notes off heap queue
   def sequencer_notes_off():
-    for note_data in note_off_events[0]['notes']:
-      notes_off(note_data['channel'],[note_data['note']])
+    off_time = note_off_events[0][0]
+    while len(note_off_events) > 0 and note_off_events[0][0] == off_time:
+      evt = heapq.heappop(note_off_events)
+      notes_per_channel[evt[1]].append(evt[2])
+      note_off_pool.append(evt)
 
-    note_off_events.pop(0)
+    for channel in range(16):
+      notes = notes_per_channel[channel]
+      if len(notes) > 0:
+        notes_off(channel, notes)
+        notes.clear()
 
 
   # Move play cursor
@@ -1042,8 +1356,7 @@ def play_sequencer():
       width = seq_control['disp_time'][1] - seq_control['disp_time'][0]
       seq_control['disp_time'][0] = seq_control['time_cursor']
       seq_control['disp_time'][1] = seq_control['disp_time'][0] + width
-      sequencer_draw_track(0)
-      sequencer_draw_track(1)
+      sequencer_draw_all()
 
     seq_show_cursor(seq_edit_track, True, False)
     return tc
@@ -1080,9 +1393,10 @@ def play_sequencer():
   # Sequencer play loop
   seq_control['time_cursor'] = time_cursor
   score_len = len(seq_score)
-  play_slot = 0
+  play_slot = sequencer_score_index(time_cursor)
   while play_slot < score_len:
-    print('SEQ POINT:', time_cursor, play_slot)
+    if DEBUG:
+      print('SEQ POINT:', time_cursor, play_slot)
     score = seq_score[play_slot]
 
     # Scan stop button
@@ -1090,7 +1404,7 @@ def play_sequencer():
 
       # Stop sound
       encoder8_0.set_led_rgb(scan_enc_channel, 0x40ff40)
-      synth_0.set_master_volume(0)
+      control_master_volume(0)
 
       # Wait for releasing the button
       count = 0
@@ -1098,7 +1412,7 @@ def play_sequencer():
         time.sleep(0.1)
         count = count + 1
         if count >= 10:
-          encoder8_0.set_led_rgb(scan_enc_channel, 0xff4040)
+          encoder8_0.set_led_rgb(scan_enc_channel, COLOR_RED)
 
       # Stop
       if count >= 10:
@@ -1115,7 +1429,7 @@ def play_sequencer():
         time.sleep(0.1)
         count = count + 1
         if count >= 10:
-          encoder8_0.set_led_rgb(scan_enc_channel, 0xff4040)
+          encoder8_0.set_led_rgb(scan_enc_channel, COLOR_RED)
 
       # Stop
       encoder8_0.set_led_rgb(scan_enc_channel, 0x000000)
@@ -1123,7 +1437,7 @@ def play_sequencer():
         break
 
       # Set master volume
-      synth_0.set_master_volume(master_volume)
+      control_master_volume(master_volume)
 
     # Play4,8,16,32,64--1,2,3,4,5--1,2,4,8,16
     skip_continue = False
@@ -1134,7 +1448,7 @@ def play_sequencer():
 #      print('SEQUENCER AT0:', time_cursor)
       time0 = time.ticks_us()
       if len(note_off_events) > 0:
-        if note_off_events[0]['time'] == time_cursor:
+        if note_off_events[0][0] == time_cursor:
           sequencer_notes_off()
 
       midi_in()
@@ -1147,7 +1461,7 @@ def play_sequencer():
       # Loop/Skip/Repeat
       repeat_ctrl = sequencer_get_repeat_control(time_cursor)
 #      print('REPEAT CTRL0:', time_cursor, repeat_ctrl)
-      if not repeat_ctrl is None:
+      if repeat_ctrl is not None:
         # Skip bar point
         if repeat_ctrl['skip']:
           # During repeat play, skip to next play slot
@@ -1186,7 +1500,7 @@ def play_sequencer():
 #    print('SEQUENCER AT1:', time_cursor)
     time0 = time.ticks_us()
     if len(note_off_events) > 0:
-      if note_off_events[0]['time'] == time_cursor:
+      if note_off_events[0][0] == time_cursor:
         sequencer_notes_off()
 
     # Skip to next play slot
@@ -1204,7 +1518,7 @@ def play_sequencer():
     # Loop/Skip/Repeat
     repeat_ctrl = sequencer_get_repeat_control(time_cursor)
 #    print('REPEAT CTRL1:', time_cursor, repeat_ctrl)
-    if not repeat_ctrl is None:
+    if repeat_ctrl is not None:
       # Loop bar point
       if repeat_ctrl['loop']:
         loop_play_time = repeat_ctrl['time']
@@ -1260,11 +1574,12 @@ def play_sequencer():
     play_slot = play_slot + 1
 
   # Notes off (final process)
-  print('SEQUENCER: Notes off process =', len(note_off_events))
+  if DEBUG:
+    print('SEQUENCER: Notes off process =', len(note_off_events))
   while len(note_off_events) > 0:
-    score = note_off_events[0]
+    off_time = note_off_events[0][0]
     timedelta = 0
-    while score['time'] > time_cursor:
+    while off_time > time_cursor:
       time.sleep_us(tempo - timedelta)
       time0 = time.ticks_us()
       time_cursor = move_play_cursor(time_cursor)
@@ -1288,25 +1603,69 @@ def play_sequencer():
   seq_control['key_cursor'][1] = key_cursor1_bk
   seq_control['disp_time'][0] = seq_disp_time0_bk
   seq_control['disp_time'][1] = seq_disp_time1_bk
-  sequencer_draw_track(0)
-  sequencer_draw_track(1)
+  sequencer_draw_all()
   seq_show_cursor(seq_edit_track, True, True)
 
   # Set master volume (for pause/stop)
-  synth_0.set_master_volume(master_volume)
-
-  # Refresh screen
-  sequencer_draw_track(0)
-  sequencer_draw_track(1)
+  control_master_volume(master_volume)
   print('SEQUENCER: Finished.')
 
 
+# Time range to redraw for each track
+#   [[time from, time to], ..], None: redraw whole track
+seq_dirty_time = [None, None]
+
+# Add a time range to redraw with the next sequencer_flush_draw
+#   trknum: The track number (None for both tracks)
+def sequencer_set_dirty_time(time_from, time_to, trknum = None):
+  global seq_dirty_time
+
+  for trk in (range(2) if trknum is None else (trknum,)):
+    dirty = seq_dirty_time[trk]
+    if dirty is None:
+      seq_dirty_time[trk] = [time_from, time_to]
+    else:
+      dirty[0] = min(dirty[0], time_from)
+      dirty[1] = max(dirty[1], time_to)
+
+
+# Display geometry cache for each track
+#   [(xscale, yscale, x0, y3, key_s, key_e, time_s, time_e, y_for_note), ..]
+#   y_for_note: y coordinate of each key from key_s to key_e
+seq_scale_cache = [None, None]
+
+# Get display geometry of a track, recalculate only if the display range is changed
+def sequencer_get_geometry(trknum):
+  global seq_control, seq_draw_area, seq_scale_cache
+
+  time_s = seq_control['disp_time'][0]
+  time_e = seq_control['disp_time'][1]
+  key_s = seq_control['disp_key'][trknum][0]
+  key_e = seq_control['disp_key'][trknum][1]
+  geo = seq_scale_cache[trknum]
+  if geo is None or geo[6] != time_s or geo[7] != time_e or geo[4] != key_s or geo[5] != key_e:
+    area = seq_draw_area[trknum]
+    xscale = (area[2] - area[0] + 1) // (time_e - time_s)
+    yscale = (area[3] - area[1] + 1) // (key_e - key_s + 1)
+    y_for_note = [area[3] - (note_num - key_s + 1) * yscale for note_num in range(key_s, key_e + 1)]
+    geo = (xscale, yscale, area[0], area[3], key_s, key_e, time_s, time_e, y_for_note)
+    seq_scale_cache[trknum] = geo
+
+  return geo
+
+
+# Get xscale and yscale of a track
+def sequencer_get_scale(trknum):
+  geo = sequencer_get_geometry(trknum)
+  return (geo[0], geo[1])
+
+
 # Show / erase sequencer cursor
 def seq_show_cursor(edit_track, disp_time, disp_key):
   global seq_control, seq_draw_area
  
   # Draw time cursor
-  label_seq_time.setText('{:03d}/{:03d}'.format(seq_control['time_cursor'],int(seq_control['time_cursor']/seq_control['time_per_bar']) + 1))
+  label_set_text(label_seq_time, num3_str(seq_control['time_cursor']) + '/' + num3_str(int(seq_control['time_cursor']/seq_control['time_per_bar']) + 1))
   if seq_control['disp_time'][0] <= seq_control['time_cursor'] and seq_control['time_cursor'] <= seq_control['disp_time'][1]:
     for trknum in range(2):
       area = seq_draw_area[trknum]
@@ -1314,9 +1673,9 @@ def seq_show_cursor(edit_track, disp_time, disp_key):
       w = area[2] - area[0] + 1
       y = area[1]
       h = area[3] - area[1] + 1
-      xscale = int((area[2] - area[0] + 1) / (seq_control['disp_time'][1] - seq_control['disp_time'][0]))
+      xscale = sequencer_get_scale(trknum)[0]
 
-      color = 0xffff40 if disp_time else 0x222222
+      color = 0xffff40 if disp_time else COLOR_BG
 #      M5.Lcd.fillRect(x + seq_control['time_cursor'] * xscale - 3, y - 3, 6, 3, color)
       M5.Lcd.fillRect(x + (seq_control['time_cursor'] - seq_control['disp_time'][0]) * xscale - 3, y - 3, 6, 3, color)
 
@@ -1330,96 +1689,94 @@ def seq_show_cursor(edit_track, disp_time, disp_key):
   if key_s <= note_num and note_num <= key_e:
     area = seq_draw_area[edit_track]
     x = area[0] - 6
-    yscale = int((area[3] - area[1] + 1) / (key_e - key_s  + 1))
+    yscale = sequencer_get_scale(edit_track)[1]
 
     # Display a key cursor
     y = area[3] - (note_num - key_s + 1) * yscale
-    color = 0xff4040 if disp_key else 0xffffff
+    color = COLOR_RED if disp_key else COLOR_WHITE
 #    print('KEY CURS:', note_num, x, y + 1, yscale - 2, color)
     M5.Lcd.fillRect(x, y + 1, 5, yscale - 2, color)
 
   # Show key name
   if edit_track == 0:
-    label_seq_key1.setText(seqencer_key_name(seq_control['key_cursor'][0]))
+    label_set_text(label_seq_key1, seqencer_key_name(seq_control['key_cursor'][0]))
   else:
-    label_seq_key2.setText(seqencer_key_name(seq_control['key_cursor'][1]))
+    label_set_text(label_seq_key2, seqencer_key_name(seq_control['key_cursor'][1]))
+
+
+# Begin an LCD write transaction (keeps the LCD bus for the following drawings)
+def lcd_start_write():
+  if hasattr(M5.Lcd, 'startWrite'):
+    M5.Lcd.startWrite()
+
+
+# End an LCD write transaction
+def lcd_end_write():
+  if hasattr(M5.Lcd, 'endWrite'):
+    M5.Lcd.endWrite()
 
 
 # Draw a note on the sequencer
 def sequencer_draw_note(trknum, note_num, note_on_time, note_off_time, disp_mode):
   global seq_control, seq_draw_area, seq_note_color
 
-  # Key range to draw
-  key_s = seq_control['disp_key'][trknum][0]
-  key_e = seq_control['disp_key'][trknum][1]
-  if note_num < key_s or note_num > key_e:
+  # Out of the key and time range to draw
+  xscale, yscale, x0, y3, key_s, key_e, time_s, time_e, y_for_note = sequencer_get_geometry(trknum)
+  if note_off_time <= time_s or note_on_time >= time_e or note_num < key_s or note_num > key_e:
     return
 
   # Note rectangle to draw
-  time_s = seq_control['disp_time'][0]
-  time_e = seq_control['disp_time'][1]
   if note_on_time < time_s:
     note_on_time = time_s
-  elif note_on_time > time_e:
-    return
 
   if note_off_time > time_e:
     note_off_time = time_e
-  elif note_off_time < time_s:
-    return
 
   # Display coordinates
-  area = seq_draw_area[trknum]
-  xscale = int((area[2] - area[0] + 1) / (time_e - time_s))
-  yscale = int((area[3] - area[1] + 1) / (key_e  - key_s  + 1))
-  x = (note_on_time  - time_s) * xscale + area[0]
+  x = (note_on_time  - time_s) * xscale + x0
   w = (note_off_time - note_on_time) * xscale
-  y = area[3] - (note_num - key_s + 1) * yscale
+  y = y_for_note[note_num - key_s]
   h = yscale
-  M5.Lcd.fillRect(x, y, w, h, seq_note_color[disp_mode][1])
-  M5.Lcd.drawRect(x, y, w, h, seq_note_color[disp_mode][0])
+  if w <= 0:
+    return
+
+  # Fill the edge color, then the inside of the edge
+  M5.Lcd.fillRect(x, y, w, h, seq_note_color[disp_mode][0])
+  if w > 2 and h > 2:
+    M5.Lcd.fillRect(x + 1, y + 1, w - 2, h - 2, seq_note_color[disp_mode][1])
 
 
 # Draw velocity
-def sequencer_draw_velocity(trknum, channel, note_on_time, notes):
+#   channel_notes: Notes arrays of the channel in the score index
+#   note_from, note_to: Notes of a score in channel_notes (note_to is not included)
+def sequencer_draw_velocity(trknum, note_on_time, channel_notes, note_from, note_to):
   global seq_control, seq_draw_area, seq_cursor_note
 
-  # Key range to draw
-  key_s = seq_control['disp_key'][trknum][0]
-  key_e = seq_control['disp_key'][trknum][1]
-
-  # Time range to draw
-  time_s = seq_control['disp_time'][0]
-  time_e = seq_control['disp_time'][1]
-
-  # Display coordinates
+  # Key and time range to draw, and display coordinates
+  xscale, yscale, x0, y3, key_s, key_e, time_s, time_e, y_for_note = sequencer_get_geometry(trknum)
   area = seq_draw_area[trknum]
-  xscale = int((area[2] - area[0] + 1) / (time_e - time_s))
-  yscale = int((area[3] - area[1] + 1) / (key_e  - key_s  + 1))
 
   # Draw velocity bar graph
-  draws = 0
-  for note_data in notes:
-    if note_data['channel'] == channel:
-      # Out of draw area
-      note_num = note_data['note']
-      if note_num < key_s or note_num > key_e:
-        continue
+  note_nums = channel_notes[1]
+  velocities = channel_notes[3]
+  note_refs = channel_notes[4]
+  cursor_note = None if seq_cursor_note is None else seq_cursor_note[1]
+  velocity_height = seq_velocity_height[trknum]
+  fill_rect = M5.Lcd.fillRect
+  x = area[0] + (note_on_time - time_s) * xscale + 2
+  y_bottom = area[3] - 1
+  for nt in range(note_from, note_to):
+    # Out of draw area
+    note_num = note_nums[nt]
+    if note_num < key_s or note_num > key_e:
+      continue
 
-      # Graph color
-      if seq_cursor_note is None:
-        color = 0x888888
-      else:
-        if note_data == seq_cursor_note[1]:
-          color = 0xff4040
-        else:
-          color = 0x888888
+    # Draw a bar graph
+    y = velocity_height[velocities[nt]]
+    if y > 0:
+      fill_rect(x, y_bottom - y, 3, y, COLOR_RED if note_refs[nt] is cursor_note else 0x888888)
 
-      # Draw a bar graph
-      x = area[0] + (note_on_time - time_s) * xscale + draws * 5 + 2
-      y = int((area[3] - area[1] - 2) * note_data['velocity'] / 127)
-      M5.Lcd.fillRect(x, area[3] - y - 1, 3, y, color)
-      draws = draws + 1
+    x = x + 5
 
 # Draw start and end time line to play in sequencer
 def sequencer_draw_playtime(trknum):
@@ -1429,7 +1786,7 @@ def sequencer_draw_playtime(trknum):
   area = seq_draw_area[trknum]
   x = area[0]
   y = area[1]
-  xscale = int((area[2] - area[0] + 1) / (seq_control['disp_time'][1] - seq_control['disp_time'][0]))
+  xscale = sequencer_get_scale(trknum)[0]
 
   # Draw time line
   M5.Lcd.drawLine(x, y, area[2], y, 0x00ff40)
@@ -1446,9 +1803,80 @@ def sequencer_draw_playtime(trknum):
     M5.Lcd.drawLine(x, y, area[2], y, 0xff40ff)
 
 
+# Time grid and signs cache for each track
+#   [(time_s, time_e, time_per_bar, xscale, x, <seq_score_sign>, [(x, width, color), ..]), ..]
+#   Cleared when the signs are edited
+seq_track_bg_cache = [None, None]
+
+# Clear the time grid and signs cache to rebuild it
+def sequencer_track_background_invalidate():
+  global seq_track_bg_cache
+  seq_track_bg_cache[0] = None
+  seq_track_bg_cache[1] = None
+
+
+# Get the rectangles of the time grid and the signs of a track, rebuild only if the display is changed
+def sequencer_get_track_background(trknum):
+  global seq_control, seq_draw_area, seq_score_sign, seq_track_bg_cache
+
+  time_s = seq_control['disp_time'][0]
+  time_e = seq_control['disp_time'][1]
+  time_per_bar = seq_control['time_per_bar']
+  xscale = sequencer_get_scale(trknum)[0]
+  x = seq_draw_area[trknum][0]
+
+  # Display range and scale are same as the cache, and the signs are not changed
+  cache = seq_track_bg_cache[trknum]
+  if cache is not None and cache[0] == time_s and cache[1] == time_e and cache[2] == time_per_bar and cache[3] == xscale and cache[4] == x and cache[5] is seq_score_sign:
+    return cache[6]
+
+  # Vertical lines as a time grid
+  #   Adjacent lines in the same color are drawn as a rectangle at once
+  rects = []
+  grid_x = -1
+  grid_w = 0
+  grid_color = None
+  for t in range(time_s + 1, time_e):
+    color = COLOR_WHITE if t % time_per_bar == 0 else 0x60a060
+    x0 = x + (t - time_s) * xscale
+    if color == grid_color and x0 == grid_x + grid_w:
+      grid_w = grid_w + 1
+    else:
+      if grid_w > 0:
+        rects.append((grid_x, grid_w, grid_color))
+
+      grid_x = x0
+      grid_w = 1
+      grid_color = color
+
+  if grid_w > 0:
+    rects.append((grid_x, grid_w, grid_color))
+
+  # Signs on score over the grid
+  if seq_score_sign is not None:
+    for sc_sign in seq_score_sign:
+      t = sc_sign['time']
+      if t <= time_s or t >= time_e:
+        continue
+
+      x0 = x + (t - time_s) * xscale
+      if sc_sign['loop']:
+        rects.append((x0 + 2, 1, 0xffff00))
+      elif sc_sign['skip']:
+        rects.append((x0 + 2, 1, 0x40a0ff))
+      elif sc_sign['repeat']:
+        rects.append((x0 - 2, 1, COLOR_RED))
+      else:
+        rects.append((x0, 1, 0x60a060 if t % time_per_bar else COLOR_WHITE))
+
+  seq_track_bg_cache[trknum] = (time_s, time_e, time_per_bar, xscale, x, seq_score_sign, rects)
+  return rects
+
+
 # Draw sequencer track
 #   trknum: The track number to draw (0 or 1)
-def sequencer_draw_track(trknum):
+#   dirty : Time range to redraw [time from, time to] (None for the whole track)
+def sequencer_draw_track(trknum, dirty = None):
   global seq_control, seq_track_midi, seq_score
   global seq_cursor_note
   global seq_parm
@@ -1463,29 +1891,38 @@ def sequencer_draw_track(trknum):
   w = area[2] - area[0] + 1
   y = area[1]
   h = area[3] - area[1] + 1
-  xscale = int((area[2] - area[0] + 1) / (seq_control['disp_time'][1] - seq_control['disp_time'][0]))
-  M5.Lcd.fillRect(x, y, w, h, 0x222222)
-  for t in range(seq_control['disp_time'][0] + 1, seq_control['disp_time'][1]):
-    # Draw vertical line as a time grid
-    color = 0xffffff if t % seq_control['time_per_bar'] == 0 else 0x60a060
-    x0 = x + (t - seq_control['disp_time'][0]) * xscale
-    M5.Lcd.drawLine(x0, y, x0, area[3], color)
-
-    # Signs on score
-    if t != 0:
-      sc_sign = sequencer_get_repeat_control(t)
-      if not sc_sign is None:
-        if sc_sign['loop']:
-          color = 0xffff00
-          x0 = x0 + 2
-        elif sc_sign['skip']:
-          color = 0x40a0ff
-          x0 = x0 + 2
-        elif sc_sign['repeat']:
-          color = 0xff4040
-          x0 = x0 - 2
-
-        M5.Lcd.drawLine(x0, y, x0, area[3], color)
+  xscale = sequencer_get_scale(trknum)[0]
+
+  # Time range to redraw
+  #   Redraw only the dirty time range if it is less than half of the track
+  #   Velocity bars of a score run over the following time, so they are always redrawn wholly
+  draw_s = seq_control['disp_time'][0]
+  draw_e = seq_control['disp_time'][1]
+  clipped = False
+  if dirty is not None and not with_velocity and hasattr(M5.Lcd, 'setClipRect'):
+    dirty_s = max(dirty[0], draw_s)
+    dirty_e = min(dirty[1], draw_e)
+
+    # Out of the display
+    if dirty_e < dirty_s:
+      return
+
+    if (dirty_e - dirty_s) * 2 < draw_e - draw_s:
+      M5.Lcd.setClipRect(x + (dirty_s - draw_s) * xscale, y, (dirty_e - dirty_s) * xscale + 1, h)
+      draw_s = dirty_s
+      draw_e = dirty_e
+      clipped = True
+
+  lcd_start_write()
+  M5.Lcd.fillRect(x, y, w, h, COLOR_BG)
+
+  # Draw the time grid and signs
+  #   Skip the rectangles out of the time range to redraw
+  clip_x0 = x + (draw_s - seq_control['disp_time'][0] - 1) * xscale
+  clip_x1 = x + (draw_e - seq_control['disp_time'][0] + 1) * xscale
+  for x0, w0, color in sequencer_get_track_background(trknum):
+    if x0 + w0 >= clip_x0 and x0 <= clip_x1:
+      M5.Lcd.fillRect(x0, y, w0, h, color)
 
   # Draw frame
   M5.Lcd.drawRect(x, y, w, h, 0x00ff40)
@@ -1497,86 +1934,199 @@ def sequencer_draw_track(trknum):
   time_s = seq_control['disp_time'][0]
   time_e = seq_control['disp_time'][1]
 
+  # Local copies of the values used in drawing notes
+  xscale, yscale, area_x0, area_y1, key_s, key_e, disp_s, disp_e, y_for_note = sequencer_get_geometry(trknum)
+  note_color = seq_note_color
+  disp_normal = SEQ_NOTE_DISP_NORMAL
+  disp_highlight = SEQ_NOTE_DISP_HIGHLIGHT
+  fill_rect = M5.Lcd.fillRect
+  if seq_cursor_note is None:
+    cursor_score = None
+    cursor_note = None
+  else:
+    cursor_score = seq_cursor_note[0]
+    cursor_note = seq_cursor_note[1]
+
   # Draw notes of the track MIDI channel
   channel = seq_track_midi[trknum]
   time_e = max(time_e+1, len(seq_score))
-  draw_time = time_s
-  for score in seq_score:
+  channel_index, channel_times, channel_max_duration, channel_notes = sequencer_get_index(channel)
+  note_start, note_nums, durations, velocities, note_refs = channel_notes
+  for idx in range(bisect_left(channel_times, time_s - channel_max_duration + 1), len(channel_index)):
+    note_on_time = channel_times[idx]
+    score = channel_index[idx][1]
+
+    # All notes after here are out of time range
+    if note_on_time >= time_e:
+      break
+
     # Note on/off(max) time
-    note_on_time  = score['time']
-    note_off_time = score['time'] + score['max_duration']
+    note_off_time = note_on_time + score['max_duration']
 
     # All notes in this score are out of time range
-    if note_off_time <= time_s or note_on_time >= time_e:
+    if note_off_time <= time_s:
       continue
 
-    # Note on time is the time to draw
-    if note_on_time == draw_time:
-      # Skip blank times
-      while note_on_time > draw_time:
-        # DRAW SOMETHING HERE
-        draw_time = draw_time + 1
-
-      # Note on time is the draw time
-      for notes_data in score['notes']:
-        if notes_data['channel'] == channel:
-          if seq_cursor_note is None:
-            color = SEQ_NOTE_DISP_NORMAL
-          else:
-            color = SEQ_NOTE_DISP_HIGHLIGHT if score == seq_cursor_note[0] and notes_data == seq_cursor_note[1] else SEQ_NOTE_DISP_NORMAL
+    # Out of the time range to redraw
+    if note_off_time <= draw_s or note_on_time > draw_e:
+      continue
 
-          sequencer_draw_note(trknum, notes_data['note'], note_on_time, note_on_time + notes_data['duration'], color)
+    # Draw notes in the score
+    score_is_cursor = score is cursor_score
+    for nt in range(note_start[idx], note_start[idx + 1]):
+      # Out of the key and time range
+      note_num = note_nums[nt]
+      note_e = note_on_time + durations[nt]
+      if note_e <= disp_s or note_on_time >= disp_e or note_num < key_s or note_num > key_e:
+        continue
 
-      if with_velocity:
-        sequencer_draw_velocity(trknum, channel, note_on_time, score['notes'])
+      # Note rectangle to draw
+      note_s = note_on_time if note_on_time > disp_s else disp_s
+      if note_e > disp_e:
+        note_e = disp_e
 
-    # Note on time is less than draw time but note is in display area
-    else:
-      for notes_data in score['notes']:
-        if notes_data['channel'] == channel:
-          if seq_cursor_note is None:
-            color = SEQ_NOTE_DISP_NORMAL
-          else:
-            color = SEQ_NOTE_DISP_HIGHLIGHT if score == seq_cursor_note[0] and notes_data == seq_cursor_note[1] else SEQ_NOTE_DISP_NORMAL
+      disp_mode = disp_highlight if score_is_cursor and note_refs[nt] is cursor_note else disp_normal
+      note_x = (note_s - disp_s) * xscale + area_x0
+      note_y = y_for_note[note_num - key_s]
+      note_w = (note_e - note_s) * xscale
+      color = note_color[disp_mode]
+
+      # Fill the edge color, then the inside of the edge
+      fill_rect(note_x, note_y, note_w, yscale, color[0])
+      if note_w > 2 and yscale > 2:
+        fill_rect(note_x + 1, note_y + 1, note_w - 2, yscale - 2, color[1])
 
-          sequencer_draw_note(trknum, notes_data['note'], note_on_time, note_on_time + notes_data['duration'], color)
+    if with_velocity:
+      sequencer_draw_velocity(trknum, note_on_time, channel_notes, note_start[idx], note_start[idx + 1])
 
-      if with_velocity:
-        sequencer_draw_velocity(trknum, channel, note_on_time, score['notes'])
+  if clipped:
+    M5.Lcd.clearClipRect()
+
+  lcd_end_write()
+
+
+# Draw both sequencer tracks in one LCD write transaction
+def sequencer_draw_all():
+  lcd_start_write()
+  sequencer_draw_track(0)
+  sequencer_draw_track(1)
+  lcd_end_write()
 
-    # Next the time to draw
-    draw_time = draw_time + 1
 
+# Keyboard rectangles cache for each track
+#   [(key_s, key_e, [(x, y, w, h, color), ..]), ..]
+seq_keyboard_cache = [None, None]
 
 # Draw keyboard
 def sequencer_draw_keyboard(trknum):
-  global seq_draw_area, seq_control
+  global seq_draw_area, seq_control, seq_keyboard_cache
 
-  # Draw a keyboard of the track
+  # Make rectangles to draw a keyboard of the track if the key range is changed
   key_s = seq_control['disp_key'][trknum][0]
   key_e = seq_control['disp_key'][trknum][1]
-  area = seq_draw_area[trknum]
-  xscale = area[0] - 1
-  black_scale = int(xscale / 2)
-  yscale = int((area[3] - area[1] + 1) / (key_e - key_s  + 1))
-  black_key = [1,3,6,8,10]
-  for note_num in range(key_s, key_e + 1):
-    # Display a key
-    y = area[3] - (note_num - key_s + 1) * yscale
-    M5.Lcd.drawRect(0, y, xscale, yscale, 0x888888)
-    M5.Lcd.fillRect(1, y + 1, xscale - 2, yscale - 2, 0xffffff)
+  cache = seq_keyboard_cache[trknum]
+  if cache is None or cache[0] != key_s or cache[1] != key_e:
+    area = seq_draw_area[trknum]
+    xscale = area[0] - 1
+    black_scale = int(xscale / 2)
+    yscale = int((area[3] - area[1] + 1) / (key_e - key_s  + 1))
+    black_key = [1,3,6,8,10]
+
+    # Key frames in a rectangle, then inside of each key
+    keys_h = (key_e - key_s + 1) * yscale
+    rects = [(0, area[3] - keys_h, xscale, keys_h, 0x888888)]
+    for note_num in range(key_s, key_e + 1):
+      y = area[3] - (note_num - key_s + 1) * yscale
+
+      # Black key on piano
+      if (note_num % 12) in black_key:
+        rects.append((1, y + 1, black_scale, yscale - 2, 0x000000))
+        rects.append((1 + black_scale, y + 1, xscale - 2 - black_scale, yscale - 2, COLOR_WHITE))
+      else:
+        rects.append((1, y + 1, xscale - 2, yscale - 2, COLOR_WHITE))
+
+    cache = (key_s, key_e, rects)
+    seq_keyboard_cache[trknum] = cache
+
+  # Draw the keyboard
+  fill_rect = M5.Lcd.fillRect
+  lcd_start_write()
+  for rect in cache[2]:
+    fill_rect(*rect)
+
+  lcd_end_write()
+
+
+# Redraw requests for each track, flushed once at the end of encoder_read()
+SEQ_DRAW_NONE  = 0                          # No request
+SEQ_DRAW_DIRTY = 1                          # Redraw the dirty time range only
+SEQ_DRAW_WHOLE = 2                          # Redraw the whole track
+seq_draw_request = [SEQ_DRAW_NONE, SEQ_DRAW_NONE]
+seq_keyboard_request = [False, False]
+
+# Request to redraw sequencer tracks
+#   trknum  : The track number (None for both tracks)
+#   whole   : Redraw the whole track (True) or the dirty time range only (False)
+#   keyboard: Redraw the keyboard of the track too
+def sequencer_request_draw(trknum = None, whole = True, keyboard = False):
+  global seq_draw_request, seq_keyboard_request
+
+  for trk in (range(2) if trknum is None else (trknum,)):
+    seq_draw_request[trk] = max(seq_draw_request[trk], SEQ_DRAW_WHOLE if whole else SEQ_DRAW_DIRTY)
+    if keyboard:
+      seq_keyboard_request[trk] = True
+
+
+# Request to redraw the tracks showing a MIDI channel
+#   channel  : MIDI channel changed
+#   time_from: Start time changed (None for the whole track)
+#   time_to  : End time changed
+def sequencer_request_draw_channel(channel, time_from = None, time_to = None):
+  global seq_track_midi
+
+  for trk in range(2):
+    if seq_track_midi[trk] == channel:
+      if time_from is None:
+        sequencer_request_draw(trk)
+      else:
+        sequencer_set_dirty_time(time_from, time_to, trk)
+        sequencer_request_draw(trk, whole = False)
+
 
-    # Black key on piano
-    key_is_black = ((note_num % 12) in black_key) == True
-    if key_is_black:
-      M5.Lcd.fillRect(1, y + 1, black_scale, yscale - 2, 0x000000)
+# Draw the requested tracks and keyboards
+def sequencer_flush_draw():
+  global seq_draw_request, seq_keyboard_request, seq_dirty_time
+
+  if seq_draw_request[0] == SEQ_DRAW_NONE and seq_draw_request[1] == SEQ_DRAW_NONE and not (seq_keyboard_request[0] or seq_keyboard_request[1]):
+    return
+
+  lcd_start_write()
+  for trknum in range(2):
+    if seq_keyboard_request[trknum]:
+      sequencer_draw_keyboard(trknum)
+
+    if seq_draw_request[trknum] != SEQ_DRAW_NONE:
+      dirty = None if seq_draw_request[trknum] == SEQ_DRAW_WHOLE else seq_dirty_time[trknum]
+      seq_dirty_time[trknum] = None
+      sequencer_draw_track(trknum, dirty)
+
+  lcd_end_write()
+
+  # The key cursor is on the keyboard
+  if seq_keyboard_request[0] or seq_keyboard_request[1]:
+    seq_show_cursor(seq_edit_track, True, True)
+
+  seq_draw_request[0] = SEQ_DRAW_NONE
+  seq_draw_request[1] = SEQ_DRAW_NONE
+  seq_keyboard_request[0] = False
+  seq_keyboard_request[1] = False
 
 
 # Screen change
 def application_screen_change():
   global seq_cursor_note
 
-  M5.Lcd.clear(0x222222)
+  M5.Lcd.clear(COLOR_BG)
 
   if   app_screen_mode == SCREEN_MODE_PLAYER:
     # SEQUENCER title labels
@@ -1608,7 +2158,7 @@ def application_screen_change():
     title_general.setVisible(True)
 
     # SMF data labels
-    label_master_volume.setText('{:0>3d}'.format(master_volume))
+    label_set_text(label_master_volume, num3_str(master_volume))
     label_master_volume.setVisible(True)
     label_smf_file.setVisible(True)
     label_smf_fname.setVisible(True)
@@ -1640,7 +2190,7 @@ def application_screen_change():
     title_general.setVisible(False)
 
     # SMF data labels
-    label_seq_master_volume.setText('{:0>3d}'.format(master_volume))
+    label_set_text(label_seq_master_volume, num3_str(master_volume))
     label_master_volume.setVisible(False)
     label_smf_file.setVisible(False)
     label_smf_fname.setVisible(False)
@@ -1688,8 +2238,7 @@ def application_screen_change():
     seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
     sequencer_draw_keyboard(0)
     sequencer_draw_keyboard(1)
-    sequencer_draw_track(0)
-    sequencer_draw_track(1)
+    sequencer_draw_all()
     seq_show_cursor(0, True, True)
     seq_show_cursor(1, True, True)
 
@@ -1708,12 +2257,34 @@ def sdcard_init():
 
 # Initialize 8encoder unit
 def encoder_init():
-  global encoder8_0
+  global encoder8_0, enc_bulk_read
 
-  encoder8_0 = Encoder8Unit(i2c0, 0x41)
+  encoder8_0 = Encoder8Unit(i2c0, ENC8_I2C_ADDR)
   for enc_ch in range(1, 9):
     encoder8_0.set_counter_value(enc_ch, 0)
 
+  # Read the counter and button registers of all encoders in a transaction each
+  try:
+    i2c0.readfrom_mem_into(ENC8_I2C_ADDR, ENC8_REG_COUNTER, enc_counter_buf)
+    i2c0.readfrom_mem_into(ENC8_I2C_ADDR, ENC8_REG_BUTTON, enc_button_buf)
+    enc_bulk_read = True
+  except Exception as e:
+    print('ENCODER BULK READ ERROR:', e)
+    enc_bulk_read = False
+
+
+# Probe an I2C device without scanning all the addresses
+#   addr: I2C address
+#   Returns True if the device acknowledges
+def i2c_probe(addr):
+  try:
+    i2c0.writeto(addr, b'')
+    return True
+  except Exception as e:
+    print('I2C PROBE ERROR:', hex(addr), e)
+
+  return False
+
 
 # Write MIDI IN settings to SD card
 #   num: File number (0..999)
@@ -1723,13 +2294,87 @@ def write_midi_in_settings(num):
   # Write MIDI IN settings as JSON file
   fpath = midi_in_file_path + 'MIDISET{:0=3d}.json'.format(num)
   try:
+    json_text = json.dumps([midi_in_channel_json(settings) for settings in midi_in_settings], separators=(',', ':'))
     with open(fpath, 'w') as f:
-      json.dump(midi_in_settings, f)
+      f.write(json_text)
 
     f.close()
 
   except Exception as e:
     print('MIDI IN FILE WRITE ERROR:', e)
+    return
+
+  write_midi_in_settings_bin(fpath, midi_in_settings)
+
+
+# Write the binary copy of MIDI IN settings to read at boot
+#   fpath   : MIDI IN settings JSON file path
+#   settings: MIDI IN settings
+def write_midi_in_settings_bin(fpath, settings):
+  buf = bytearray(MIDI_IN_SET_BIN_SIZE)
+  buf[0] = MIDI_IN_SET_BIN_VERSION
+  try:
+    for ch in range(16):
+      chs = settings[ch]
+      struct.pack_into(MIDI_IN_SET_BIN_CHANNEL, buf, 1 + ch * 12, chs['program'], chs['gmbank'], *(chs['reverb'] + chs['chorus'] + chs['vibrate']))
+
+    with open(fpath[:-4] + 'bin', 'wb') as f:
+      f.write(buf)
+
+    f.close()
+
+  except Exception as e:
+    print('MIDI IN BINARY FILE WRITE ERROR:', e)
+
+
+# Read the binary copy of MIDI IN settings from SD card
+#   fpath: MIDI IN settings JSON file path
+#   Returns None if the binary copy is missing, broken or older than the JSON file
+def read_midi_in_settings_bin(fpath):
+  bpath = fpath[:-4] + 'bin'
+  try:
+    if os.stat(bpath)[8] < os.stat(fpath)[8]:
+      return None
+
+    buf = bytearray(MIDI_IN_SET_BIN_SIZE)
+    with open(bpath, 'rb') as f:
+      rdsize = f.readinto(buf)
+
+    f.close()
+    if rdsize != MIDI_IN_SET_BIN_SIZE or buf[0] != MIDI_IN_SET_BIN_VERSION:
+      return None
+
+    settings = []
+    for ch in range(16):
+      v = struct.unpack_from(MIDI_IN_SET_BIN_CHANNEL, buf, 1 + ch * 12)
+      settings.append({'program': v[0], 'gmbank': v[1], 'reverb': bytearray(v[2:5]), 'chorus': bytearray(v[5:9]), 'vibrate': bytearray(v[9:12])})
+
+    return settings
+
+  except Exception as e:
+    print('MIDI IN BINARY FILE READ ERROR:', e)
+
+  return None
+
+
+# Set the initial MIDI IN settings to the keys not in a channel settings
+# and keep the effector values in bytearrays.
+#   settings: MIDI IN settings of a channel
+#   Returns the settings
+def midi_in_channel_init(settings):
+  for (key, value) in MIDI_IN_CHANNEL_INIT:
+    if type(value) is tuple:
+      settings[key] = bytearray(settings[key] if key in settings else value)
+    elif not key in settings:
+      settings[key] = value
+
+  return settings
+
+
+# Get MIDI IN settings of a channel to write as JSON (effector values in lists)
+#   settings: MIDI IN settings of a channel
+def midi_in_channel_json(settings):
+  return {key: list(value) if type(value) is bytearray else value for (key, value) in settings.items()}
 
 
 # Read MIDI IN settings from SD card
@@ -1737,52 +2382,51 @@ def write_midi_in_settings(num):
 def read_midi_in_settings(num):
   global midi_in_file_path
 
-  # Read MIDI IN settings JSON file
-  rdjson = None
+  # Read the binary copy if it is up to date
   fpath = midi_in_file_path + 'MIDISET{:0=3d}.json'.format(num)
+  rdjson = read_midi_in_settings_bin(fpath)
+  if rdjson is not None:
+    return rdjson
+
+  # Read MIDI IN settings JSON file
   try:
     with open(fpath, 'r') as f:
       rdjson = json.load(f)
 
     # Default values
     for ch in range(16):
-      kys = rdjson[ch]
-      if not 'program' in kys:
-        rdjson[ch]['program'] = 0
-      if not 'gmbank' in kys:
-        rdjson[ch]['gmbank'] = 0
-      if not 'reverb' in kys:
-        rdjson[ch]['reverb'] = [0,0,0]
-      if not 'chorus' in kys:
-        rdjson[ch]['chorus'] = [0,0,0,0]
-      if not 'vibrate' in kys:
-        rdjson[ch]['vibrate'] = [0,0,0]
+      midi_in_channel_init(rdjson[ch])
 
     f.close()
 
   except Exception as e:
     print('MIDI IN FILE READ ERROR:', e)
-  
+    return None
+
+  write_midi_in_settings_bin(fpath, rdjson)
   return rdjson
 
 
 # MIDI: Get a delta time in integer
-def delta_time(btime):
-#  print('delta_time=' + str(len(btime)))
+#   btime: Variable length quantity bytes
+@micropython.viper
+def delta_time(btime) -> int:
+  buf = ptr8(btime)
+  n = int(len(btime))
   dt = 0
-  for b in btime:
-    dt = dt << 7
-    dt = dt | int(b & 0x7f)
+  i = 0
+  while i < n:
+    dt = (dt << 7) | (buf[i] & 0x7f)
+    i = i + 1
 
-#  print('btime=' + str(dt))
   return dt
 
 
 # MIDI EVENT: Note off
 #   ch: MIDI channel
-#   rb: Note number
+#   rb[0]: Note number
 def midiev_note_off(ch, rb):
-  notes_off(ch, rb)
+  notes_off(ch, (rb[0],), smf_notes_off_msg)
 
 
 # MIDI EVENT: Note on
@@ -1793,14 +2437,14 @@ def midiev_note_on(ch, rb):
   global smf_volume_delta
   
   if rb[1] == 0:
-    notes_off(ch, [rb[0]])
+    notes_off(ch, (rb[0],), smf_notes_off_msg)
   else:
-    vol = int(rb[1]) + smf_volume_delta
+    vol = rb[1] + smf_volume_delta
     if vol <= 0:
       vol = 1
     elif vol > 127:
       vol = 127
-    note(ch, int(rb[0]), vol)
+    note(ch, rb[0], vol, smf_note_on_msg)
 
 
 # MIDI EVENT: Polyphonic key pressure
@@ -1820,11 +2464,11 @@ def midiev_control_change(ch, rb):
   # Reverb
   if rb[0] == 0x91:
     # synth_0.set_reverb(channel, program0-7, level0-127, feedback0-255)
-    synth_0.set_reverb(channel, 0, rb[1], 127)
+    control_reverb(ch, 0, rb[1], 127)
   # Chorus
   elif rb[0] == 0x93:
     # synth_0.set_chorus(channel, program0-7, level0-127, feedback0-255, delay0-255)
-    synth_0.set_chorus(channel, 0, rb[1], 127, 127)
+    control_chorus(ch, 0, rb[1], 127, 127)
 
 
 # MIDI EVENT: Program change for standard MIDI file
@@ -1832,7 +2476,7 @@ def midiev_control_change(ch, rb):
 #   rb[0]: Program Number
 def midiev_program_change(ch, rb):
   global synth_0, smf_gmbank
-  synth_0.set_instrument(smf_gmbank, int(ch), int(rb[0]))
+  synth_0.set_instrument(smf_gmbank, ch, rb[0])
 
 
 # MIDI EVENT: channel pressure for standard MIDI file
@@ -1860,13 +2504,19 @@ def midiev_meta_data(et, rb):
   pass
 
 
-# Copy a byte list into an integer list
-#   blist[]: Byte data list (SMF data)
-def to_int_list(blist):
-  ilist = []
-  for b in blist:
-    ilist.append(int(b))
-  return ilist
+# MIDI channel message handlers for standard MIDI file
+#   midiev_handlers[event >> 4] = (data bytes, handler)
+midiev_handlers = (
+  None, None, None, None, None, None, None, None,
+  (2, midiev_note_off),                   # 0x8x: Note off
+  (2, midiev_note_on),                    # 0x9x: Note on (Note off if volume equals zero)
+  (2, midiev_polyphonic_key_pressure),    # 0xAx: Polyphonic key pressure
+  (2, midiev_control_change),             # 0xBx: Control change
+  (1, midiev_program_change),             # 0xCx: Program change
+  (1, midiev_channel_pressure),           # 0xDx: Channel pressure
+  (2, midiev_pitch_bend),                 # 0xEx: Pitch bend
+  None                                    # 0xFx: SysEx and meta data
+)
 
 
 # Play a MIDI file function for Unit-MIDI, works in thread process.
@@ -1877,33 +2527,73 @@ def play_midi(fname):
   global playing_smf, playing_file, smf_play_mode, smf_speed_factor
   global label_smf_file
 
+  # Read n bytes from the SMF file through the read buffer
+  #   Returns a memoryview on the buffer, valid until the next read.
+  def smf_read(n):
+    nonlocal smf_pos, smf_end
+
+    # Refill the buffer, keep the unread bytes at the top
+    if smf_end - smf_pos < n:
+      rest = smf_end - smf_pos
+
+      # Larger than the buffer
+      if n > len(smf_buf):
+        rd = bytes(smf_mv[smf_pos:smf_end]) + f.read(n - rest)
+        smf_pos = 0
+        smf_end = 0
+        return memoryview(rd)
+
+      if rest > 0:
+        smf_buf[0:rest] = bytes(smf_mv[smf_pos:smf_end])
+
+      rd_len = f.readinto(smf_mv[rest:])
+      smf_end = rest + (0 if rd_len is None else rd_len)
+      smf_pos = 0
+
+    rd_len = min(n, smf_end - smf_pos)
+    smf_pos = smf_pos + rd_len
+    return smf_mv[smf_pos - rd_len:smf_pos]
+
+
+  # Read a delta time (variable length quantity, 4 bytes at most) in integer
   def read_delta_time():
-    dt = []
-    rd = [0x80]
-    while rd[0] & 0x80 == 0x80:
-      rd = read_track_data(1, 0, 0)
-      dt.append(rd[0])
+    nonlocal data_len, smf_pos
+
+    rd = smf_read(4)
+    rd_len = len(rd)
+    n = 0
+    while n < rd_len and rd[n] & 0x80 == 0x80:
+      n = n + 1
 
-    return dt
+    # Bytes of the delta time, give back the rest
+    if n < rd_len:
+      n = n + 1
 
+    smf_pos = smf_pos - (rd_len - n)
+    data_len = data_len - n
+    return delta_time(rd[:n])
 
+
+  # Read event data
+  #   Returns the data bytes (valid until the next read)
+  #   del_bytes == 1: Running status, add_data is the first data byte
   def read_track_data(read_bytes, del_bytes, add_data):
     nonlocal data_len
 
     read_bytes = read_bytes - del_bytes
     if read_bytes <= 0:
-      rd = []
+      rd = b''
     else:
-      rd = f.read(read_bytes)
+      rd = smf_read(read_bytes)
       data_len = data_len - read_bytes
 
     if del_bytes == 1:
-      dt = [add_data]
-      dt = dt + to_int_list(rd)
-    else:
-      dt = to_int_list(rd)
-#    print('RET=' + str(len(dt)))
-    return dt
+      rd_len = len(rd)
+      rsr_buf[0] = add_data
+      rsr_buf[1:rd_len + 1] = rd
+      return rsr_mv[:rd_len + 1]
+
+    return rd
 
 
   # Now playing
@@ -1916,78 +2606,84 @@ def play_midi(fname):
   playing_smf = True
   smf_play_mode = 'PLAY'
   playing_file = fname
-  label_smf_file.setText(str('PLAY:'))
+  label_set_text(label_smf_file, 'PLAY:')
 
   filename = smf_file_path + fname
   try:
     # Chunk type: 0=void 1=header 2=track
     chunk_type = 0
     data_len = -1
-    print(os.stat(filename)[0] == 0x8000)
+    if DEBUG:
+      print(os.stat(filename)[0] == 0x8000)
     f = open(filename, 'rb')
-    while True:
+
+    # Read buffer
+    smf_buf = bytearray(512)
+    smf_mv = memoryview(smf_buf)
+    smf_pos = 0
+    smf_end = 0
+
+    # Event data buffer in running status
+    rsr_buf = bytearray(3)
+    rsr_mv = memoryview(rsr_buf)
+    while True:
       # Read a chunk
-      rb = f.read(4)
+      rb = smf_read(4)
       if len(rb) < 4:
         break
       
-      print('CHUNK:' + str(hex(rb[0])) + ' ' + str(hex(rb[1])) + ' ' + str(hex(rb[2])) + ' ' + str(hex(rb[3])))
+      if DEBUG:
+        print('CHUNK:' + str(hex(rb[0])) + ' ' + str(hex(rb[1])) + ' ' + str(hex(rb[2])) + ' ' + str(hex(rb[3])))
       # Header chunk
       if rb[0] == 0x4d and rb[1] == 0x54 and rb[2] == 0x68 and rb[3] == 0x64:
-        print('HEADER CHUNK')
+        if DEBUG:
+          print('HEADER CHUNK')
         chunk_type = 1
         data_len = -1
         # Data length
-        rb = f.read(4)
+        rb = smf_read(4)
         if len(rb) < 4:
           break
-        data_len = rb[0] * 16777216 + rb[1] * 65536 + rb[2] * 256 + rb[3]
+        data_len = struct.unpack('>I', rb)[0]
         if data_len != 6:
           print('Data length error in HEADER CHUNK:' + str(data_len))
           break
-        # Format
-        rb = f.read(2)
-        if len(rb) < 2:
+        # Format, Track number, Time unit
+        rb = smf_read(6)
+        if len(rb) < 6:
           break
-        midi_format = rb[0] * 256 + rb[1]
+        midi_format, track_number, time_unit = struct.unpack('>HHH', rb)
 #        if midi_format < 0 or midi_format > 2:
         if midi_format != 0:
           print('MIDI format error in HEADER CHUNK:' + str(midi_format))
           break
-        # Track number
-        rb = f.read(2)
-        if len(rb) < 2:
-          break
-        track_number = rb[0] * 256 + rb[1]
         if track_number < 1:
           print('Track number error in HEADER CHUNK:' + str(track_number))
           break
-        # Time unit
-        rb = f.read(2)
-        if len(rb) < 2:
-          break
-        time_unit = rb[0] * 256 + rb[1]
         if time_unit < 1:
           print('Time unit error in HEADER CHUNK:' + str(track_number))
           break
 
-        print('HEADER CHUNK: format=' + str(midi_format) + '/tracks=' + str(track_number) + '/timeunit='+ str(time_unit))
+        if DEBUG:
+          print('HEADER CHUNK: format=' + str(midi_format) + '/tracks=' + str(track_number) + '/timeunit='+ str(time_unit))
         time_unit = time_unit / 96.0
 
       # Track chunk
       elif rb[0] == 0x4d and rb[1] == 0x54 and rb[2] == 0x72 and rb[3] == 0x6b:
         chunk_type = 2
         data_len = -1
-        print('TRUCK CHUNK')
+        if DEBUG:
+          print('TRUCK CHUNK')
         # Data length
-        rb = f.read(4)
+        rb = smf_read(4)
         if len(rb) < 4:
           break
-        data_len = rb[0] * 16777216 + rb[1] * 65536 + rb[2] * 256 + rb[3]
+        data_len = struct.unpack('>I', rb)[0]
         if data_len <= 0:
           print('Data length error in TRUCK CHUNK:' + str(data_len))
           break
-        print('READ TRUCK CHUNK: data length=' + str(data_len))
+        if DEBUG:
+          print('READ TRUCK CHUNK: data length=' + str(data_len))
 
         # Read data in the track chunck
         prev_event = 0
@@ -2001,36 +2697,35 @@ def play_midi(fname):
             print('--->STOP PLAYER')
             f.close()
             playing_smf = False
-            label_smf_file.setText(str('FILE:'))
+            label_set_text(label_smf_file, 'FILE:')
             send_all_midi_in_settings()
             return
 
           # SMF player thread control: PAUSE
           if smf_play_mode == 'PAUSE':
             print('--->PAUSE MODE')
-            synth_0.set_master_volume(0)
-            label_smf_file.setText(str('PAUS:'))
+            control_master_volume(0)
+            label_set_text(label_smf_file, 'PAUS:')
             while True:
-              print('WAITING:' + smf_play_mode)
+              if DEBUG:
+                print('WAITING:' + smf_play_mode)
               time.sleep(0.5)
               if smf_play_mode == 'PLAY':
-                synth_0.set_master_volume(master_volume)
-                label_smf_file.setText(str('PLAY:'))
+                control_master_volume(master_volume)
+                label_set_text(label_smf_file, 'PLAY:')
                 break
               if smf_play_mode == 'STOP':
                 f.close()
                 playing_smf = False
-                synth_0.set_master_volume(master_volume)
-                label_smf_file.setText(str('FILE:'))
+                control_master_volume(master_volume)
+                label_set_text(label_smf_file, 'FILE:')
                 return
                 
           # Delta time
-#          print('Get delta time')
-          dtbytes = read_delta_time()
-#          print('Delta time bytes=' + str(len(dtbytes)))
+          dtime = read_delta_time()
 
           # Get an event or data (if in runing status rule)
-          rb = f.read(1)
+          rb = smf_read(1)
           data_len = data_len - 1
 
           # New event
@@ -2044,8 +2739,6 @@ def play_midi(fname):
             rsr = 1
           
           # Delta time
-#          print('Calc delta time:' + str(len(dtbytes)))
-          dtime = delta_time(dtbytes)
 #          print('DELTA TIME=' + str(dtime))
           if dtime > 0:
 #            time.sleep(dtime/200.0)
@@ -2053,43 +2746,21 @@ def play_midi(fname):
 
 #          print('EVT=' + str(hex(ev)) + '/ CH=' + str(ch) + '/ RSR=' + str(rsr) + '/ DTM =' + str(dtime))
 
-          # Note off
-          if ev == 0x80:
-            rb = read_track_data(2, rsr, rsr_bt)
-            midiev_note_off(ch, rb)
-          # Note on (Note off if volume equals zero)
-          elif ev == 0x90:
-            rb = read_track_data(2, rsr, rsr_bt)
-            midiev_note_on(ch, rb)
-          # Polyphonic key pressure
-          elif ev == 0xa0:
-            rb = read_track_data(2, rsr, rsr_bt)
-            midiev_polyphonic_key_pressure(ch, rb)
-          # Control change
-          elif ev == 0xb0:
-            rb = read_track_data(2, rsr, rsr_bt)
-            midiev_control_change(ch, rb)
-          # Program change
-          elif ev == 0xc0:
-            rb = read_track_data(1, rsr, rsr_bt)
-            midiev_program_change(ch, rb)
-          # channel pressure
-          elif ev == 0xd0:
-            rb = read_track_data(1, rsr, rsr_bt)
-            midiev_channel_pressure(ch, rb)
-          # Pitch bend
-          elif ev == 0xe0:
-            rb = read_track_data(2, rsr, rsr_bt)
-            midiev_pitch_bend(ch, rb)
+          # Channel messages
+          handler = midiev_handlers[ev >> 4]
+          if handler is not None:
+            rb = read_track_data(handler[0], rsr, rsr_bt)
+            handler[1](ch, rb)
           # SysEx
           elif ev == 0xf0:
-            print('Fx EVENT=' + str(ch))
+            if DEBUG:
+              print('Fx EVENT=' + str(ch))
             # F0
             if ch == 0:
               rb = read_track_data(1, rsr, rsr_bt)
               
               # Read data to send
-              dlen = int(rb[0])
+              dlen = rb[0]
               rb = read_track_data(dlen, 0, 0)
               midiev_sysex_f0(rb)
 
@@ -2098,7 +2769,7 @@ def play_midi(fname):
               rb = read_track_data(1, rsr, rsr_bt)
               
               # Read data to send
-              dlen = int(rb[0])
+              dlen = rb[0]
               rb = read_track_data(dlen, 0, 0)
               midiev_sysex_f7(rb)
 
@@ -2109,17 +2780,19 @@ def play_midi(fname):
               et = rb[0]
 
               # Data length
-              dtbytes = read_delta_time()
-              dlength = delta_time(dtbytes)
-              print('Data length bytes=' + str(len(dtbytes)) + '/ length=' + str(dlength))
+              dlength = read_delta_time()
+              if DEBUG:
+                print('Data length=' + str(dlength))
               if dlength > 0:
                 rb = read_track_data(dlength, 0, 0)
               else:
                 rb = []
 
-              print('FF event=' + str(hex(et)) + '/ data=' + str(len(rb)) + '/ data_len=' + str(data_len))
+              if DEBUG:
+                print('FF event=' + str(hex(et)) + '/ data=' + str(len(rb)) + '/ data_len=' + str(data_len))
               midiev_meta_data(et, rb)
-              print('FF')
+              if DEBUG:
+                print('FF')
             # Uknown event
             else:
               print('UNKNOWN EVENT=' + str(hex(et)))
@@ -2145,24 +2818,113 @@ def play_midi(fname):
   smf_play_mode = 'STOP'
 
 
+# SMF player thread
+smf_player_lock = None                      # Lock to wake up the SMF player thread
+smf_player_request = None                   # SMF file name to play next
+
+# SMF player thread: Play the SMF files requested by smf_player_start()
+def smf_player_thread():
+  global smf_player_lock, smf_player_request
+
+  while True:
+    smf_player_lock.acquire()
+    fname = smf_player_request
+    smf_player_request = None
+    if fname is not None:
+      play_midi(fname)
+
+
+# Start the SMF player thread waiting for a request
+def smf_player_init():
+  global smf_player_lock
+
+  smf_player_lock = _thread.allocate_lock()
+  smf_player_lock.acquire()
+  _thread.start_new_thread(smf_player_thread, ())
+
+
+# Request the SMF player thread to play a file
+#   fname: Standar MIDI file name to play
+def smf_player_start(fname):
+  global smf_player_lock, smf_player_request
+
+  smf_player_request = fname
+  if smf_player_lock.locked():
+    smf_player_lock.release()
+
+
+# Note on messages to send (status, note, velocity), the SMF player thread has its own
+note_on_msg = bytearray(3)
+smf_note_on_msg = bytearray(3)
+
+
 # Note on a tone in a channel with vol volume.
 # The note is transposed by SMF key transport value.
 #   channle: MIDI channel
 #   tone: MIDI note number
 #   vol: Note on velocity
-def note(channel, tone, vol):
+#   msg: Note on message buffer of the caller's thread
+def note(channel, tone, vol, msg=note_on_msg):
   global synth_0, smf_transpose
-  synth_0.set_note_on(channel, tone + smf_transpose, vol)
+
+  # Out of the note range after transposed
+  tone = tone + smf_transpose
+  if tone < 0 or tone > 127:
+    return
+
+  # Patch the note on message and send it
+  if midi_uart:
+    msg[0] = 0x90 | channel
+    msg[1] = tone
+    msg[2] = vol if vol < 128 else 127
+    midi_uart.write(msg)
+
+  else:
+    synth_0.set_note_on(channel, tone, vol)
+
+
+# Note off messages to send with running status (status, note, velocity, note, velocity, ...)
+#   The SMF player thread has its own
+notes_off_msg = bytearray(1 + 2 * 128)
+smf_notes_off_msg = bytearray(1 + 2 * 128)
 
 
 # Note off all tones in a channel (tones: [60,62,...] etc)
+# Tones out of the note range after transposed are not sent.
 #   channle: MIDI channel
 #   tone: MIDI note number
-def notes_off(channel, tones):
-  global synth_0
+#   msg: Note off messages buffer of the caller's thread
+def notes_off(channel, tones, msg=notes_off_msg):
+  global synth_0, midi_uart
+
+  if len(tones) == 0:
+    return
+
+  # Send all note off messages with running status at once
+  if midi_uart:
+    msg_len = len(msg)
+    msg[0] = 0x80 | channel
+    i = 1
+    for t in tones:
+      t = t + smf_transpose
+      if t < 0 or t > 127:
+        continue
 
-  for t in tones:
-    synth_0.set_note_off(channel, t + smf_transpose)
+      msg[i] = t
+      msg[i + 1] = 0
+      i = i + 2
+      if i == msg_len:
+        midi_uart.write(msg)
+        i = 1
+
+    if i > 1:
+      midi_uart.write(memoryview(msg)[:i])
+
+  else:
+    for t in tones:
+      t = t + smf_transpose
+      if t >= 0 and t <= 127:
+        synth_0.set_note_off(channel, t)
 
 
 # All notes off in a channel.
@@ -2175,6 +2937,27 @@ def all_notes_off(channel = None):
     synth_0.set_all_notes_off(channel)
 
 
+# Effector and master volume messages to send (the same bytes as MIDIUnit sends)
+#   Only the channel and value bytes are patched before sending.
+#   The lock is held while patching and sending, as both threads send effector settings.
+effector_msg_lock = _thread.allocate_lock()
+
+# Reverb: CC80 program, CC91 level
+reverb_msg = bytearray(b'\xB0\x50\x00\xB0\x5B\x00')
+
+# Reverb delay feedback (GS SysEx 40 01 35, for the delay programs 6 and 7 only)
+reverb_fback_msg = bytearray(b'\xF0\x41\x00\x42\x12\x40\x01\x35\x00\x00\xF7')
+
+# Chorus: CC81 program, CC93 level, then feedback and delay (GS SysEx 40 01 3B, 40 01 3C)
+chorus_msg = bytearray(b'\xB0\x51\x00\xB0\x5D\x00\xF0\x41\x00\x42\x12\x40\x01\x3B\x00\x00\xF7\xF0\x41\x00\x42\x12\x40\x01\x3C\x00\x00\xF7')
+
+# Vibrate: NRPN 01 08 rate, 01 09 depth, 01 0A delay with data entry
+vibrate_msg = bytearray(b'\xB0\x63\x01\xB0\x62\x08\xB0\x06\x00\xB0\x63\x01\xB0\x62\x09\xB0\x06\x00\xB0\x63\x01\xB0\x62\x0A\xB0\x06\x00')
+
+# Master volume: Universal Real Time SysEx (F0 7F 7F 04 01 ll mm F7)
+master_volume_msg = bytearray(b'\xF0\x7F\x7F\x04\x01\x00\x00\xF7')
+
+
 # Set reverb parameter
 #   ch: MIDI channel
 #   prog : Reverb program number
@@ -2182,7 +2965,20 @@ def all_notes_off(channel = None):
 #   fback: Reverb feedback
 def control_reverb(ch, prog, level, fback):
   global synth_0
-  synth_0.set_reverb(ch, prog, level, fback)
+  smf_effector_sent['reverb'] = None
+  if midi_uart:
+    with effector_msg_lock:
+      reverb_msg[0] = 0xB0 | ch
+      reverb_msg[2] = prog & 0x07
+      reverb_msg[3] = 0xB0 | ch
+      reverb_msg[5] = level & 0x7f
+      midi_uart.write(reverb_msg)
+      if prog == 6 or prog == 7:
+        reverb_fback_msg[8] = fback & 0x7f
+        midi_uart.write(reverb_fback_msg)
+
+  else:
+    synth_0.set_reverb(ch, prog, level, fback)
 
 
 # Set chorus parameter
@@ -2193,7 +2989,19 @@ def control_reverb(ch, prog, level, fback):
 #   delay: Chorus delay
 def control_chorus(ch, prog, level, fback, delay):
   global synth_0
-  synth_0.set_chorus(ch, prog, level, fback, delay)
+  smf_effector_sent['chorus'] = None
+  if midi_uart:
+    with effector_msg_lock:
+      chorus_msg[0] = 0xB0 | ch
+      chorus_msg[2] = prog & 0x07
+      chorus_msg[3] = 0xB0 | ch
+      chorus_msg[5] = level & 0x7f
+      chorus_msg[14] = fback & 0x7f
+      chorus_msg[25] = delay & 0x7f
+      midi_uart.write(chorus_msg)
+
+  else:
+    synth_0.set_chorus(ch, prog, level, fback, delay)
 
 
 # Set vibrate parameter
@@ -2203,23 +3011,50 @@ def control_chorus(ch, prog, level, fback, delay):
 #   delay: Chorus delay
 def control_vibrate(ch, rate, depth, delay):
   global synth_0
-  synth_0.set_vibrate(ch, rate, depth, delay)
+  smf_effector_sent['vibrate'] = None
+  if midi_uart:
+    with effector_msg_lock:
+      for i in range(0, 27, 3):
+        vibrate_msg[i] = 0xB0 | ch
+
+      vibrate_msg[8] = rate & 0x7f
+      vibrate_msg[17] = depth & 0x7f
+      vibrate_msg[26] = delay & 0x7f
+      midi_uart.write(vibrate_msg)
+
+  else:
+    synth_0.set_vibrate(ch, rate, depth, delay)
 
 
+# Set master volume of Unit-MIDI
+#   vol: Master volume (0..127)
+def control_master_volume(vol):
+  global synth_0
+  if midi_uart:
+    with effector_msg_lock:
+      master_volume_msg[6] = vol & 0x7f
+      midi_uart.write(master_volume_msg)
+
+  else:
+    synth_0.set_master_volume(vol)
+
+
+# GM program names (loaded from GM0.TXT at the first use, blank lines are skipped)
+gm_program_names = None
+
 # Get GM prgram name
 #   gmbank: GM bank number
 #   program: GM program number
 def get_gm_program_name(gmbabnk, program):
-  with open(smf_file_path + 'GM0.TXT') as f:
-    for mf in f:
-      mf = mf.strip()
-      if len(mf) > 0:
-        if program == 0:
-          f.close()
-          return mf
-      program = program - 1
-
-  f.close()
+  global gm_program_names
+
+  if gm_program_names is None:
+    with open(smf_file_path + 'GM0.TXT') as f:
+      gm_program_names = tuple([n for n in (mf.strip() for mf in f) if n])
+
+  if 0 <= program and program < len(gm_program_names):
+    return gm_program_names[program]
+
   return 'UNKNOWN'
 
 
@@ -2230,7 +3065,7 @@ def set_smf_volume_delta(dlt):
   global smf_volume_delta, label_smf_volume
 
   smf_volume_delta = smf_volume_delta + dlt
-  label_smf_volume.setText('{:0=+3d}'.format(smf_volume_delta))
+  label_set_text(label_smf_volume, sign3_str(smf_volume_delta))
 
 
 # Set and show new transpose value for SMF player
@@ -2244,16 +3079,17 @@ def set_smf_transpose(dlt):
     smf_transpose = 0
   elif smf_transpose == 13:
     smf_transpose = 0
-  label_smf_transp.setText('{:0=+3d}'.format(smf_transpose))
+  label_set_text(label_smf_transp, sign3_str(smf_transpose))
 
 
 # Send a MIDI channel settings to Unit-MIDI
 #   ch: MIDI channel
 def send_midi_in_settings(ch):
-  synth_0.set_instrument(midi_in_settings[ch]['gmbank'], ch, midi_in_settings[ch]['program'])
-  control_reverb(ch, midi_in_settings[ch]['reverb'][0], midi_in_settings[ch]['reverb'][1], midi_in_settings[ch]['reverb'][2])
-  control_chorus(ch, midi_in_settings[ch]['chorus'][0], midi_in_settings[ch]['chorus'][1], midi_in_settings[ch]['chorus'][2], midi_in_settings[ch]['chorus'][3])
-  control_vibrate(ch, midi_in_settings[ch]['vibrate'][0], midi_in_settings[ch]['vibrate'][1], midi_in_settings[ch]['vibrate'][2])
+  settings = midi_in_settings[ch]
+  synth_0.set_instrument(settings['gmbank'], ch, settings['program'])
+  control_reverb(ch, *settings['reverb'])
+  control_chorus(ch, *settings['chorus'])
+  control_vibrate(ch, *settings['vibrate'])
 
 
 # Send all MIDI channel settings
@@ -2283,28 +3119,25 @@ def send_sequencer_current_channel_settings(ch):
 # Set and show new MIDI channel for MIDI-IN player
 #   dlt: MIDI channel delta value added to the current MIDI IN channel to edit.
 def set_midi_in_channel(dlt):
-  global midi_in_ch, label_channel
-  global midi_in_settings, enc_parm
-
-  midi_in_ch = (midi_in_ch + dlt) % 16
-  label_channel.setText('{:0>2d}'.format(midi_in_ch + 1))
+  global midi_in_ch
 
-  set_midi_in_program(0)
+  midi_in_ch = (midi_in_ch + dlt) & 15
+  send_midi_in_settings(midi_in_ch)
+  show_midi_in_channel()
 
-  midi_in_reverb = midi_in_settings[midi_in_ch]['reverb']
-  set_midi_in_reverb(midi_in_reverb[0], midi_in_reverb[1], midi_in_reverb[2])
 
-  midi_in_chorus = midi_in_settings[midi_in_ch]['chorus']
-  set_midi_in_chorus(midi_in_chorus[0], midi_in_chorus[1], midi_in_chorus[2], midi_in_chorus[3])
+# Show the current MIDI IN channel settings without sending them
+def show_midi_in_channel():
+  global enc_parm
 
-  midi_in_vibrate = midi_in_settings[midi_in_ch]['vibrate']
-  set_midi_in_vibrate(midi_in_vibrate[0], midi_in_vibrate[1], midi_in_vibrate[2])
+  label_set_text(label_channel, num2_str(midi_in_ch + 1))
+  show_midi_in_program()
 
   # Reset the parameter to edit
   enc_parm = EFFECTOR_PARM_INIT
-  label_midi_parm_title.setText(enc_parameter_info[enc_parm]['title'])
-  label_midi_parameter.setText(enc_parameter_info[enc_parm]['params'][0]['label'])
-  label_midi_parm_value.setText('{:03d}'.format(midi_in_settings[midi_in_ch]['reverb'][0]))
+  label_set_text(label_midi_parm_title, enc_parameter_table[enc_parm][0])
+  label_set_text(label_midi_parameter, enc_parameter_table[enc_parm][1])
+  label_set_text(label_midi_parm_value, num3_str(midi_in_settings[midi_in_ch]['reverb'][0]))
 
 
 # Set and show new program to the current MIDI channel for MIDI-IN player
@@ -2313,13 +3146,20 @@ def set_midi_in_program(dlt):
   global synth_0, label_program, label_program_name
   global midi_in_settings, midi_in_ch
 
-  midi_in_settings[midi_in_ch]['program'] = (midi_in_settings[midi_in_ch]['program'] + dlt) % 128
+  midi_in_settings[midi_in_ch]['program'] = (midi_in_settings[midi_in_ch]['program'] + dlt) & 127
+  midi_in_program = show_midi_in_program()
+  synth_0.set_instrument(midi_in_settings[midi_in_ch]['gmbank'], midi_in_ch, midi_in_program)
+
+
+# Show the program of the current MIDI IN channel
+#   Returns the program number
+def show_midi_in_program():
   midi_in_program = midi_in_settings[midi_in_ch]['program']
-  label_program.setText('{:0>3d}'.format(midi_in_program))
+  label_set_text(label_program, num3_str(midi_in_program))
 
   prg = get_gm_program_name(midi_in_settings[midi_in_ch]['gmbank'], midi_in_program)
-  label_program_name.setText(prg)
-  synth_0.set_instrument(midi_in_settings[midi_in_ch]['gmbank'], midi_in_ch, midi_in_program)
+  label_set_text(label_program_name, prg)
+  return midi_in_program
 
 
 # Set and show new master volume value
@@ -2333,12 +3173,26 @@ def set_synth_master_volume(dlt):
     master_volume = 0
   elif master_volume > 127:
     master_volume = 127
-  synth_0.set_master_volume(master_volume)
+  control_master_volume(master_volume)
 
   if app_screen_mode == SCREEN_MODE_PLAYER:
-    label_master_volume.setText('{:0>3d}'.format(master_volume))
+    label_set_text(label_master_volume, num3_str(master_volume))
   elif app_screen_mode == SCREEN_MODE_SEQUENCER:
-    label_seq_master_volume.setText('{:0>3d}'.format(master_volume))
+    label_set_text(label_seq_master_volume, num3_str(master_volume))
+
+
+# Set effector parameter values given (not None)
+#   slot  : Effector parameter list to update
+#   values: New values in the order of slot (None: not change)
+#   Returns True if any value is given
+def set_effector_values(slot, values):
+  changed = False
+  for i in range(len(values)):
+    if values[i] is not None:
+      slot[i] = values[i]
+      changed = True
+
+  return changed
 
 
 # Set reverb parameters for the current MIDI IN channel
@@ -2346,25 +3200,11 @@ def set_synth_master_volume(dlt):
 #   level: Reverb level
 #   fback: Reverb feedback
 def set_midi_in_reverb(prog=None, level=None, fback=None):
-  global midi_in_ch
   global midi_in_settings, midi_in_ch
 
-  disp = None
-  if not prog is None:
-    midi_in_settings[midi_in_ch]['reverb'][0] = prog
-    disp = prog
-
-  if not level is None:
-    midi_in_settings[midi_in_ch]['reverb'][1] = level
-    disp = level
-    
-  if not fback is None:
-    midi_in_settings[midi_in_ch]['reverb'][2] = fback
-    disp = fback
-
   midi_in_reverb = midi_in_settings[midi_in_ch]['reverb']
-  if not disp is None:
-    control_reverb(midi_in_ch, midi_in_reverb[0], midi_in_reverb[1], midi_in_reverb[2])
+  if set_effector_values(midi_in_reverb, (prog, level, fback)):
+    control_reverb(midi_in_ch, *midi_in_reverb)
 
 
 # Set reverb parameters for SMF player (to all MIDI channel)
@@ -2372,24 +3212,17 @@ def set_midi_in_reverb(prog=None, level=None, fback=None):
 #   level: Reverb level
 #   fback: Reverb feedback
 def set_smf_reverb(prog=None, level=None, fback=None):
-  global label_smf_parameter, smf_settings, midi_in_ch
+  global smf_settings
 
-  disp = None
-  if not prog is None:
-    smf_settings['reverb'][0] = prog
-    disp = prog
+  smf_reverb = smf_settings['reverb']
+  if set_effector_values(smf_reverb, (prog, level, fback)):
+    sent = bytes(smf_reverb)
+    if sent != smf_effector_sent.get('reverb'):
+      prog, level, fback = sent
+      for ch in range(16):
+        control_reverb(ch, prog, level, fback)
 
-  if not level is None:
-    smf_settings['reverb'][1] = level
-    disp = level
-    
-  if not fback is None:
-    smf_settings['reverb'][2] = fback
-    disp = fback
-
-  if not disp is None:
-    for ch in range(16):
-      control_reverb(ch, smf_settings['reverb'][0], smf_settings['reverb'][1], smf_settings['reverb'][2])
+      smf_effector_sent['reverb'] = sent
 
 
 # Set chorus parameters for the current MIDI-IN channel
@@ -2398,29 +3231,11 @@ def set_smf_reverb(prog=None, level=None, fback=None):
 #   fback: Chorus feedback
 #   delay: Chorus delay
 def set_midi_in_chorus(prog=None, level=None, fback=None, delay=None):
-  global midi_in_ch
-  global midi_in_settings
-
-  send = False
-  if not prog is None:
-    midi_in_settings[midi_in_ch]['chorus'][0] = prog
-    send = True
-
-  if not level is None:
-    midi_in_settings[midi_in_ch]['chorus'][1] = level
-    send = True
-    
-  if not fback is None:
-    midi_in_settings[midi_in_ch]['chorus'][2] = fback
-    send = True
-    
-  if not delay is None:
-    midi_in_settings[midi_in_ch]['chorus'][3] = delay
-    send = True
+  global midi_in_settings, midi_in_ch
 
   midi_in_chorus = midi_in_settings[midi_in_ch]['chorus']
-  if send:
-    control_chorus(midi_in_ch, midi_in_chorus[0], midi_in_chorus[1], midi_in_chorus[2], midi_in_chorus[3])
+  if set_effector_values(midi_in_chorus, (prog, level, fback, delay)):
+    control_chorus(midi_in_ch, *midi_in_chorus)
 
 
 # Set chorus parameters for SMF player (to all MIDI channel)
@@ -2429,28 +3244,17 @@ def set_midi_in_chorus(prog=None, level=None, fback=None, delay=None):
 #   fback: Chorus feedback
 #   delay: Chorus delay
 def set_smf_chorus(prog=None, level=None, fback=None, delay=None):
-  global label_smf_parm_value, smf_settings, midi_in_ch
+  global smf_settings
 
-  send = False
-  if not prog is None:
-    smf_settings['chorus'][0] = prog
-    send = True
+  smf_chorus = smf_settings['chorus']
+  if set_effector_values(smf_chorus, (prog, level, fback, delay)):
+    sent = bytes(smf_chorus)
+    if sent != smf_effector_sent.get('chorus'):
+      prog, level, fback, delay = sent
+      for ch in range(16):
+        control_chorus(ch, prog, level, fback, delay)
 
-  if not level is None:
-    smf_settings['chorus'][1] = level
-    send = True
-    
-  if not fback is None:
-    smf_settings['chorus'][2] = fback
-    send = True
-    
-  if not delay is None:
-    smf_settings['chorus'][3] = delay
-    send = True
-
-  if send:
-    for ch in range(16):
-      control_chorus(ch, smf_settings['chorus'][0], smf_settings['chorus'][1], smf_settings['chorus'][2], smf_settings['chorus'][3])
+      smf_effector_sent['chorus'] = sent
 
 
 # Set vibrate parameters for the current MIDI-IN channel
@@ -2458,25 +3262,11 @@ def set_smf_chorus(prog=None, level=None, fback=None, delay=None):
 #   depth: Vibrate depth
 #   delay: Vibrate delay
 def set_midi_in_vibrate(rate=None, depth=None, delay=None):
-  global midi_in_ch
-  global midi_in_settings
-
-  send = False
-  if not rate is None:
-    midi_in_settings[midi_in_ch]['vibrate'][0] = rate
-    send = True
-
-  if not depth is None:
-    midi_in_settings[midi_in_ch]['vibrate'][1] = depth
-    send = True
-    
-  if not delay is None:
-    midi_in_settings[midi_in_ch]['vibrate'][2] = delay
-    send = True
+  global midi_in_settings, midi_in_ch
 
   midi_in_vibrate = midi_in_settings[midi_in_ch]['vibrate']
-  if send:
-    control_vibrate(midi_in_ch, midi_in_vibrate[0], midi_in_vibrate[1], midi_in_vibrate[2])
+  if set_effector_values(midi_in_vibrate, (rate, depth, delay)):
+    control_vibrate(midi_in_ch, *midi_in_vibrate)
 
 
 # Set vibrate parameters for SMF player (to all MIDI channel)
@@ -2484,37 +3274,102 @@ def set_midi_in_vibrate(rate=None, depth=None, delay=None):
 #   depth: Vibrate depth
 #   delay: Vibrate delay
 def set_smf_vibrate(rate=None, depth=None, delay=None):
-  global label_smf_parm_value, smf_settings, midi_in_ch
+  global smf_settings
 
-  send = False
-  if not rate is None:
-    smf_settings['vibrate'][0] = rate
-    send = True
+  smf_vibrate = smf_settings['vibrate']
+  if set_effector_values(smf_vibrate, (rate, depth, delay)):
+    sent = bytes(smf_vibrate)
+    if sent != smf_effector_sent.get('vibrate'):
+      rate, depth, delay = sent
+      for ch in range(16):
+        control_vibrate(ch, rate, depth, delay)
 
-  if not depth is None:
-    smf_settings['vibrate'][1] = depth
-    send = True
-    
-  if not delay is None:
-    smf_settings['vibrate'][2] = delay
-    send = True
-
-  if send:
-    for ch in range(16):
-      control_vibrate(ch, smf_settings['vibrate'][0], smf_settings['vibrate'][1], smf_settings['vibrate'][2])
+      smf_effector_sent['vibrate'] = sent
 
 
 # MIDI IN
+# UART IRQ handler: Receive MIDI IN data into the ring buffer
+#   This is the only producer of the ring buffer (it moves midi_in_ring_tail).
+#   It is called as the UART IRQ handler or via micropython.schedule(), so it never runs
+#   concurrently with itself. The main thread only moves midi_in_ring_head.
+#   When the ring buffer gets full, uart.any() tells whether bytes are still left in the UART.
+#   Then midi_in_ring_full is set and midi_in() schedules this again after sending the ring,
+#   because the RXIDLE IRQ does not fire again for the bytes already received.
+def midi_in_receive(uart):
+  global midi_in_ring_tail, midi_in_ring_full
+
+  tail = midi_in_ring_tail
+  full = False
+  while True:
+    free = (midi_in_ring_head - tail - 1) & (MIDI_IN_RING_SIZE - 1)
+    if free == 0:
+      full = uart.any() > 0
+      break
+
+    rd = uart.readinto(midi_in_ring_mv[tail:tail + min(free, MIDI_IN_RING_SIZE - tail)])
+    if not rd:
+      break
+
+    tail = (tail + rd) & (MIDI_IN_RING_SIZE - 1)
+
+  midi_in_ring_tail = tail
+  midi_in_ring_full = full
+
+
+# Receive MIDI IN with the UART IRQ if available
+def midi_in_init():
+  global midi_uart, midi_in_irq
+
+  try:
+    midi_uart.irq(handler = midi_in_receive, trigger = midi_uart.IRQ_RXIDLE)
+    midi_in_irq = True
+  except Exception as e:
+    print('MIDI IN IRQ ERROR:', e)
+    midi_in_irq = False
+
+
 # Receive MIDI IN data (UART), then send it to MIDI OUT (UART)
 def midi_in():
   global midi_uart, midi_received, label_midi_in
   global app_screen_mode
+  global midi_in_ring_head
+
+  # Send the data in the ring buffer
+  if midi_in_irq:
+    head = midi_in_ring_head
+    tail = midi_in_ring_tail
+    received = head != tail
+    if received:
+      if head < tail:
+        midi_uart.write(midi_in_ring_mv[head:tail])
+      else:
+        midi_uart.write(midi_in_ring_mv[head:])
+        if tail > 0:
+          midi_uart.write(midi_in_ring_mv[:tail])
+
+      midi_in_ring_head = tail
 
-  midi_rcv_bytes = midi_uart.any()
-  if midi_rcv_bytes > 0:
-    midi_in_data = midi_uart.read()
-#    print('MIDI IN:', midi_in_data)
-    midi_uart.write(midi_in_data)
+    # Receive the data left in the UART in the IRQ handler context (not in this thread)
+    if midi_in_ring_full:
+      try:
+        micropython.schedule(midi_in_receive, midi_uart)
+      except RuntimeError:
+        pass
+
+  # Poll the UART (the ring buffer is used as a receive buffer)
+  else:
+    rcv_bytes = midi_uart.any()
+    received = rcv_bytes > 0
+    if received:
+      if rcv_bytes > MIDI_IN_RING_SIZE:
+        rcv_bytes = MIDI_IN_RING_SIZE
+
+      rcv_bytes = midi_uart.readinto(midi_in_ring, rcv_bytes)
+#      print('MIDI IN:', bytes(midi_in_ring_mv[:rcv_bytes]))
+      if rcv_bytes:
+        midi_uart.write(midi_in_ring_mv[:rcv_bytes])
+
+  if received:
     if midi_received == False:
       midi_received = True
       if app_screen_mode == SCREEN_MODE_PLAYER:
@@ -2530,862 +3385,984 @@ def midi_in():
 def midi_file_catalog():
   global label_smf_fname, smf_file_selected
   with open(smf_file_path + 'LIST.TXT') as f:
-    for mf in f:
-      mf = mf.strip()
-      if len(mf) > 0:
-        cat = mf.split(',')
-        if len(cat) == 3:
-          smf_files.append(cat)
-
-  f.close()
+    catalog = f.read()
+
+  # (<title>, <file name>, <speed factor>) in each line
+  for mf in catalog.split('\n'):
+    cat = mf.strip().split(',')
+    if len(cat) == 3:
+      smf_files.append((cat[0].strip(), cat[1].strip(), float(cat[2])))
+
   if len(smf_files) > 0:
     smf_file_selected = 0
-    label_smf_fname.setText(smf_files[0][0])
-    for i in range(len(smf_files)):
-      smf_files[i][2] = float(smf_files[i][2])
+    label_set_text(label_smf_fname, smf_files[0][0])
 
 
-# Read 8encoder values and take actions
-def encoder_read():
-  global encoder8_0, enc_button_ch, enc_slide_switch, enc_parm, enc_parm_decade, enc_volume_decade, enc_mastervol_decade
-  global midi_in_ch, playing_smf, smf_speed_factor, smf_file_selected, smf_files, smf_play_mode
-  global midi_in_settings, midi_in_set_num, enc_midi_set_ctrl, enc_midi_set_decade, enc_midi_prg_decade
-  global enc_parameter_info, enc_total_parameters, smf_settings
-  global app_screen_mode
-  global seq_control, seq_edit_track, seq_cursor_time, seq_cursor_note
-  global seq_file_number, seq_file_ctrl
-  global seq_parm, seq_play_time, seq_score
-  global seq_parm_repeat
+# Get a flat parameter definition of a parameter number (None: no parameter)
+def get_enc_param(idx):
+  global enc_parameter_table
 
-  # Get a parameter info array and parameter('params') index in the info.
-  def get_enc_param_index(idx):
-    pfrom = 0
-    pto = -1
-    for effector in enc_parameter_info:
-      pnum = len(effector['params'])
-      pfrom = pto + 1
-      pto = pfrom + pnum - 1
-      if pfrom <= idx and idx <= pto:
-        return (effector, idx - pfrom)
+  if idx >= 0 and idx < len(enc_parameter_table):
+    return enc_parameter_table[idx]
 
-    return (None, -1)
+  return None
 
 
-  ##### encoder_read() program
+# Change the effector parameter to edit (pre-process of the parameter encoders)
+def encoder_select_parameter(delta, slide_switch_change):
+  global enc_parm
 
-  # Slide switch
-  slide_switch_change = False
-  slide_switch = encoder8_0.get_switch_status()
-  if enc_slide_switch is None:
-    enc_slide_switch = slide_switch
-    slide_switch_change = True
-  elif slide_switch != enc_slide_switch:
-    enc_slide_switch = slide_switch
-    slide_switch_change = True
-  
-  if slide_switch_change:
-    # Player screen
-    if app_screen_mode == SCREEN_MODE_PLAYER:
-      title_smf_params.setColor(0xff4040 if enc_slide_switch else 0xff8080, 0x555555 if enc_slide_switch else 0x222222)
-      title_midi_in_params.setColor(0xff8080 if enc_slide_switch else 0xff4040, 0x222222 if enc_slide_switch else 0x555555)
+  if delta != 0 or slide_switch_change:
+    # Change the target parameter to edit with CTRL1
+    enc_parm = (enc_parm + delta) % enc_total_parameters
 
-    # Sequencer screen
-    seq_edit_track = 0 if enc_slide_switch else 1
-    if app_screen_mode == SCREEN_MODE_SEQUENCER:
-      seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
-      sequencer_draw_track(0)
-      sequencer_draw_track(1)
-      label_seq_key1.setColor(0xff4040 if seq_edit_track == 0 else 0x00ccff)
-      label_seq_key2.setColor(0xff4040 if seq_edit_track == 1 else 0x00ccff)
 
-      # Set MIDI channel 1 program as the current MIDI channel program
-      send_sequencer_current_channel_settings(seq_track_midi[seq_edit_track])
+# Decade value button of the parameter control encoders (toggle)
+def encoder_parameter_decade(enc_ch, enc_button):
+  global enc_parm_decade
 
-  # Scan encoders
-  for enc_ch in range(1,9):
-    enc_menu = enc_ch + (10 if enc_slide_switch else 0) + (100 if app_screen_mode == SCREEN_MODE_SEQUENCER else 0)
-    enc_count = encoder8_0.get_counter_value(enc_ch)
-    enc_button = not encoder8_0.get_button_status(enc_ch)
+  if enc_button and enc_button_ch[enc_ch-1]:
+    enc_parm_decade = not enc_parm_decade
 
-    # Get an edge trigger of the encoder button
-    if enc_button == True:
-      if enc_button_ch[enc_ch-1] == True:
-        enc_button = False
+  if enc_parm_decade:
+    encoder8_0.set_led_rgb(enc_ch, 0xffa000)
+
+
+##### PLAYER SCREEN MODE #####
+
+# Select SMF file
+def encoder_smf_file(enc_ch, delta, enc_button, slide_switch_change):
+  global smf_file_selected, smf_play_mode, smf_speed_factor
+
+  # Select a MIDI file
+  if playing_smf == False:
+    if smf_file_selected >= 0:
+      if delta == -1:
+        smf_file_selected = smf_file_selected - 1
+        if smf_file_selected == -1:
+          smf_file_selected = len(smf_files) - 1
+      elif delta == 1:
+        smf_file_selected = smf_file_selected + 1
+        if smf_file_selected == len(smf_files):
+          smf_file_selected = 0
+
+      if delta != 0:
+        label_set_text(label_smf_fnum, num3_str(smf_file_selected))
+        label_set_text(label_smf_fname, smf_files[smf_file_selected][0])
+
+  # Play the selected MIDI file or stop playing
+  if enc_button == True:
+    if playing_smf == True:
+      print('STOP MIDI PLAYER')
+      smf_play_mode = 'STOP'
+    else:
+      print('REPLAY MIDI PLAYER')
+      if smf_file_selected >= 0:
+        smf_speed_factor = smf_files[smf_file_selected][2]
+        label_set_text(label_smf_tempo, speed_str(smf_speed_factor))
+        smf_player_start(smf_files[smf_file_selected][1])
+
+
+# Set transpose for SMF player
+def encoder_smf_transpose(enc_ch, delta, enc_button, slide_switch_change):
+  global smf_play_mode
+
+  if delta != 0:
+    all_notes_off()
+    set_smf_transpose(delta)
+
+  # Pause/Restart SMF player in playing
+  if enc_button == True:
+    if playing_smf == True:
+      if smf_play_mode == 'PLAY':
+        print('PAUSE MIDI PLAYER')
+        smf_play_mode = 'PAUSE'
       else:
-        enc_button_ch[enc_ch-1] = True
-        encoder8_0.set_led_rgb(enc_ch, 0x40ff40)
+        print('CONTINUE MIDI PLAYER')
+        smf_play_mode = 'PLAY'
     else:
-      if enc_button_ch[enc_ch-1] == True:
-        encoder8_0.set_led_rgb(enc_ch, 0x000000)
-        enc_button_ch[enc_ch-1] = False
+      print('MIDI PLAYER NOT PLAYING')
 
-    # Encoder rotations
-    if enc_count >= 2:
-      delta = 1
-    elif  enc_count <= -2:
-      delta = -1
-    else:
-      delta = 0
 
-    # Reset the encoder counter
+# Set volume for SMF player
+def encoder_smf_volume(enc_ch, delta, enc_button, slide_switch_change):
+  global enc_volume_decade
+
+  # Decade value button (toggle)
+  if enc_button and enc_button_ch[enc_ch-1]:
+    enc_volume_decade = not enc_volume_decade
+
+  if enc_volume_decade:
+    encoder8_0.set_led_rgb(enc_ch, 0xffa000)
+
+  # Slide switch off: midi-in mode
+  if enc_slide_switch == False:
+    pass
+
+  # Slide switch on: SMF player mode
+  else:
     if delta != 0:
-      encoder8_0.set_counter_value(enc_ch, 0)
-
-    ## PRE-PROCESS: Parameter encoder
-    if enc_menu == ENC_SMF_PARAMETER or enc_menu == ENC_MIDI_PARAMETER:
-      if delta != 0 or slide_switch_change:
-        # Change the target parameter to edit with CTRL1
-        enc_parm = enc_parm + delta
-        if enc_parm < 0:
-          enc_parm = enc_total_parameters -1
-        elif enc_parm >= enc_total_parameters:
-          enc_parm = 0
-
-    ## PRE-PROCESS: Parameter control encoder
-    if enc_menu == ENC_SMF_CTRL or enc_menu == ENC_MIDI_CTRL:
-      # Decade value button (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        enc_parm_decade = not enc_parm_decade
-
-      if enc_parm_decade:
-        encoder8_0.set_led_rgb(enc_ch, 0xffa000)
-
-    ## PRE-PROCESS: Sequencer parameter encoder
-    if enc_menu == ENC_SEQ_PARAMETER1 or enc_menu == ENC_SEQ_PARAMETER2:
-      if delta != 0 or slide_switch_change:
-        # Change the target parameter to edit with CTRL1
-        seq_parm = seq_parm + delta
-        if seq_parm < 0:
-          seq_parm = seq_total_parameters -1
-        elif seq_parm >= seq_total_parameters:
-          seq_parm = 0
-
-    ## PRE-PROCESS: Parameter control encoder
-    if enc_menu == ENC_SEQ_CTRL1 or enc_menu == ENC_SEQ_CTRL2:
-      # Decade value button (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        enc_parm_decade = not enc_parm_decade
-
-      if enc_parm_decade:
-        encoder8_0.set_led_rgb(enc_ch, 0xffa000)
-
-      # Show repeat sign parameter just after changing the current time
-      if seq_parm == SEQUENCER_PARM_REPEAT:
-        if seq_parm_repeat is None:
-          seq_parm_repeat = seq_control['time_cursor']
-          rept = sequencer_get_repeat_control(seq_parm_repeat)
-          if rept is None:
-            label_seq_parm_value.setText('NON')
-
-        elif seq_parm_repeat != seq_control['time_cursor']:
-          seq_parm_repeat = seq_control['time_cursor']
-          rept = sequencer_get_repeat_control(seq_parm_repeat)
+      set_smf_volume_delta(delta * (10 if enc_volume_decade else 1))
+
+
+# Set tempo for SMF player
+def encoder_smf_tempo(enc_ch, delta, enc_button, slide_switch_change):
+  global smf_speed_factor
+
+  # Change MIDI play speed
+  if delta == -1:
+    smf_speed_factor = smf_speed_factor - 0.1
+    if smf_speed_factor < 0.1:
+      smf_speed_factor = 0.1
+  elif delta == 1:
+    smf_speed_factor = smf_speed_factor + 0.1
+    if smf_speed_factor > 5:
+      smf_speed_factor = 5
+
+  if delta != 0:
+    label_set_text(label_smf_tempo, speed_str(smf_speed_factor))
+
+
+# Select parameter to edit
+def encoder_smf_parameter(enc_ch, delta, enc_button, slide_switch_change):
+  encoder_select_parameter(delta, slide_switch_change)
+  if delta != 0 or slide_switch_change:
+    # Get parameter info of enc_parm
+    param = get_enc_param(enc_parm)
+    if param is not None:
+      (pttl, plbl, key, prm_index, val_max, decade, set_smf, set_midi) = param
+      disp = smf_settings[key][prm_index]
+    else:
+      pttl = '????'
+      plbl = '????'
+      disp = 999
+
+    # Display the parameter
+    label_set_text(label_smf_parm_title, pttl)
+    label_set_text(label_smf_parameter, plbl)
+    label_set_text(label_smf_parm_value, num3_str(disp))
+
+
+# Set parameter value
+def encoder_smf_ctrl(enc_ch, delta, enc_button, slide_switch_change):
+  encoder_parameter_decade(enc_ch, enc_button)
+  if delta != 0 or slide_switch_change:
+    # Get parameter info of enc_parm
+    param = get_enc_param(enc_parm)
+    if param is not None:
+      # MAX, DECADE of the parameter and the current settings of the effector
+      (pttl, plbl, key, prm_index, val_max, decade, set_smf, set_midi) = param
+      settings = smf_settings[key]
+      val = settings[prm_index] + delta * (10 if enc_parm_decade and decade else 1)
+      if val < 0:
+        val = val_max
+      elif val > val_max:
+        val = 0
+
+      # Send MIDI message
+      settings[prm_index] = val
+      set_smf(*settings)
+      disp = val
+    else:
+      disp = 999
 
-        else:
-          rept = None
+    # Display the label
+    label_set_text(label_smf_parm_value, num3_str(disp))
 
-        if not rept is None:
-          disp = 'NON'
-          if rept['loop']:
-            disp = 'LOP'
-          elif rept['skip']:
-            disp = 'SKP'
-          elif rept['repeat']:
-            disp = 'RPT'
 
-          label_seq_parm_value.setText(disp)
+# Select MIDI setting file
+def encoder_midi_set(enc_ch, delta, enc_button, slide_switch_change):
+  global enc_midi_set_decade, midi_in_set_num
 
-    ## MENU PROCESS
-    # Select SMF file
-    if enc_menu == ENC_SMF_FILE:
-        # Select a MIDI file
-        if playing_smf == False:
-          if smf_file_selected >= 0:
-            if delta == -1:
-              smf_file_selected = smf_file_selected - 1
-              if smf_file_selected == -1:
-                smf_file_selected = len(smf_files) - 1
-            elif delta == 1:
-              smf_file_selected = smf_file_selected + 1
-              if smf_file_selected == len(smf_files):
-                smf_file_selected = 0
-
-            if delta != 0:
-              label_smf_fnum.setText('{:03d}'.format(smf_file_selected))
-              label_smf_fname.setText(smf_files[smf_file_selected][0])
-
-        # Play the selected MIDI file or stop playing
-        if enc_button == True:
-          if playing_smf == True:
-            print('STOP MIDI PLAYER')
-            smf_play_mode = 'STOP'
-          else:
-            print('REPLAY MIDI PLAYER')
-            if smf_file_selected >= 0:
-              smf_speed_factor = smf_files[smf_file_selected][2]
-              label_smf_tempo.setText('x{:3.1f}'.format(smf_speed_factor))
-              _thread.start_new_thread(play_midi, (smf_files[smf_file_selected][1],))
-      
-    # Set transpose for SMF player
-    elif enc_menu == ENC_SMF_TRANSPORSE:
-      if delta != 0:
-        all_notes_off()
-        set_smf_transpose(delta)
-
-      # Pause/Restart SMF player in playing
-      if enc_button == True:
-        if playing_smf == True:
-          if smf_play_mode == 'PLAY':
-            print('PAUSE MIDI PLAYER')
-            smf_play_mode = 'PAUSE'
-          else:
-            print('CONTINUE MIDI PLAYER')
-            smf_play_mode = 'PLAY'
-        else:
-          print('MIDI PLAYER NOT PLAYING')
+  # Decade value button (toggle)
+  if enc_button and enc_button_ch[enc_ch-1]:
+    enc_midi_set_decade = not enc_midi_set_decade
 
-    # Set volume for SMF player
-    elif enc_menu == ENC_SMF_VOLUME:
-      # Decade value button (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        enc_volume_decade = not enc_volume_decade
+  if enc_midi_set_decade:
+    encoder8_0.set_led_rgb(enc_ch, 0xffa000)
 
-      if enc_volume_decade:
-        encoder8_0.set_led_rgb(enc_ch, 0xffa000)
+  # File number
+  if delta != 0:
+    midi_in_set_num = (midi_in_set_num + delta * (10 if enc_midi_set_decade else 1)) % MIDI_SET_FILES_MAX
+    label_set_text(label_midi_in_set, num3_str(midi_in_set_num))
 
-      # Slide switch off: midi-in mode
-      if slide_switch == False:
-        pass
 
-      # Slide switch on: SMF player mode
+# File operation (read/write)
+def encoder_midi_file(enc_ch, delta, enc_button, slide_switch_change):
+  global enc_midi_set_ctrl, midi_in_settings
+
+  # File control
+  if delta != 0:
+    enc_midi_set_ctrl = (enc_midi_set_ctrl + delta) % 3
+    label_set_text(label_midi_in_set_ctrl, enc_midi_set_ctrl_list[enc_midi_set_ctrl])
+
+  # File operation button
+  if enc_button and enc_button_ch[enc_ch-1]:
+    # Load a MIDI settings file
+    if enc_midi_set_ctrl == MIDI_SET_FILE_LOAD:
+      midi_in_set = read_midi_in_settings(midi_in_set_num)
+      if midi_in_set is not None:
+        if DEBUG:
+          print('LOAD MIDI IN SET:', midi_in_set)
+        midi_in_settings = midi_in_set
+        show_midi_in_channel()
+        send_all_midi_in_settings()
       else:
-        if delta != 0:
-          set_smf_volume_delta(delta * (10 if enc_volume_decade else 1))
+        print('MIDI IN SET: NO FILE')
 
-    # Set tempo for SMF player
-    elif enc_menu == ENC_SMF_TEMPO:
-      # Change MIDI play speed
-      if delta == -1:
-        smf_speed_factor = smf_speed_factor - 0.1
-        if smf_speed_factor < 0.1:
-          smf_speed_factor = 0.1
-      elif delta == 1:
-        smf_speed_factor = smf_speed_factor + 0.1
-        if smf_speed_factor > 5:
-          smf_speed_factor = 5
+      enc_midi_set_ctrl = MIDI_SET_FILE_NOP
+      label_set_text(label_midi_in_set_ctrl, enc_midi_set_ctrl_list[enc_midi_set_ctrl])
 
-      if delta != 0:
-        label_smf_tempo.setText('x{:3.1f}'.format(smf_speed_factor))
-
-    # Select parameter to edit
-    elif enc_menu == ENC_SMF_PARAMETER:
-      if delta != 0 or slide_switch_change:
-        # Get parameter info of enc_parm
-        (effector, prm_index) = get_enc_param_index(enc_parm)
-        if not effector is None:
-          pttl = effector['title']
-          plbl = effector['params'][prm_index]['label']
-          disp = smf_settings[effector['key']][prm_index]
-        else:
-          pttl = '????'
-          plbl = '????'
-          disp = 999
-
-        # Display the parameter
-        label_smf_parm_title.setText(pttl)
-        label_smf_parameter.setText(plbl)
-        label_smf_parm_value.setText('{:03d}'.format(disp))
-
-    # Set parameter value
-    elif enc_menu == ENC_SMF_CTRL:
-      if delta != 0 or slide_switch_change:
-        # Get parameter info of enc_parm
-        (effector, prm_index) = get_enc_param_index(enc_parm)
-        if not effector is None:
-          val = smf_settings[effector['key']][prm_index] + delta * (10 if enc_parm_decade and effector['params'][prm_index]['value'][1] else 1)
-          if val < 0:
-            val = effector['params'][prm_index]['value'][0]
-          elif val > effector['params'][prm_index]['value'][0]:
-            val = 0
-
-          # Send MIDI message
-          smf_settings[effector['key']][prm_index] = val
-          effector['set_smf'](*smf_settings[effector['key']])
-          disp = val
-        else:
-          disp = 999
+    # Save MIDI settings file
+    elif enc_midi_set_ctrl == MIDI_SET_FILE_SAVE:
+      write_midi_in_settings(midi_in_set_num)
+      if DEBUG:
+        print('SAVE MIDI IN SET:', midi_in_set_num, midi_in_settings)
 
-        # Display the label
-        label_smf_parm_value.setText('{:03d}'.format(disp))
+      enc_midi_set_ctrl = MIDI_SET_FILE_NOP
+      label_set_text(label_midi_in_set_ctrl, enc_midi_set_ctrl_list[enc_midi_set_ctrl])
 
-    # Select MIDI setting file
-    elif enc_menu == ENC_MIDI_SET:
-      # Decade value button (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        enc_midi_set_decade = not enc_midi_set_decade
 
-      if enc_midi_set_decade:
-        encoder8_0.set_led_rgb(enc_ch, 0xffa000)
+# Select MIDI channel to edit
+def encoder_midi_channel(enc_ch, delta, enc_button, slide_switch_change):
+  # Select MIDI channel to MIDI-IN play
+  if delta != 0:
+    set_midi_in_channel(delta)
 
-      # File number
-      if delta != 0:
-        midi_in_set_num = (midi_in_set_num + delta * (10 if enc_midi_set_decade else 1)) % MIDI_SET_FILES_MAX
-        label_midi_in_set.setText('{:03d}'.format(midi_in_set_num))
+  # All notes off of MIDI-IN player channel
+  if enc_button == True:
+    all_notes_off(midi_in_ch)
 
-    # File operation (read/write)
-    elif enc_menu == ENC_MIDI_FILE:
-      # File control
-      if delta != 0:
-        enc_midi_set_ctrl = (enc_midi_set_ctrl + delta) % 3
-        label_midi_in_set_ctrl.setText(enc_midi_set_ctrl_list[enc_midi_set_ctrl])
-
-      # File operation button
-      if enc_button and enc_button_ch[enc_ch-1]:
-        # Load a MIDI settings file
-        if enc_midi_set_ctrl == MIDI_SET_FILE_LOAD:
-          midi_in_set = read_midi_in_settings(midi_in_set_num)
-          if not midi_in_set is None:
-            print('LOAD MIDI IN SET:', midi_in_set)
-            midi_in_settings = midi_in_set
-            set_midi_in_channel(0)
-            set_midi_in_program(0)
-            set_midi_in_reverb()
-            set_midi_in_chorus()
-            set_midi_in_vibrate()
-            send_all_midi_in_settings()
-          else:
-            print('MIDI IN SET: NO FILE')
 
-          enc_midi_set_ctrl = MIDI_SET_FILE_NOP
-          label_midi_in_set_ctrl.setText(enc_midi_set_ctrl_list[enc_midi_set_ctrl])
+# Select program for MIDI channel
+def encoder_midi_program(enc_ch, delta, enc_button, slide_switch_change):
+  global enc_midi_prg_decade
 
-        # Save MIDI settings file
-        elif enc_midi_set_ctrl == MIDI_SET_FILE_SAVE:
-          write_midi_in_settings(midi_in_set_num)
-          print('SAVE MIDI IN SET:', midi_in_set_num, midi_in_settings)
+  # Decade value button (toggle)
+  if enc_button and enc_button_ch[enc_ch-1]:
+    enc_midi_prg_decade = not enc_midi_prg_decade
 
-          enc_midi_set_ctrl = MIDI_SET_FILE_NOP
-          label_midi_in_set_ctrl.setText(enc_midi_set_ctrl_list[enc_midi_set_ctrl])
+  if enc_midi_prg_decade:
+    encoder8_0.set_led_rgb(enc_ch, 0xffa000)
 
-    # Select MIDI channel to edit
-    elif enc_menu == ENC_MIDI_CHANNEL:
-      # Select MIDI channel to MIDI-IN play
-      if delta != 0:
-        set_midi_in_channel(delta)
+  # Select program
+  if delta != 0:
+    set_midi_in_program(delta * (10 if enc_midi_prg_decade else 1))
 
-      # All notes off of MIDI-IN player channel
-      if enc_button == True:
-        all_notes_off(midi_in_ch)
+  # All notes off of MIDI-IN player channel
+  if enc_button == True:
+    all_notes_off(midi_in_ch)
 
-    # Select program for MIDI channel
-    elif enc_menu == ENC_MIDI_PROGRAM:
-      # Decade value button (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        enc_midi_prg_decade = not enc_midi_prg_decade
 
-      if enc_midi_prg_decade:
-        encoder8_0.set_led_rgb(enc_ch, 0xffa000)
+# Select parameter to edit
+def encoder_midi_parameter(enc_ch, delta, enc_button, slide_switch_change):
+  encoder_select_parameter(delta, slide_switch_change)
+  if delta != 0 or slide_switch_change:
+    # Get parameter info of enc_parm
+    param = get_enc_param(enc_parm)
+    if param is not None:
+      (pttl, plbl, key, prm_index, val_max, decade, set_smf, set_midi) = param
+      disp = midi_in_settings[midi_in_ch][key][prm_index]
+    else:
+      pttl = '????'
+      plbl = '????'
+      disp = 999
+
+    # Display the parameter
+    label_set_text(label_midi_parm_title, pttl)
+    label_set_text(label_midi_parameter, plbl)
+    label_set_text(label_midi_parm_value, num3_str(disp))
+
+
+# Set parameter value
+def encoder_midi_ctrl(enc_ch, delta, enc_button, slide_switch_change):
+  encoder_parameter_decade(enc_ch, enc_button)
+  if delta != 0 or slide_switch_change:
+    # Get parameter info of enc_parm
+    param = get_enc_param(enc_parm)
+    if param is not None:
+      # MAX, DECADE of the parameter and the current settings of the effector
+      (pttl, plbl, key, prm_index, val_max, decade, set_smf, set_midi) = param
+      settings = midi_in_settings[midi_in_ch][key]
+      val = settings[prm_index] + delta * (10 if enc_parm_decade and decade else 1)
+      if val < 0:
+        val = val_max
+      elif val > val_max:
+        val = 0
+
+      # Send MIDI message
+      settings[prm_index] = val
+      set_midi(*settings)
+      disp = val
+    else:
+      disp = 999
 
-      # Select program
-      if delta != 0:
-        set_midi_in_program(delta * (10 if enc_midi_prg_decade else 1))
-
-      # All notes off of MIDI-IN player channel
-      if enc_button == True:
-        all_notes_off(midi_in_ch)
-
-    # Select parameter to edit
-    elif enc_menu == ENC_MIDI_PARAMETER:
-      if delta != 0 or slide_switch_change:
-        # Get parameter info of enc_parm
-        (effector, prm_index) = get_enc_param_index(enc_parm)
-        if not effector is None:
-          pttl = effector['title']
-          plbl = effector['params'][prm_index]['label']
-          disp = midi_in_settings[midi_in_ch][effector['key']][prm_index]
-        else:
-          pttl = '????'
-          plbl = '????'
-          disp = 999
-
-        # Display the parameter
-        label_midi_parm_title.setText(pttl)
-        label_midi_parameter.setText(plbl)
-        label_midi_parm_value.setText('{:03d}'.format(disp))
-
-    # Set parameter value
-    elif enc_menu == ENC_MIDI_CTRL:
-      if delta != 0 or slide_switch_change:
-        # Get parameter info of enc_parm
-        (effector, prm_index) = get_enc_param_index(enc_parm)
-        if not effector is None:
-          val = midi_in_settings[midi_in_ch][effector['key']][prm_index] + delta * (10 if enc_parm_decade and effector['params'][prm_index]['value'][1] else 1)
-          if val < 0:
-            val = effector['params'][prm_index]['value'][0]
-          elif val > effector['params'][prm_index]['value'][0]:
-            val = 0
-
-          # Send MIDI message
-          midi_in_settings[midi_in_ch][effector['key']][prm_index] = val
-          effector['set_midi'](*midi_in_settings[midi_in_ch][effector['key']])
-          disp = val
-        else:
-          disp = 999
+    # Display the label
+    label_set_text(label_midi_parm_value, num3_str(disp))
 
-        # Display the label
-        label_midi_parm_value.setText('{:03d}'.format(disp))
 
-    # Change master volume
-    elif enc_menu == ENC_SMF_MASTER_VOL or enc_menu == ENC_MIDI_MASTER_VOL or enc_menu == ENC_SEQ_MASTER_VOL1 or enc_menu == ENC_SEQ_MASTER_VOL2:
-      # Decade value button (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        enc_mastervol_decade = not enc_mastervol_decade
+##### COMMON #####
 
-      if enc_mastervol_decade:
-        encoder8_0.set_led_rgb(enc_ch, 0xffa000)
+# Change master volume
+def encoder_master_volume(enc_ch, delta, enc_button, slide_switch_change):
+  global enc_mastervol_decade
 
-      # Change master volume
-      if delta != 0: 
-          set_synth_master_volume(delta * (10 if enc_mastervol_decade else 1))
+  # Decade value button (toggle)
+  if enc_button and enc_button_ch[enc_ch-1]:
+    enc_mastervol_decade = not enc_mastervol_decade
 
-      # All notes off
-      if enc_button:
-        all_notes_off()
+  if enc_mastervol_decade:
+    encoder8_0.set_led_rgb(enc_ch, 0xffa000)
 
-    ##### COMMON #####
+  # Change master volume
+  if delta != 0: 
+      set_synth_master_volume(delta * (10 if enc_mastervol_decade else 1))
 
-    # Change screen mode
-    elif enc_menu == ENC_SMF_SCREEN or enc_menu == ENC_MIDI_SCREEN or enc_menu == ENC_SEQ_SCREEN1 or enc_menu == ENC_SEQ_SCREEN2:
-      if delta != 0:
-        app_screen_mode = (app_screen_mode + delta) % 2
-        application_screen_change()
-        if app_screen_mode == SCREEN_MODE_PLAYER:
-          title_smf_params.setColor(0xff4040 if enc_slide_switch else 0xff8080, 0x555555 if enc_slide_switch else 0x222222)
-          title_midi_in_params.setColor(0xff8080 if enc_slide_switch else 0xff4040, 0x222222 if enc_slide_switch else 0x555555)
-          send_all_midi_in_settings()
+  # All notes off
+  if enc_button:
+    all_notes_off()
 
-        elif app_screen_mode == SCREEN_MODE_SEQUENCER:
-          label_seq_key1.setColor(0xff4040 if seq_edit_track == 0 else 0x00ccff)
-          label_seq_key2.setColor(0xff4040 if seq_edit_track == 1 else 0x00ccff)
 
-          send_all_sequencer_settings()
+# Change screen mode
+def encoder_screen(enc_ch, delta, enc_button, slide_switch_change):
+  global app_screen_mode
 
-          # Set MIDI channel 1 program as the current MIDI channel program
-          send_sequencer_current_channel_settings(seq_track_midi[seq_edit_track])
+  if delta != 0:
+    app_screen_mode = (app_screen_mode + delta) & 1
+    application_screen_change()
+    if app_screen_mode == SCREEN_MODE_PLAYER:
+      label_set_color(title_smf_params, COLORS_MENU_SELECTED if enc_slide_switch else COLORS_MENU)
+      label_set_color(title_midi_in_params, COLORS_MENU if enc_slide_switch else COLORS_MENU_SELECTED)
+      send_all_midi_in_settings()
 
-    ##### SEQUENCER SREEN MODE #####
+    elif app_screen_mode == SCREEN_MODE_SEQUENCER:
+      label_set_color(label_seq_key1, COLORS_KEY_EDIT if seq_edit_track == 0 else COLORS_KEY)
+      label_set_color(label_seq_key2, COLORS_KEY_EDIT if seq_edit_track == 1 else COLORS_KEY)
 
-    # Select file / Play or Stop
-    elif  enc_menu == ENC_SEQ_SET1 or enc_menu == ENC_SEQ_SET2:
-      if delta != 0:
-        seq_file_number = (seq_file_number + delta) % SEQ_FILE_MAX
-        label_seq_file.setText('{:03d}'.format(seq_file_number))
+      send_all_sequencer_settings()
 
-      if enc_button:
-        send_all_sequencer_settings()
-        play_sequencer()
-        send_sequencer_current_channel_settings(seq_track_midi[seq_edit_track])
+      # Set MIDI channel 1 program as the current MIDI channel program
+      send_sequencer_current_channel_settings(seq_track_midi[seq_edit_track])
 
-    # File operation
-    elif  enc_menu == ENC_SEQ_FILE1 or enc_menu == ENC_SEQ_FILE2:
-      if delta != 0:
-        seq_file_ctrl = (seq_file_ctrl + delta) % 3
-        label_seq_file_op.setText(seq_file_ctrl_label[seq_file_ctrl])
-
-      if enc_button:
-        if seq_file_ctrl == SEQ_FILE_LOAD:
-          sequencer_load_file()
-          seq_file_ctrl = SEQ_FILE_NOP
-          label_seq_file_op.setText(seq_file_ctrl_label[seq_file_ctrl])
-
-        elif seq_file_ctrl == SEQ_FILE_SAVE:
-          sequencer_save_file()
-          seq_file_ctrl = SEQ_FILE_NOP
-          label_seq_file_op.setText(seq_file_ctrl_label[seq_file_ctrl])
-
-    # Move sequencer cursor
-    elif enc_menu == ENC_SEQ_CURSOR1 or enc_menu == ENC_SEQ_CURSOR2:
-      # Sequencer cursor is time or key (toggle)
-      if enc_button and enc_button_ch[enc_ch-1]:
-        seq_cursor_time = not seq_cursor_time
 
-      if delta != 0:
-        seq_show_cursor(seq_edit_track, False, False)
+##### SEQUENCER SREEN MODE #####
 
-        # Move time cursor
-        if seq_cursor_time:
-          seq_control['time_cursor'] = seq_control['time_cursor'] + delta
-          if seq_control['time_cursor'] < 0:
-            seq_control['time_cursor'] = 0
-
-          # Move the time for the sign time
-          if not seq_parm_repeat is None:
-            if seq_control['time_cursor'] != seq_parm_repeat:
-              seq_parm_repeat = None
-
-          # Slide score-bar display area (time)
-          if seq_control['time_cursor'] < seq_control['disp_time'][0]:
-            seq_control['disp_time'][0] = seq_control['disp_time'][0] - seq_control['time_per_bar']
-            seq_control['disp_time'][1] = seq_control['disp_time'][1] - seq_control['time_per_bar']
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
-
-          elif seq_control['time_cursor'] > seq_control['disp_time'][1]:
-            seq_control['disp_time'][0] = seq_control['disp_time'][0] + seq_control['time_per_bar']
-            seq_control['disp_time'][1] = seq_control['disp_time'][1] + seq_control['time_per_bar']
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
-
-        # Move key cursor
-        else:
-          seq_control['key_cursor'][seq_edit_track] = seq_control['key_cursor'][seq_edit_track] + delta
-          if seq_control['key_cursor'][seq_edit_track] < 0:
-            seq_control['key_cursor'][seq_edit_track] = 0
-          elif seq_control['key_cursor'][seq_edit_track] > 127:
-            seq_control['key_cursor'][seq_edit_track] = 127
-
-          # Slide score-key display area (key)
-          if seq_control['key_cursor'][seq_edit_track] < seq_control['disp_key'][seq_edit_track][0]:
-            seq_control['disp_key'][seq_edit_track][0] = seq_control['disp_key'][seq_edit_track][0] - 1
-            seq_control['disp_key'][seq_edit_track][1] = seq_control['disp_key'][seq_edit_track][1] - 1
-            sequencer_draw_keyboard(seq_edit_track)
-            sequencer_draw_track(seq_edit_track)
-
-          elif seq_control['key_cursor'][seq_edit_track] > seq_control['disp_key'][seq_edit_track][1]:
-            seq_control['disp_key'][seq_edit_track][0] = seq_control['disp_key'][seq_edit_track][0] + 1
-            seq_control['disp_key'][seq_edit_track][1] = seq_control['disp_key'][seq_edit_track][1] + 1
-            sequencer_draw_keyboard(seq_edit_track)
-            sequencer_draw_track(seq_edit_track)
-
-        # Show cursor
-        seq_show_cursor(seq_edit_track, True, True)
+# Select file / Play or Stop
+def encoder_seq_set(enc_ch, delta, enc_button, slide_switch_change):
+  global seq_file_number
 
-        # Find a note on the cursor
-        cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
-        if not cursor_note is None:
-          if not seq_cursor_note is None:
-            if cursor_note != seq_cursor_note:
-              score = seq_cursor_note[0]
-              note_data = seq_cursor_note[1]
-              if seq_parm != SEQUENCER_PARM_VELOCITY:
-                sequencer_draw_note(seq_edit_track, note_data['note'], score['time'], score['time'] + note_data['duration'], SEQ_NOTE_DISP_NORMAL)
-
-          seq_cursor_note = cursor_note
-          score = seq_cursor_note[0]
-          note_data = seq_cursor_note[1]
-          if seq_parm != SEQUENCER_PARM_VELOCITY:
-            sequencer_draw_note(seq_edit_track, note_data['note'], score['time'], score['time'] + note_data['duration'], SEQ_NOTE_DISP_HIGHLIGHT)
-          else:
-            sequencer_draw_track(seq_edit_track)
+  if delta != 0:
+    seq_file_number = (seq_file_number + delta) % SEQ_FILE_MAX
+    label_set_text(label_seq_file, num3_str(seq_file_number))
 
-        # The cursor moves away from the selected note 
-        elif not seq_cursor_note is None:
+  if enc_button:
+    send_all_sequencer_settings()
+    play_sequencer()
+    send_sequencer_current_channel_settings(seq_track_midi[seq_edit_track])
+
+
+# File operation
+def encoder_seq_file(enc_ch, delta, enc_button, slide_switch_change):
+  global seq_file_ctrl
+
+  if delta != 0:
+    seq_file_ctrl = (seq_file_ctrl + delta) % 3
+    label_set_text(label_seq_file_op, seq_file_ctrl_label[seq_file_ctrl])
+
+  if enc_button:
+    if seq_file_ctrl == SEQ_FILE_LOAD:
+      sequencer_load_file()
+      seq_file_ctrl = SEQ_FILE_NOP
+      label_set_text(label_seq_file_op, seq_file_ctrl_label[seq_file_ctrl])
+
+    elif seq_file_ctrl == SEQ_FILE_SAVE:
+      sequencer_save_file()
+      seq_file_ctrl = SEQ_FILE_NOP
+      label_set_text(label_seq_file_op, seq_file_ctrl_label[seq_file_ctrl])
+
+
+# Move sequencer cursor
+def encoder_seq_cursor(enc_ch, delta, enc_button, slide_switch_change):
+  global seq_cursor_note, seq_cursor_time, seq_parm_repeat
+
+  # Sequencer cursor is time or key (toggle)
+  if enc_button and enc_button_ch[enc_ch-1]:
+    seq_cursor_time = not seq_cursor_time
+
+  if delta != 0:
+    seq_show_cursor(seq_edit_track, False, False)
+
+    # Move time cursor
+    if seq_cursor_time:
+      seq_control['time_cursor'] = seq_control['time_cursor'] + delta
+      if seq_control['time_cursor'] < 0:
+        seq_control['time_cursor'] = 0
+
+      # Move the time for the sign time
+      if seq_parm_repeat is not None:
+        if seq_control['time_cursor'] != seq_parm_repeat:
+          seq_parm_repeat = None
+
+      # Slide score-bar display area (time)
+      if seq_control['time_cursor'] < seq_control['disp_time'][0]:
+        seq_control['disp_time'][0] = seq_control['disp_time'][0] - seq_control['time_per_bar']
+        seq_control['disp_time'][1] = seq_control['disp_time'][1] - seq_control['time_per_bar']
+        sequencer_request_draw()
+
+      elif seq_control['time_cursor'] > seq_control['disp_time'][1]:
+        seq_control['disp_time'][0] = seq_control['disp_time'][0] + seq_control['time_per_bar']
+        seq_control['disp_time'][1] = seq_control['disp_time'][1] + seq_control['time_per_bar']
+        sequencer_request_draw()
+
+    # Move key cursor
+    else:
+      seq_control['key_cursor'][seq_edit_track] = seq_control['key_cursor'][seq_edit_track] + delta
+      if seq_control['key_cursor'][seq_edit_track] < 0:
+        seq_control['key_cursor'][seq_edit_track] = 0
+      elif seq_control['key_cursor'][seq_edit_track] > 127:
+        seq_control['key_cursor'][seq_edit_track] = 127
+
+      # Slide score-key display area (key)
+      if seq_control['key_cursor'][seq_edit_track] < seq_control['disp_key'][seq_edit_track][0]:
+        seq_control['disp_key'][seq_edit_track][0] = seq_control['disp_key'][seq_edit_track][0] - 1
+        seq_control['disp_key'][seq_edit_track][1] = seq_control['disp_key'][seq_edit_track][1] - 1
+        sequencer_request_draw(seq_edit_track, keyboard = True)
+
+      elif seq_control['key_cursor'][seq_edit_track] > seq_control['disp_key'][seq_edit_track][1]:
+        seq_control['disp_key'][seq_edit_track][0] = seq_control['disp_key'][seq_edit_track][0] + 1
+        seq_control['disp_key'][seq_edit_track][1] = seq_control['disp_key'][seq_edit_track][1] + 1
+        sequencer_request_draw(seq_edit_track, keyboard = True)
+
+    # Show cursor
+    seq_show_cursor(seq_edit_track, True, True)
+
+    # Find a note on the cursor
+    cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
+    if cursor_note is not None:
+      if seq_cursor_note is not None:
+        if cursor_note != seq_cursor_note:
           score = seq_cursor_note[0]
           note_data = seq_cursor_note[1]
           if seq_parm != SEQUENCER_PARM_VELOCITY:
             sequencer_draw_note(seq_edit_track, note_data['note'], score['time'], score['time'] + note_data['duration'], SEQ_NOTE_DISP_NORMAL)
-            seq_cursor_note = None
-          else:
-            seq_cursor_note = None
-            sequencer_draw_track(seq_edit_track)
 
-    # Set sequencer note length
-    elif enc_menu == ENC_SEQ_NOTE_LEN1 or enc_menu == ENC_SEQ_NOTE_LEN2:
-      # Hignlited note exists
-      if not seq_cursor_note is None:
-        if delta != 0:
-          score = seq_cursor_note[0]
-          note_data = seq_cursor_note[1]
-          note_dur = note_data['duration'] + delta
-          if note_dur >= 1:
-            # Check overrap with another note
-            overrap_note = sequencer_find_note(seq_edit_track, score['time'] + note_dur, seq_control['key_cursor'][seq_edit_track])
-            if not overrap_note is None:
-              if overrap_note[1] != note_data and overrap_note[0]['time'] < score['time'] + note_dur:
-                note_dur = -1
-                print('OVERRAP')
-
-            if note_dur >= 0:
-              note_data['duration'] = note_dur
+      if seq_parm == SEQUENCER_PARM_VELOCITY and seq_cursor_note is not None:
+        sequencer_set_dirty_time(seq_cursor_note[0]['time'], seq_cursor_note[0]['time'] + 1, seq_edit_track)
+
+      seq_cursor_note = cursor_note
+      score = seq_cursor_note[0]
+      note_data = seq_cursor_note[1]
+      if seq_parm != SEQUENCER_PARM_VELOCITY:
+        sequencer_draw_note(seq_edit_track, note_data['note'], score['time'], score['time'] + note_data['duration'], SEQ_NOTE_DISP_HIGHLIGHT)
+      else:
+        sequencer_set_dirty_time(score['time'], score['time'] + 1, seq_edit_track)
+        sequencer_request_draw(seq_edit_track, whole = False)
+
+    # The cursor moves away from the selected note 
+    elif seq_cursor_note is not None:
+      score = seq_cursor_note[0]
+      note_data = seq_cursor_note[1]
+      if seq_parm != SEQUENCER_PARM_VELOCITY:
+        sequencer_draw_note(seq_edit_track, note_data['note'], score['time'], score['time'] + note_data['duration'], SEQ_NOTE_DISP_NORMAL)
+        seq_cursor_note = None
+      else:
+        sequencer_set_dirty_time(score['time'], score['time'] + 1, seq_edit_track)
+        seq_cursor_note = None
+        sequencer_request_draw(seq_edit_track, whole = False)
+
+
+# Set sequencer note length
+def encoder_seq_note_len(enc_ch, delta, enc_button, slide_switch_change):
+  global seq_cursor_note
+
+  # Hignlited note exists
+  if seq_cursor_note is not None:
+    if delta != 0:
+      score = seq_cursor_note[0]
+      note_data = seq_cursor_note[1]
+      note_dur = note_data['duration'] + delta
+      if note_dur >= 1:
+        # Check overrap with another note
+        overrap_note = sequencer_find_note(seq_edit_track, score['time'] + note_dur, seq_control['key_cursor'][seq_edit_track])
+        if overrap_note is not None:
+          if overrap_note[1] != note_data and overrap_note[0]['time'] < score['time'] + note_dur:
+            note_dur = -1
+            if DEBUG:
+              print('OVERRAP')
+
+        if note_dur >= 0:
+          sequencer_request_draw_channel(note_data['channel'], score['time'], score['time'] + max(note_dur, note_data['duration']))
+          note_data['duration'] = note_dur
+          sequencer_duration_update(score)
+
+    # Delete the highlited note
+    if enc_button:
+      score = seq_cursor_note[0]
+      note_data = seq_cursor_note[1]
+      sequencer_delete_note(score, note_data)
+      seq_cursor_note = None
+
+  # New note
+  else:
+    if enc_button:
+      seq_cursor_note = sequencer_new_note(seq_track_midi[seq_edit_track], seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
+
+
+# Select sequencer parameter to edit
+def encoder_seq_parameter(enc_ch, delta, enc_button, slide_switch_change):
+  global seq_parm
+
+  if delta != 0 or slide_switch_change:
+    # Change the target parameter to edit with CTRL1
+    seq_parm = seq_parm + delta
+    if seq_parm < 0:
+      seq_parm = seq_total_parameters -1
+    elif seq_parm >= seq_total_parameters:
+      seq_parm = 0
+
+    label_set_text(label_seq_parm_name, seq_parameter_names[seq_parm])
+
+    # Show parameter value
+    if   seq_parm == SEQUENCER_PARM_TIMESPAN:
+      label_set_text(label_seq_parm_value, num3_str(seq_control['disp_time'][1] - seq_control['disp_time'][0]))
+    elif seq_parm == SEQUENCER_PARM_TEMPO:
+      label_set_text(label_seq_parm_value, num3_str(seq_control['tempo']))
+    elif seq_parm == SEQUENCER_PARM_MINIMUM_NOTE:
+      label_set_text(label_seq_parm_value, '{:=2d}'.format(2**seq_control['mini_note']))
+    elif seq_parm == SEQUENCER_PARM_PROGRAM:
+      label_set_text(label_seq_parm_value, num3_str(seq_control['program'][seq_track_midi[seq_edit_track]]))
+    elif seq_parm == SEQUENCER_PARM_CHANNEL_VOL:
+      label_set_text(label_seq_parm_value, num3_str(seq_channel[seq_track_midi[seq_edit_track]]['volume']))
+    else:
+      label_set_text(label_seq_parm_value, '')
+
+    sequencer_draw_all()
+
+
+# Set sequencer parameter value
+def encoder_seq_ctrl(enc_ch, delta, enc_button, slide_switch_change):
+  global seq_cursor_note, seq_score, seq_parm_repeat
+
+  encoder_parameter_decade(enc_ch, enc_button)
+
+  # Show repeat sign parameter just after changing the current time
+  if seq_parm == SEQUENCER_PARM_REPEAT:
+    if seq_parm_repeat is None:
+      seq_parm_repeat = seq_control['time_cursor']
+      rept = sequencer_get_repeat_control(seq_parm_repeat)
+      if rept is None:
+        label_set_text(label_seq_parm_value, 'NON')
+
+    elif seq_parm_repeat != seq_control['time_cursor']:
+      seq_parm_repeat = seq_control['time_cursor']
+      rept = sequencer_get_repeat_control(seq_parm_repeat)
+
+    else:
+      rept = None
+
+    if rept is not None:
+      disp = 'NON'
+      if rept['loop']:
+        disp = 'LOP'
+      elif rept['skip']:
+        disp = 'SKP'
+      elif rept['repeat']:
+        disp = 'RPT'
+
+      label_set_text(label_seq_parm_value, disp)
+
+  if delta != 0 or slide_switch_change:
+    # Change MIDI channel of the current track
+    if   seq_parm == SEQUENCER_PARM_CHANNEL:
+      sequencer_change_midi_channel(delta)
+
+    # Change time span
+    elif seq_parm == SEQUENCER_PARM_TIMESPAN:
+      sequencer_timespan(delta)
+      label_set_text(label_seq_parm_value, num3_str(seq_control['disp_time'][1] - seq_control['disp_time'][0]))
+
+    # Change velocity of the note selected
+    elif seq_parm == SEQUENCER_PARM_VELOCITY:
+      if sequencer_velocity(delta * (10 if enc_parm_decade else 1)):
+          sequencer_set_dirty_time(seq_cursor_note[0]['time'], seq_cursor_note[0]['time'] + 1, seq_edit_track)
+          sequencer_request_draw(seq_edit_track, whole = False)
+
+    # Change start time to begining play
+    elif seq_parm == SEQUENCER_PARM_PLAYSTART:
+      pt = seq_play_time[0] + delta * (10 if enc_parm_decade else 1)
+      if DEBUG:
+        print('PLAY S:', pt, delta, seq_play_time)
+      if pt >= 0 and pt <= seq_play_time[1]:
+        seq_play_time[0] = pt
+        sequencer_draw_playtime(0)
+        sequencer_draw_playtime(1)
+
+    # Change end time to finish play
+    elif seq_parm == SEQUENCER_PARM_PLAYEND:
+      pt = seq_play_time[1] + delta * (10 if enc_parm_decade else 1)
+      if DEBUG:
+        print('PLAY E:', pt, delta, seq_play_time)
+      if pt >= seq_play_time[0]:
+        seq_play_time[1] = pt
+        sequencer_draw_playtime(0)
+        sequencer_draw_playtime(1)
+
+    # Insert/Delete time at the time cursor on the current MIDI channel only
+    elif seq_parm == SEQUENCER_PARM_STRETCH_ONE:
+      affected = False
+
+      # Insert
+      if delta > 0:
+        affected = sequencer_insert_time(seq_track_midi[seq_edit_track], seq_control['time_cursor'], delta)
+      # Delete
+      elif delta < 0:
+        affected = sequencer_delete_time(seq_track_midi[seq_edit_track], seq_control['time_cursor'], -delta)
+
+      # Refresh screen
+      if affected:
+        seq_show_cursor(seq_edit_track, False, False)
+        seq_control['time_cursor'] = seq_control['time_cursor'] + delta
+        if seq_control['time_cursor'] < 0:
+          seq_control['time_cursor'] = 0
+
+        seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
+        seq_show_cursor(seq_edit_track, True, True)
+
+    # Insert/Delete time at the time cursor on the all MIDI channels
+    elif seq_parm == SEQUENCER_PARM_STRETCH_ALL:
+      affected = False
+
+      # Insert
+      if delta > 0:
+        for ch in range(16):
+          affected = sequencer_insert_time(ch, seq_control['time_cursor'], delta) or affected
+      # Delete
+      elif delta < 0:
+        for ch in range(16):
+          affected = sequencer_delete_time(ch, seq_control['time_cursor'], -delta) or affected
+
+      # Refresh screen
+      if affected:
+        seq_show_cursor(0, False, False)
+        seq_show_cursor(1, False, False)
+        seq_control['time_cursor'] = seq_control['time_cursor'] + delta
+        if seq_control['time_cursor'] < 0:
+          seq_control['time_cursor'] = 0
+
+        seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
+        sequencer_request_draw(seq_edit_track)
+        seq_show_cursor(0, True, True)
+        seq_show_cursor(1, True, True)
+
+    # Clear all notes in the current MIDI channel
+    elif seq_parm == SEQUENCER_PARM_CLEAR_ONE:
+      if delta != 0:
+        # Keep the notes of the other channels, and the scores having them
+        ch = seq_track_midi[seq_edit_track]
+        scores = []
+        for score in seq_score:
+          notes = [note_data for note_data in score['notes'] if note_data['channel'] != ch]
+          if len(notes) > 0:
+            if len(notes) != len(score['notes']):
+              score['notes'] = notes
               sequencer_duration_update(score)
-              sequencer_draw_track(0)
-              sequencer_draw_track(1)
 
-        # Delete the highlited note
-        if enc_button:
-          score = seq_cursor_note[0]
-          note_data = seq_cursor_note[1]
-          sequencer_delete_note(score, note_data)
-          seq_cursor_note = None
-          sequencer_draw_track(0)
-          sequencer_draw_track(1)
+            scores.append(score)
+
+        seq_score = scores
+        sequencer_request_draw_channel(ch)
+        seq_cursor_note = None
+        sequencer_draw_playtime(seq_edit_track)
+
+    # Clear all notes in the all MIDI channel
+    elif seq_parm == SEQUENCER_PARM_CLEAR_ALL:
+      if delta != 0:
+        seq_score = []
+        seq_cursor_note = None
+        sequencer_draw_all()
+        sequencer_draw_playtime(0)
+        sequencer_draw_playtime(1)
+
+    # Change number of notes in a bar
+    elif seq_parm == SEQUENCER_PARM_NOTES_BAR:
+      if delta != 0:
+        seq_control['time_per_bar'] = seq_control['time_per_bar'] + delta
+        if seq_control['time_per_bar'] < 2:
+          seq_control['time_per_bar'] = 2
+
+        sequencer_draw_all()
+
+    # Resolution up
+    elif seq_parm == SEQUENCER_PARM_RESOLUTION:
+      if delta != 0:
+        sequencer_resolution(delta > 0)
+
+        seq_show_cursor(0, False, False)
+        seq_show_cursor(1, False, False)
+        seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
+        sequencer_request_draw()
+        seq_show_cursor(0, True, True)
+        seq_show_cursor(1, True, True)
+
+    # Change number of notes in a bar
+    elif seq_parm == SEQUENCER_PARM_TEMPO:
+      if delta != 0:
+        seq_control['tempo'] = seq_control['tempo'] + delta * (10 if enc_parm_decade else 1)
+        if seq_control['tempo'] < 6:
+          seq_control['tempo'] = 6
+        elif seq_control['tempo'] > 999:
+          seq_control['tempo'] = 999
+
+        label_set_text(label_seq_parm_value, num3_str(seq_control['tempo']))
+
+    # Change number of notes in a bar
+    elif seq_parm == SEQUENCER_PARM_MINIMUM_NOTE:
+      if delta != 0:
+        seq_control['mini_note'] = seq_control['mini_note'] + delta
+        if seq_control['mini_note'] < 2:
+          seq_control['mini_note'] = 2
+        elif seq_control['mini_note'] > 5:
+          seq_control['mini_note'] = 5
+
+        label_set_text(label_seq_parm_value, '{:=2d}'.format(2**seq_control['mini_note']))
+
+    # Change MIDI channnel program
+    elif seq_parm == SEQUENCER_PARM_PROGRAM:
+      ch = seq_track_midi[seq_edit_track]
+      seq_control['program'][ch] = (seq_control['program'][ch] + delta * (10 if enc_parm_decade else 1)) & 127
+      label_set_text(label_seq_parm_value, num3_str(seq_control['program'][ch]))
+      prg = get_gm_program_name(seq_control['gmbank'][ch], seq_control['program'][ch])
+      prg = prg[:9]
+      if seq_track_midi[0] == ch:
+        label_set_text(label_seq_program1, prg)
+
+      if seq_track_midi[1] == ch:
+        label_set_text(label_seq_program2, prg)
+
+      synth_0.set_instrument(seq_control['gmbank'][ch], ch, seq_control['program'][ch])
+      send_sequencer_current_channel_settings(ch)
+
+    # Change a volume ratio of MIDI channel
+    elif seq_parm == SEQUENCER_PARM_CHANNEL_VOL:
+      ch = seq_track_midi[seq_edit_track]
+      vol = seq_channel[ch]['volume']
+      vol = vol + delta * (10 if enc_parm_decade else 1)
+      if vol < 0:
+        vol = 0
+      elif vol > 100:
+        vol = 100
+
+      seq_channel[ch]['volume'] = vol
+      label_set_text(label_seq_parm_value, num3_str(vol))
+
+    # Set repeat signs (NONE/LOOP/SKIP/REPEAT)
+    elif seq_parm == SEQUENCER_PARM_REPEAT:
+      if seq_parm_repeat is None:
+        label_set_text(label_seq_parm_value, 'NON')
 
-      # New note
       else:
-        if enc_button:
-          seq_cursor_note = sequencer_new_note(seq_track_midi[seq_edit_track], seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
-          sequencer_draw_track(0)
-          sequencer_draw_track(1)
-
-    # Select sequencer parameter to edit
-    elif enc_menu == ENC_SEQ_PARAMETER1 or enc_menu == ENC_SEQ_PARAMETER2:
-      if delta != 0 or slide_switch_change:
-        label_seq_parm_name.setText(seq_parameter_names[seq_parm])
-
-        # Show parameter value
-        if   seq_parm == SEQUENCER_PARM_TIMESPAN:
-          label_seq_parm_value.setText('{:03d}'.format(seq_control['disp_time'][1] - seq_control['disp_time'][0]))
-        elif seq_parm == SEQUENCER_PARM_TEMPO:
-          label_seq_parm_value.setText('{:03d}'.format(seq_control['tempo']))
-        elif seq_parm == SEQUENCER_PARM_MINIMUM_NOTE:
-          label_seq_parm_value.setText('{:=2d}'.format(2**seq_control['mini_note']))
-        elif seq_parm == SEQUENCER_PARM_PROGRAM:
-          label_seq_parm_value.setText('{:03d}'.format(seq_control['program'][seq_track_midi[seq_edit_track]]))
-        elif seq_parm == SEQUENCER_PARM_CHANNEL_VOL:
-          label_seq_parm_value.setText('{:03d}'.format(seq_channel[seq_track_midi[seq_edit_track]]['volume']))
-        else:
-          label_seq_parm_value.setText('')
-
-        sequencer_draw_track(0)
-        sequencer_draw_track(1)
-
-    # Set sequencer parameter value
-    elif enc_menu == ENC_SEQ_CTRL1 or enc_menu == ENC_SEQ_CTRL2:
-      if delta != 0 or slide_switch_change:
-        # Change MIDI channel of the current track
-        if   seq_parm == SEQUENCER_PARM_CHANNEL:
-          sequencer_change_midi_channel(delta)
-
-        # Change time span
-        elif seq_parm == SEQUENCER_PARM_TIMESPAN:
-          sequencer_timespan(delta)
-          label_seq_parm_value.setText('{:03d}'.format(seq_control['disp_time'][1] - seq_control['disp_time'][0]))
-
-        # Change velocity of the note selected
-        elif seq_parm == SEQUENCER_PARM_VELOCITY:
-          if sequencer_velocity(delta * (10 if enc_parm_decade else 1)):
-              sequencer_draw_track(seq_edit_track)
-
-        # Change start time to begining play
-        elif seq_parm == SEQUENCER_PARM_PLAYSTART:
-          pt = seq_play_time[0] + delta * (10 if enc_parm_decade else 1)
-          print('PLAY S:', pt, delta, seq_play_time)
-          if pt >= 0 and pt <= seq_play_time[1]:
-            seq_play_time[0] = pt
-            sequencer_draw_playtime(0)
-            sequencer_draw_playtime(1)
-
-        # Change end time to finish play
-        elif seq_parm == SEQUENCER_PARM_PLAYEND:
-          pt = seq_play_time[1] + delta * (10 if enc_parm_decade else 1)
-          print('PLAY E:', pt, delta, seq_play_time)
-          if pt >= seq_play_time[0]:
-            seq_play_time[1] = pt
-            sequencer_draw_playtime(0)
-            sequencer_draw_playtime(1)
-
-        # Insert/Delete time at the time cursor on the current MIDI channel only
-        elif seq_parm == SEQUENCER_PARM_STRETCH_ONE:
-          affected = False
-
-          # Insert
-          if delta > 0:
-            affected = sequencer_insert_time(seq_track_midi[seq_edit_track], seq_control['time_cursor'], delta)
-          # Delete
-          elif delta < 0:
-            affected = sequencer_delete_time(seq_track_midi[seq_edit_track], seq_control['time_cursor'], -delta)
-
-          # Refresh screen
-          if affected:
-            seq_show_cursor(seq_edit_track, False, False)
-            seq_control['time_cursor'] = seq_control['time_cursor'] + delta
-            if seq_control['time_cursor'] < 0:
-              seq_control['time_cursor'] = 0
-
-            seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
-            sequencer_draw_track(seq_edit_track)
-            seq_show_cursor(seq_edit_track, True, True)
-
-        # Insert/Delete time at the time cursor on the all MIDI channels
-        elif seq_parm == SEQUENCER_PARM_STRETCH_ALL:
-          affected = False
-
-          # Insert
-          if delta > 0:
-            for ch in range(16):
-              affected = sequencer_insert_time(ch, seq_control['time_cursor'], delta) or affected
-          # Delete
-          elif delta < 0:
-            for ch in range(16):
-              affected = sequencer_delete_time(ch, seq_control['time_cursor'], -delta) or affected
-
-          # Refresh screen
-          if affected:
-            seq_show_cursor(0, False, False)
-            seq_show_cursor(1, False, False)
-            seq_control['time_cursor'] = seq_control['time_cursor'] + delta
-            if seq_control['time_cursor'] < 0:
-              seq_control['time_cursor'] = 0
-
-            seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
-            seq_show_cursor(0, True, True)
-            seq_show_cursor(1, True, True)
-
-        # Clear all notes in the current MIDI channel
-        elif seq_parm == SEQUENCER_PARM_CLEAR_ONE:
-          if delta != 0:
-            to_delete = []
-            for score in seq_score:
-              for note_data in score['notes']:
-                if note_data['channel'] == seq_track_midi[seq_edit_track]:
-                  to_delete.append((score, note_data))
-              
-            for del_note in to_delete:
-              sequencer_delete_note(*del_note)
-
-            seq_cursor_note = None
-            sequencer_draw_track(seq_edit_track)
-            sequencer_draw_playtime(seq_edit_track)
-
-        # Clear all notes in the all MIDI channel
-        elif seq_parm == SEQUENCER_PARM_CLEAR_ALL:
-          if delta != 0:
-            seq_score = []
-            seq_cursor_note = None
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
-            sequencer_draw_playtime(0)
-            sequencer_draw_playtime(1)
-
-        # Change number of notes in a bar
-        elif seq_parm == SEQUENCER_PARM_NOTES_BAR:
-          if delta != 0:
-            seq_control['time_per_bar'] = seq_control['time_per_bar'] + delta
-            if seq_control['time_per_bar'] < 2:
-              seq_control['time_per_bar'] = 2
-
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
-
-        # Resolution up
-        elif seq_parm == SEQUENCER_PARM_RESOLUTION:
-          if delta != 0:
-            sequencer_resolution(delta > 0)
-
-            seq_show_cursor(0, False, False)
-            seq_show_cursor(1, False, False)
-            seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
-            seq_show_cursor(0, True, True)
-            seq_show_cursor(1, True, True)
-
-        # Change number of notes in a bar
-        elif seq_parm == SEQUENCER_PARM_TEMPO:
-          if delta != 0:
-            seq_control['tempo'] = seq_control['tempo'] + delta * (10 if enc_parm_decade else 1)
-            if seq_control['tempo'] < 6:
-              seq_control['tempo'] = 6
-            elif seq_control['tempo'] > 999:
-              seq_control['tempo'] = 999
-
-            label_seq_parm_value.setText('{:03d}'.format(seq_control['tempo']))
-
-        # Change number of notes in a bar
-        elif seq_parm == SEQUENCER_PARM_MINIMUM_NOTE:
-          if delta != 0:
-            seq_control['mini_note'] = seq_control['mini_note'] + delta
-            if seq_control['mini_note'] < 2:
-              seq_control['mini_note'] = 2
-            elif seq_control['mini_note'] > 5:
-              seq_control['mini_note'] = 5
-
-            label_seq_parm_value.setText('{:=2d}'.format(2**seq_control['mini_note']))
-
-        # Change MIDI channnel program
-        elif seq_parm == SEQUENCER_PARM_PROGRAM:
-          ch = seq_track_midi[seq_edit_track]
-          seq_control['program'][ch] = (seq_control['program'][ch] + delta * (10 if enc_parm_decade else 1)) % 128
-          label_seq_parm_value.setText('{:03d}'.format(seq_control['program'][ch]))
-          prg = get_gm_program_name(seq_control['gmbank'][ch], seq_control['program'][ch])
-          prg = prg[:9]
-          if seq_track_midi[0] == ch:
-            label_seq_program1.setText(prg)
-
-          if seq_track_midi[1] == ch:
-            label_seq_program2.setText(prg)
-
-          synth_0.set_instrument(seq_control['gmbank'][ch], ch, seq_control['program'][ch])
-          send_sequencer_current_channel_settings(ch)
-
-        # Change a volume ratio of MIDI channel
-        elif seq_parm == SEQUENCER_PARM_CHANNEL_VOL:
-          ch = seq_track_midi[seq_edit_track]
-          vol = seq_channel[ch]['volume']
-          vol = vol + delta * (10 if enc_parm_decade else 1)
-          if vol < 0:
-            vol = 0
-          elif vol > 100:
-            vol = 100
-
-          seq_channel[ch]['volume'] = vol
-          label_seq_parm_value.setText('{:03d}'.format(vol))
-
-        # Set repeat signs (NONE/LOOP/SKIP/REPEAT)
-        elif seq_parm == SEQUENCER_PARM_REPEAT:
-          if seq_parm_repeat is None:
-            label_seq_parm_value.setText('NON')
+        if seq_parm_repeat == 0:
+          label_set_text(label_seq_parm_value, 'NON')
+          return True
+
+        rept = sequencer_get_repeat_control(seq_parm_repeat)
+        if rept is None:
+          rept = {'time': seq_parm_repeat, 'loop': False, 'skip': False, 'repeat': False}
+
+        if delta != 0:
+          if rept['loop']:
+            rept['loop'] = False
+            if delta == 1:
+              rept['skip'] = True
+
+          elif rept['skip']:
+            rept['skip'] = False
+            if delta == -1:
+              rept['loop'] = True
+            else:
+              rept['repeat'] = True
+
+          elif rept['repeat']:
+            rept['repeat'] = False
+            if delta == -1:
+              rept['skip'] = True
 
           else:
-            if seq_parm_repeat == 0:
-              label_seq_parm_value.setText('NON')
-              break
-
-            rept = sequencer_get_repeat_control(seq_parm_repeat)
-            if rept is None:
-              rept = {'time': seq_parm_repeat, 'loop': False, 'skip': False, 'repeat': False}
-
-            if delta != 0:
-              if rept['loop']:
-                rept['loop'] = False
-                if delta == 1:
-                  rept['skip'] = True
-
-              elif rept['skip']:
-                rept['skip'] = False
-                if delta == -1:
-                  rept['loop'] = True
-                else:
-                  rept['repeat'] = True
-
-              elif rept['repeat']:
-                rept['repeat'] = False
-                if delta == -1:
-                  rept['skip'] = True
+            if delta == -1:
+              rept['repeat'] = True
+            else:
+              rept['loop'] = True
+
+          # Add or change score signs at a time
+          sequencer_edit_signs(rept)
+
+        disp = 'NON'
+        if rept is not None:
+          if rept['loop']:
+            disp = 'LOP'
+          elif rept['skip']:
+            disp = 'SKP'
+          elif rept['repeat']:
+            disp = 'RPT'
+
+        label_set_text(label_seq_parm_value, disp)
+        sequencer_draw_all()
+
+
+# Encoder menu handlers
+#   enc_menu: handler(enc_ch, delta, enc_button, slide_switch_change)
+#   A handler returns True to stop scanning the encoders.
+enc_menu_handlers = {
+  ENC_SMF_FILE: encoder_smf_file,
+  ENC_SMF_TRANSPORSE: encoder_smf_transpose,
+  ENC_SMF_VOLUME: encoder_smf_volume,
+  ENC_SMF_TEMPO: encoder_smf_tempo,
+  ENC_SMF_PARAMETER: encoder_smf_parameter,
+  ENC_SMF_CTRL: encoder_smf_ctrl,
+  ENC_MIDI_SET: encoder_midi_set,
+  ENC_MIDI_FILE: encoder_midi_file,
+  ENC_MIDI_CHANNEL: encoder_midi_channel,
+  ENC_MIDI_PROGRAM: encoder_midi_program,
+  ENC_MIDI_PARAMETER: encoder_midi_parameter,
+  ENC_MIDI_CTRL: encoder_midi_ctrl,
+  ENC_SMF_MASTER_VOL: encoder_master_volume,
+  ENC_MIDI_MASTER_VOL: encoder_master_volume,
+  ENC_SEQ_MASTER_VOL1: encoder_master_volume,
+  ENC_SEQ_MASTER_VOL2: encoder_master_volume,
+  ENC_SMF_SCREEN: encoder_screen,
+  ENC_MIDI_SCREEN: encoder_screen,
+  ENC_SEQ_SCREEN1: encoder_screen,
+  ENC_SEQ_SCREEN2: encoder_screen,
+  ENC_SEQ_SET1: encoder_seq_set,
+  ENC_SEQ_SET2: encoder_seq_set,
+  ENC_SEQ_FILE1: encoder_seq_file,
+  ENC_SEQ_FILE2: encoder_seq_file,
+  ENC_SEQ_CURSOR1: encoder_seq_cursor,
+  ENC_SEQ_CURSOR2: encoder_seq_cursor,
+  ENC_SEQ_NOTE_LEN1: encoder_seq_note_len,
+  ENC_SEQ_NOTE_LEN2: encoder_seq_note_len,
+  ENC_SEQ_PARAMETER1: encoder_seq_parameter,
+  ENC_SEQ_PARAMETER2: encoder_seq_parameter,
+  ENC_SEQ_CTRL1: encoder_seq_ctrl,
+  ENC_SEQ_CTRL2: encoder_seq_ctrl
+}
+
+# Handlers of the 8 encoders for each screen mode and slide switch
+#   {menu base: (handler of CH1, .., handler of CH8)}
+#   menu base: 0 or 10 (slide switch on) + 0 or 100 (sequencer screen)
+enc_menu_rows = {base: tuple([enc_menu_handlers.get(base + enc_ch) for enc_ch in range(1, 9)]) for base in (0, 10, 100, 110)}
+
+
+# Read 8encoder values and take actions
+#   Compiled to native code, the scan loop runs in every main loop.
+@micropython.native
+def encoder_read():
+  global encoder8_0, enc_button_ch, enc_slide_switch
+  global app_screen_mode
+  global seq_control, seq_edit_track, seq_cursor_note
+  global seq_parm
+
+  ##### encoder_read() program
+
+  # Local copies of the encoder unit methods used in the scan loop
+  enc_unit = encoder8_0
+  get_counter_value = enc_unit.get_counter_value
+  get_button_status = enc_unit.get_button_status
+  set_counter_value = enc_unit.set_counter_value
+  set_led_rgb = enc_unit.set_led_rgb
+  button_ch = enc_button_ch
+
+  # Slide switch
+  slide_switch_change = False
+  slide_switch = enc_unit.get_switch_status()
+  if enc_slide_switch is None:
+    enc_slide_switch = slide_switch
+    slide_switch_change = True
+  elif slide_switch != enc_slide_switch:
+    enc_slide_switch = slide_switch
+    slide_switch_change = True
+  
+  if slide_switch_change:
+    # Player screen
+    if app_screen_mode == SCREEN_MODE_PLAYER:
+      label_set_color(title_smf_params, COLORS_MENU_SELECTED if enc_slide_switch else COLORS_MENU)
+      label_set_color(title_midi_in_params, COLORS_MENU if enc_slide_switch else COLORS_MENU_SELECTED)
+
+    # Sequencer screen
+    seq_edit_track = 0 if enc_slide_switch else 1
+    if app_screen_mode == SCREEN_MODE_SEQUENCER:
+      seq_cursor_note = sequencer_find_note(seq_edit_track, seq_control['time_cursor'], seq_control['key_cursor'][seq_edit_track])
+      sequencer_draw_all()
+      label_set_color(label_seq_key1, COLORS_KEY_EDIT if seq_edit_track == 0 else COLORS_KEY)
+      label_set_color(label_seq_key2, COLORS_KEY_EDIT if seq_edit_track == 1 else COLORS_KEY)
+
+      # Set MIDI channel 1 program as the current MIDI channel program
+      send_sequencer_current_channel_settings(seq_track_midi[seq_edit_track])
+
+  # Read all counters and buttons
+  bulk_read = enc_bulk_read
+  if bulk_read:
+    i2c0.readfrom_mem_into(ENC8_I2C_ADDR, ENC8_REG_COUNTER, enc_counter_buf)
+    i2c0.readfrom_mem_into(ENC8_I2C_ADDR, ENC8_REG_BUTTON, enc_button_buf)
+    enc_counts = struct.unpack('<8i', enc_counter_buf)
+    enc_buttons = enc_button_buf
+
+  # Scan encoders
+  menu_handlers = enc_menu_rows[(10 if enc_slide_switch else 0) + (100 if app_screen_mode == SCREEN_MODE_SEQUENCER else 0)]
+  for enc_ch in range(1,9):
+    menu_handler = menu_handlers[enc_ch-1]
+    if bulk_read:
+      enc_count = enc_counts[enc_ch-1]
+      enc_button = enc_buttons[enc_ch-1] == 0
+    else:
+      enc_count = get_counter_value(enc_ch)
+      enc_button = not get_button_status(enc_ch)
+
+    # Get an edge trigger of the encoder button
+    button_change = False
+    if enc_button == True:
+      if button_ch[enc_ch-1] == True:
+        enc_button = False
+      else:
+        button_ch[enc_ch-1] = True
+        set_led_rgb(enc_ch, 0x40ff40)
+        button_change = True
+    else:
+      if button_ch[enc_ch-1] == True:
+        set_led_rgb(enc_ch, 0x000000)
+        button_ch[enc_ch-1] = False
+        button_change = True
+
+    # Encoder rotations
+    if enc_count >= 2:
+      delta = 1
+    elif  enc_count <= -2:
+      delta = -1
+    else:
+      delta = 0
+
+    # Reset the encoder counter
+    if delta != 0:
+      set_counter_value(enc_ch, 0)
+
+    # No operation on the encoder
+    #   The repeat sign parameter follows the time cursor moved with another encoder.
+    if delta == 0 and not button_change and not slide_switch_change:
+      if not (menu_handler is encoder_seq_ctrl and seq_parm == SEQUENCER_PARM_REPEAT):
+        continue
+
+    ## MENU PROCESS
+    if menu_handler is not None:
+      if menu_handler(enc_ch, delta, enc_button, slide_switch_change):
+        break
+
+      # The screen mode is changed
+      if menu_handler is encoder_screen:
+        menu_handlers = enc_menu_rows[(10 if enc_slide_switch else 0) + (100 if app_screen_mode == SCREEN_MODE_SEQUENCER else 0)]
+
+  # Redraw the sequencer tracks changed by the encoders at once
+  sequencer_flush_draw()
 
-              else:
-                if delta == -1:
-                  rept['repeat'] = True
-                else:
-                  rept['loop'] = True
-
-              # Add or change score signs at a time
-              sequencer_edit_signs(rept)
-
-            disp = 'NON'
-            if not rept is None:
-              if rept['loop']:
-                disp = 'LOP'
-              elif rept['skip']:
-                disp = 'SKP'
-              elif rept['repeat']:
-                disp = 'RPT'
-
-            label_seq_parm_value.setText(disp)
-            sequencer_draw_track(0)
-            sequencer_draw_track(1)
 
 # Set up the program
 def setup_player():
@@ -3396,45 +4373,42 @@ def setup_player():
   global enc_ch_val
   global midi_uart, label_midi_in
   global midi_in_settings, midi_in_ch, midi_in_set_num, label_midi_in_set, label_midi_in_set_ctrl
-  global enc_parameter_info, enc_total_parameters, label_smf_parm_title, label_midi_parm_title
-
-  # Titles
-  title_smf = Widgets.Label('title_smf', 0, 0, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  title_smf_params = Widgets.Label('title_smf_params', 0, 20, 1.0, 0xff8080, 0x222222, Widgets.FONTS.DejaVu18)
-  title_midi_in = Widgets.Label('title_midi_in', 0, 100, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-  title_midi_in_params = Widgets.Label('title_midi_in_params', 0, 120, 1.0, 0xff8080, 0x222222, Widgets.FONTS.DejaVu18)
-  title_general = Widgets.Label('title_general', 0, 200, 1.0, 0xff8080, 0x222222, Widgets.FONTS.DejaVu18)
-
-  # GUI for SMF player
-  label_smf_fnum = Widgets.Label('label_smf_fnum', 0, 40, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_transp = Widgets.Label('label_smf_transp', 46, 40, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_volume = Widgets.Label('label_smf_volume', 94, 40, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_tempo = Widgets.Label('label_smf_tempo', 150, 40, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_parameter = Widgets.Label('label_smf_parameter', 201, 40, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_parm_value = Widgets.Label('label_smf_parm_value', 262, 40, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_parm_title = Widgets.Label('label_smf_parm_title', 201, 0, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-
-  # SMF file information
-  label_smf_file = Widgets.Label('label_smf_file', 0, 60, 1.0, 0x00ffcc, 0x222222, Widgets.FONTS.DejaVu18)
-  label_smf_fname = Widgets.Label('label_smf_fname', 60, 60, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-
-  # GUI for MIDI-IN play
-  label_midi_in_set = Widgets.Label('label_midi_in_set', 0, 140, 1.0, 0x00ffcc, 0x222222, Widgets.FONTS.DejaVu18)
-  label_midi_in_set_ctrl = Widgets.Label('label_midi_in_set', 46, 140, 1.0, 0x00ffcc, 0x222222, Widgets.FONTS.DejaVu18)
-  label_channel = Widgets.Label('label_channel', 108, 140, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_program = Widgets.Label('label_program', 159, 140, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_midi_parameter = Widgets.Label('label_midi_parameter', 204, 140, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_midi_parm_value = Widgets.Label('label_midi_parm_value', 264, 140, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-  label_midi_parm_title = Widgets.Label('label_midi_parm_title', 204, 100, 1.0, 0x00ccff, 0x222222, Widgets.FONTS.DejaVu18)
-
-  # Program name
-  label_program_name = Widgets.Label('label_program_name', 0, 160, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
-
-  # MIDI IN status
-  label_midi_in = Widgets.Label('label_midi_in', 165, 100, 1.0, 0x00ffcc, 0x222222, Widgets.FONTS.DejaVu18)
-
-  # Master Volume
-  label_master_volume = Widgets.Label('label_master_volume', 0, 220, 1.0, 0xffffff, 0x222222, Widgets.FONTS.DejaVu18)
+  global enc_parameter_info, enc_total_parameters, enc_parameter_table, label_smf_parm_title, label_midi_parm_title
+
+  # Labels: (global variable name, x, y, foreground color)
+  create_labels((
+      # Titles
+      ('title_smf', 0, 0, COLOR_CYAN),
+      ('title_smf_params', 0, 20, COLOR_PINK),
+      ('title_midi_in', 0, 100, COLOR_CYAN),
+      ('title_midi_in_params', 0, 120, COLOR_PINK),
+      ('title_general', 0, 200, COLOR_PINK),
+      # GUI for SMF player
+      ('label_smf_fnum', 0, 40, COLOR_WHITE),
+      ('label_smf_transp', 46, 40, COLOR_WHITE),
+      ('label_smf_volume', 94, 40, COLOR_WHITE),
+      ('label_smf_tempo', 150, 40, COLOR_WHITE),
+      ('label_smf_parameter', 201, 40, COLOR_WHITE),
+      ('label_smf_parm_value', 262, 40, COLOR_WHITE),
+      ('label_smf_parm_title', 201, 0, COLOR_CYAN),
+      # SMF file information
+      ('label_smf_file', 0, 60, COLOR_AQUA),
+      ('label_smf_fname', 60, 60, COLOR_WHITE),
+      # GUI for MIDI-IN play
+      ('label_midi_in_set', 0, 140, COLOR_AQUA),
+      ('label_midi_in_set_ctrl', 46, 140, COLOR_AQUA),
+      ('label_channel', 108, 140, COLOR_WHITE),
+      ('label_program', 159, 140, COLOR_WHITE),
+      ('label_midi_parameter', 204, 140, COLOR_WHITE),
+      ('label_midi_parm_value', 264, 140, COLOR_WHITE),
+      ('label_midi_parm_title', 204, 100, COLOR_CYAN),
+      # Program name
+      ('label_program_name', 0, 160, COLOR_WHITE),
+      # MIDI IN status
+      ('label_midi_in', 165, 100, COLOR_AQUA),
+      # Master Volume
+      ('label_master_volume', 0, 220, COLOR_WHITE),
+    ))
 
   # Parameter items settings
   #   'key': effector dict key in smf_settings and midi_in_settings.
@@ -3449,111 +4423,124 @@ def setup_player():
       {'title': 'VIBRATE', 'key': 'vibrate', 'params': [{'label': 'RATE', 'value': (127,True )}, {'label': 'DEPT', 'value': (127,True)}, {'label': 'DELY', 'value': (127,True)}],                                         'set_smf': set_smf_vibrate, 'set_midi': set_midi_in_vibrate}
     ]
 
+  # Flat parameter definitions of each parameter number
+  enc_parameter_table = tuple([(effector['title'], param['label'], effector['key'], prm_index, param['value'][0], param['value'][1], effector['set_smf'], effector['set_midi'])
+                               for effector in enc_parameter_info for prm_index, param in enumerate(effector['params'])])
+
   # Number of effector parameters
-  for effector in enc_parameter_info:
-    enc_total_parameters = enc_total_parameters + len(effector['params'])
+  enc_total_parameters = len(enc_parameter_table)
 
   # I2C
   i2c0 = I2C(0, scl=Pin(33), sda=Pin(32), freq=100000)
-  i2c_list = i2c0.scan()
-  print('I2C:', i2c_list)
+  i2c_list = [addr for addr in (ENC8_I2C_ADDR,) if i2c_probe(addr)]
+  if DEBUG:
+    print('I2C:', i2c_list)
   encoder_init()
 
   # SYNTH settings
-  for ch in range(16):
-    midi_in_settings.append({'program':0, 'gmbank':0, 'reverb':[0,0,0], 'chorus':[0,0,0,0], 'vibrate':[0,0,0]})
+  midi_in_settings = [midi_in_channel_init({}) for ch in range(16)]
 
   # SYNTH unit
   global synth_0
   synth_0 = MIDIUnit(1, port=(13, 14))
   midi_uart = synth_0._uart
+  midi_in_init()
 
   synth_0.set_instrument(midi_in_settings[midi_in_ch]['gmbank'], midi_in_ch, midi_in_settings[midi_in_ch]['program'])
-  synth_0.set_master_volume(master_volume)
-  for ch in range(16):
-    synth_0.set_reverb(ch, 0, 0, 0)
-    synth_0.set_chorus(ch, 0, 0, 0, 0)
+  control_master_volume(master_volume)
 
-  # Initialize GUI display
+  # Initialize GUI display (each label is drawn once at label_draw_resume())
+  label_draw_suspend()
   title_smf.setText('SMF PLAYER')
   title_smf_params.setText('NO. TRN VOL TEMP PARM VAL')
   title_midi_in.setText('MIDI-IN PLAYER')
   title_midi_in_params.setText('NO. FIL  MCH PROG PARM VAL')
   title_general.setText('VOL')
 
-  label_midi_in_set.setText('{:03d}'.format(midi_in_set_num))
-  label_midi_in_set_ctrl.setText(enc_midi_set_ctrl_list[enc_midi_set_ctrl])
-  label_midi_in.setText('*')
-  label_midi_in.setVisible(False)
+  label_set_text(label_midi_in_set, num3_str(midi_in_set_num))
+  label_set_text(label_midi_in_set_ctrl, enc_midi_set_ctrl_list[enc_midi_set_ctrl])
+  label_set_text(label_midi_in, '*')
+  label_set_visible(label_midi_in, False)
 
   set_synth_master_volume(0)
 
-  label_smf_file.setText('FILE:')
-  label_smf_file.setVisible(True)
-  label_smf_fname.setText('none')
-  label_smf_fname.setVisible(True)
-  label_smf_fnum.setText('{:03d}'.format(0))
-  label_smf_fnum.setColor(0x00ffcc, 0x222222)
+  label_set_text(label_smf_file, 'FILE:')
+  label_set_visible(label_smf_file, True)
+  label_set_text(label_smf_fname, 'none')
+  label_set_visible(label_smf_fname, True)
+  label_set_text(label_smf_fnum, num3_str(0))
+  label_set_color(label_smf_fnum, COLORS_LABEL)
 
   set_smf_transpose(0)
   set_smf_volume_delta(0)
-  label_smf_tempo.setText('x{:3.1f}'.format(smf_speed_factor))
+  label_set_text(label_smf_tempo, speed_str(smf_speed_factor))
   #set_smf_reverb()
   #set_smf_chorus()
 
-  set_midi_in_channel(0)
-  set_midi_in_program(0)
+  show_midi_in_channel()
   #set_midi_in_reverb()
   #set_midi_in_chorus()
-  label_smf_parm_title.setText(enc_parameter_info[enc_parm]['title'])
-  label_smf_parameter.setText(enc_parameter_info[enc_parm]['params'][0]['label'])
-  label_smf_parm_value.setText('{:03d}'.format(smf_settings['reverb'][0]))
-  label_smf_parameter.setColor(0x00ffcc, 0x222222)
-  label_smf_parm_value.setColor(0xffffff, 0x222222)
-
-  label_midi_parm_title.setText(enc_parameter_info[enc_parm]['title'])
-  label_midi_parameter.setText(enc_parameter_info[enc_parm]['params'][0]['label'])
-  label_midi_parm_value.setText('{:03d}'.format(midi_in_settings[midi_in_ch]['reverb'][0]))
-  label_midi_parameter.setColor(0x00ffcc, 0x222222)
-  label_midi_parm_value.setColor(0xffffff, 0x222222)
+  label_set_text(label_smf_parm_title, enc_parameter_table[enc_parm][0])
+  label_set_text(label_smf_parameter, enc_parameter_table[enc_parm][1])
+  label_set_text(label_smf_parm_value, num3_str(smf_settings['reverb'][0]))
+  label_set_color(label_smf_parameter, COLORS_LABEL)
+  label_set_color(label_smf_parm_value, COLORS_VALUE)
+
+  label_set_text(label_midi_parm_title, enc_parameter_table[enc_parm][0])
+  label_set_text(label_midi_parameter, enc_parameter_table[enc_parm][1])
+  label_set_text(label_midi_parm_value, num3_str(midi_in_settings[midi_in_ch]['reverb'][0]))
+  label_set_color(label_midi_parameter, COLORS_LABEL)
+  label_set_color(label_midi_parm_value, COLORS_VALUE)
+  label_draw_resume()
 
   # Initialize 8encoder
   for ch in range(1,9):
     encoder8_0.set_led_rgb(ch, 0x000000)
 
+  # SMF player thread
+  smf_player_init()
+
   # Prepare SYNTH data and all notes off
   all_notes_off()
 
   # Load default MIDI IN settings
   midi_in_set = read_midi_in_settings(midi_in_set_num)
-  if not midi_in_set is None:
+  if midi_in_set is not None:
     print('LOAD MIDI IN SET:', midi_in_set_num)
     midi_in_settings = midi_in_set
-    set_midi_in_channel(0)
-    set_midi_in_program(0)
-    set_midi_in_reverb()
-    set_midi_in_chorus()
-    set_midi_in_vibrate()
+    show_midi_in_channel()
     send_all_midi_in_settings()
   else:
     print('MIDI IN SET: NO FILE')
 
+    # Effectors off (a MIDI IN setting file sends all the effectors above)
+    for ch in range(16):
+      control_reverb(ch, 0, 0, 0)
+      control_chorus(ch, 0, 0, 0, 0)
+
+    control_vibrate(midi_in_ch, 0, 0, 0)
+
 
 # Task loop
 def loop():
-  global i2c0
-  M5.update()
+  global i2c0, enc_poll_time
 
   # Player mode
   midi_in()
-  encoder_read()
+
+  # M5 and the encoders at the interval (the encoder counters keep the changes between reads)
+  now = time.ticks_ms()
+  if time.ticks_diff(now, enc_poll_time) >= ENC_POLL_INTERVAL:
+    enc_poll_time = now
+    M5.update()
+    encoder_read()
 
 
 # Main program
 if __name__ == '__main__':
   try:
     M5.begin()
-    Widgets.fillScreen(0x222222)
+    Widgets.fillScreen(COLOR_BG)
     sdcard_init()
 
     setup_sequencer()
@@ -208,8 +208,11 @@
 #   Default values are used if a file to load is not available.
 #####################################################################################################
 
-import os, sys, io
-import json
+import os, sys, io, gc, array
+try:
+  import ujson as json
+except ImportError:
+  import json
 import M5
 from M5 import *
 from unit import CardKBUnit
@@ -675,7 +678,20 @@ class sdcard_class:
 
     self.file_opened = None
 
+  # File exists or not
+  def file_exists(self, path, fname):
+    try:
+      os.stat(path + fname)
+      return True
+
+    except Exception:
+      pass
+
+    return False
+
   # Read JSON format file, then retun JSON data
+  #   Parse from the file stream not to hold the whole text and the parsed data in the memory
+  #   at the same time (a sequencer score file is large).
   def json_read(self, path, fname):
     json_data = None
     try:
@@ -687,11 +703,12 @@ class sdcard_class:
 
     return json_data
 
-  # Write JSON format file
+  # Write JSON format file without spaces in one write
   def json_write(self, path, fname, json_data):
     try:
+      json_text = json.dumps(json_data, separators=(',', ':'))
       with open(path + fname, 'w') as f:
-        json.dump(json_data, f)
+        f.write(json_text)
 
       return True
 
@@ -711,10 +728,15 @@ class midi_class:
   def __init__(self, synthesizer_obj, sdcard_obj):
     self.synth = synthesizer_obj
     self.midi_uart = self.synth._uart
+    self.midi_in_buf = bytearray(512)                # MIDI IN receive buffer
+    self.midi_in_buf_mv = memoryview(self.midi_in_buf)
+    self.note_msg = bytearray(3)                     # Note on/off message buffer
+    self.notes_off_buf = bytearray(3 * 128)          # Notes off messages buffer
     self.sdcard_obj = sdcard_obj
     self.master_volume = 127
     self.key_trans = 0
     self.key_names = ['C','C#','D','D#','E','F','F#','G','G#','A','A#','B']
+    self.key_name_strs = tuple([self.key_names[k % 12] + ('' if k < 12 else str(int(k / 12) - 1)) for k in range(128)])
     self.USE_GMBANK = 0                              # GM bank number (normally 0, option is 127)
     #self.USE_GMBANK = 127
     self.GM_FILE_PATH = '/sd//SYNTH/MIDIFILE/'       # GM program names list file path
@@ -749,7 +771,9 @@ class midi_class:
   # Get GM prgram name
   #   gmbank: GM bank number
   #   program: GM program number
-  def get_gm_program_name(self, gmbank, program):
+  #   max_len: Maximum length of the name (None: no limit)
+  #   Blank lines in the GM file are skipped.
+  def get_gm_program_name(self, gmbank, program, max_len = None):
     f = self.sdcard_obj.file_open(self.GM_FILE_PATH, 'GM' + str(gmbank) + '.TXT')
     if not f is None:
       for mf in f:
@@ -757,9 +781,12 @@ class midi_class:
         if len(mf) > 0:
           if program == 0:
             self.sdcard_obj.file_close()
+            if not max_len is None and len(mf) > max_len:
+              mf = mf[:max_len]
+
             return mf
 
-        program = program - 1
+          program = program - 1
 
       self.sdcard_obj.file_close()
 
@@ -768,6 +795,9 @@ class midi_class:
   # Get key name of key number
   #   key_num: MIDI note number
   def key_name(self, key_num):
+    if 0 <= key_num and key_num < 128:
+      return self.key_name_strs[key_num]
+
     octave = int(key_num / 12) - 1
     return self.key_names[key_num % 12] + ('' if octave < 0 else str(octave))
 
@@ -776,10 +806,22 @@ class midi_class:
     self.midi_uart.write(midi_bytes)
 
   # MIDI IN
+  #   Read until the UART is empty or the receive buffer is full.
+  #   Returns a view of the receive buffer, valid until the next call.
   def midi_in(self):
-    midi_rcv_bytes = self.midi_uart.any()
+    buf_len = len(self.midi_in_buf)
+    midi_rcv_bytes = 0
+    avail = self.midi_uart.any()
+    while avail > 0 and midi_rcv_bytes < buf_len:
+      rd = self.midi_uart.readinto(self.midi_in_buf_mv[midi_rcv_bytes:midi_rcv_bytes + min(avail, buf_len - midi_rcv_bytes)])
+      if not rd:
+        break
+
+      midi_rcv_bytes = midi_rcv_bytes + rd
+      avail = self.midi_uart.any()
+
     if midi_rcv_bytes > 0:
-      return self.midi_uart.read()
+      return self.midi_in_buf_mv[:midi_rcv_bytes]
 
     return None
 
@@ -792,15 +834,13 @@ class midi_class:
         self.midi_out(midi_bytes)
 
       else:
-        midi_out_data = bytearray(0)
-        for mdt in midi_bytes:
-          evt = mdt & 0xf0
+        # Override the channel of the channel messages in the receive buffer
+        for i in range(len(midi_bytes)):
+          evt = midi_bytes[i] & 0xf0
           if 0x80 <= evt and evt <= 0xE0:
-            midi_out_data.extend((evt | channel_override).to_bytes(1,'little'))
-          else:
-            midi_out_data.extend((mdt).to_bytes(1,'little'))
+            midi_bytes[i] = evt | channel_override
 
-        self.midi_out(midi_out_data)
+        self.midi_out(midi_bytes)
 
       return True
 
@@ -827,23 +867,72 @@ class midi_class:
     self.synth.set_instrument(gmbank, int(channel), int(prog))
 
   # Note on
-  def set_note_on(self, channel, note_key, velosity, transpose = False):
-    self.synth.set_note_on(channel, note_key + (self.key_trans if transpose else 0), velosity)
+  #   msg: Message buffer (the other thread has to give its own buffer)
+  #   A note out of 0..127 after transposed is not sent.
+  def set_note_on(self, channel, note_key, velosity, transpose = False, msg = None):
+    note_key = note_key + (self.key_trans if transpose else 0)
+    if note_key < 0 or note_key > 127:
+      return
+
+    if msg is None:
+      msg = self.note_msg
+
+    msg[0] = 0x90 | channel
+    msg[1] = note_key
+    msg[2] = 0 if velosity < 0 else (127 if velosity > 127 else velosity)
+    self.midi_out(msg)
   
   # Note off
-  def set_note_off(self, channel, note_key, transpose = False):
-    self.synth.set_note_off(channel, note_key + (self.key_trans if transpose else 0))
+  #   A note out of 0..127 after transposed is not sent.
+  def set_note_off(self, channel, note_key, transpose = False, msg = None):
+    note_key = note_key + (self.key_trans if transpose else 0)
+    if note_key < 0 or note_key > 127:
+      return
 
-  # Notes off
-  def notes_off(self, channel, note_keys, transpose = False):
+    if msg is None:
+      msg = self.note_msg
+
+    msg[0] = 0x80 | channel
+    msg[1] = note_key
+    msg[2] = 0
+    self.midi_out(msg)
+
+  # Notes off in a MIDI message batch
+  #   buf: Message buffer (the other thread has to give its own buffer)
+  #   Notes out of 0..127 after transposed are not sent.
+  def notes_off(self, channel, note_keys, transpose = False, buf = None):
+    if buf is None:
+      buf = self.notes_off_buf
+
+    trans = self.key_trans if transpose else 0
+    buf_len = len(buf)
+    i = 0
     for nk in note_keys:
-      self.set_note_off(channel, nk, transpose)
+      nk = nk + trans
+      if nk < 0 or nk > 127:
+        continue
+
+      buf[i] = 0x80 | channel
+      buf[i + 1] = nk
+      buf[i + 2] = 0
+      i = i + 3
+      if i == buf_len:
+        self.midi_out(buf)
+        i = 0
+
+    if i > 0:
+      self.midi_out(memoryview(buf)[:i])
 
   # All notes off
   def set_all_notes_off(self, channel = None):
     if channel is None:
+      # All notes off control change for all channels in a MIDI message batch
+      midi_bytes = bytearray(48)
       for ch in range(16):
-        self.set_all_notes_off(ch)
+        midi_bytes[ch * 3] = 0xB0 | ch
+        midi_bytes[ch * 3 + 1] = 0x7B
+
+      self.midi_out(midi_bytes)
     else:
       self.synth.set_all_notes_off(channel)
 
@@ -887,7 +976,7 @@ class midi_message_class(midi_class):
       self.message_center = message_center_class()
 
   def func_MIDI_GET_PROGRAM_NAME(self, message_data = None):
-    return self.get_gm_program_name(message_data['gm_bank'], message_data['program_number'])
+    return self.get_gm_program_name(message_data['gm_bank'], message_data['program_number'], message_data.get('max_len'))
 
   def func_MIDI_SET_INSTRUMENT(self, message_data = None):
     self.set_instrument(message_data['gm_bank'], message_data['channel'], message_data['program_number'])
@@ -1035,6 +1124,8 @@ class smf_player_class():
     self.smf_volume_delta = 0         # Velosity delta value
     self.smf_settings = {'reverb':[0,0,0], 'chorus': [0,0,0,0], 'vibrate': [0,0,0]}
     self.smf_speed_factor = 1.0       # Speed factor to play SMF
+    self.smf_note_msg = bytearray(3)  # Note on message buffer for the player thread
+    self.smf_notes_off_buf = bytearray(48)  # Notes off messages buffer for the player thread
     self.smf_play_mode = 'STOP'       # SMF Player control word
     self.playing_smf = False          # Playing a SMF at the moment or not
     self.SMF_FILE_PATH = '/sd//SYNTH/MIDIFILE/'       # Standard MIDI files path
@@ -1304,7 +1395,7 @@ class smf_player_class():
     def midiev_note_on(ch, rb):
       if rb[1] == 0:
     #    notes_off(ch, [rb[0]])
-        self.midi_obj.notes_off(ch, [rb[0]], True)
+        self.midi_obj.notes_off(ch, [rb[0]], True, self.smf_notes_off_buf)
       else:
         vol = int(rb[1]) + self.smf_volume_delta
         if vol <= 0:
@@ -1313,7 +1404,7 @@ class smf_player_class():
           vol = 127
         
         # Note-on with key transpose
-        self.midi_obj.set_note_on(ch, int(rb[0]), vol, True)
+        self.midi_obj.set_note_on(ch, int(rb[0]), vol, True, self.smf_note_msg)
 
     def callback_function_ignore(data):
       pass
@@ -1482,7 +1573,7 @@ class smf_player_class():
             # Note off
             if ev == 0x80:
               rb = read_track_data(2, rsr, rsr_bt)
-              self.midi_obj.notes_off(ch, rb, True)
+              self.midi_obj.notes_off(ch, rb, True, self.smf_notes_off_buf)
 
             # Note on (Note off if volume equals zero)
             elif ev == 0x90:
@@ -1706,8 +1797,9 @@ class smf_player_message_class(smf_player_class):
 # Sequencer Class
 ###################
 class sequencer_class():
-  # self.seq_channel: Sequencer channel data
-  #   [{'gmbank': <GM bank>, 'program': <GM program>, 'volume': <Volume ratio>}, ..]
+  # self.seq_channel: Sequencer channel data in arrays indexed by MIDI channel
+  #   {'gmbank': <GM banks>, 'program': <GM programs>, 'volume': <Volume ratios>}
+  #   The file has the list form [{'gmbank': <GM bank>, 'program': <GM program>, 'volume': <Volume ratio>}, ..]
 
   # self.seq_score: Sequencer score data
   #   [
@@ -1723,6 +1815,10 @@ class sequencer_class():
   #     }
   #   ] 
 
+  # self.seq_index: Index of self.seq_score per MIDI channel and note number (rebuilt after the score is edited)
+  #   [{<Note number>: (<Note on times>, <durations>, <max duration>, <scores>, <note_data list>), ..}, ..]
+  #   Note on times and durations are arrays in time order, the other lists are parallel to them.
+
   # self.seq_score_sign: Signs on the score
   # [
   #    {
@@ -1733,6 +1829,11 @@ class sequencer_class():
   #    }
   # ]
 
+  # self.seq_cursor_note: Note at the edit cursor or None
+  #   (<score in self.seq_score>, <note_data in the score>)
+  #   References, not indexes: they stay valid when other notes are added or deleted.
+  #   Find the note again after an edit that moves or deletes notes (insert/delete time, resolution).
+
   # Sequencer controls
   #   'tempo': Play a quoter note 'tempo' times per a minutes 
   #   'mini_note': Minimum note length (4,8,16,32,64: data are 2,3,4,5,6 respectively) 
@@ -1751,7 +1852,11 @@ class sequencer_class():
     self.sdcard_obj = sdcard_obj
     self.seq_channel = None
     self.seq_score = None
+    self.seq_index = None
+    self.seq_index_score = None
     self.seq_score_sign = None
+    self.seq_sign_index = None
+    self.seq_sign_index_list = None
     self.seq_parm_repeat = None
     self.seq_control = {'tempo': 120, 'mini_note': 4, 'time_per_bar': 4, 'disp_time': [0,12], 'disp_key': [[57,74],[57,74]], 'time_cursor': 0, 'key_cursor': [60,60], 'program':[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15], 'gmbank':[0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0]}
 
@@ -1844,9 +1949,7 @@ class sequencer_class():
   # Set up the sequencer
   def setup_sequencer(self):
     # Initialize the sequencer channels
-    self.seq_channel = []
-    for ch in range(16):
-      self.seq_channel.append({'gmbank': self.midi_obj.gmbank(), 'program': ch, 'volume': 100})
+    self.seq_channel = {'gmbank': array.array('B', [self.midi_obj.gmbank()] * 16), 'program': array.array('B', range(16)), 'volume': array.array('B', [100] * 16)}
 
     # Clear score
     self.seq_score = []
@@ -1906,6 +2009,7 @@ class sequencer_class():
   # Clear seq_score
   def clear_seq_score(self):
     self.seq_score = []
+    self.sequencer_index_invalidate()
     self.seq_score_sign = []
 
   # Get seq_score
@@ -1914,12 +2018,16 @@ class sequencer_class():
 
   # Set seq_channel
   def set_seq_channel(self, channel, key_str, val):
-    self.seq_channel[channel][key_str] = val
+    self.seq_channel[key_str][channel] = val
     return val
 
   # Get seq_channel
   def get_seq_channel(self, channel, key_str):
-    return self.seq_channel[channel][key_str]
+    return self.seq_channel[key_str][channel]
+
+  # Get seq_channel in the file form
+  def seq_channel_json(self):
+    return [{'gmbank': self.seq_channel['gmbank'][ch], 'program': self.seq_channel['program'][ch], 'volume': self.seq_channel['volume'][ch]} for ch in range(16)]
 
   # Set seq_parm_repeat
   def set_seq_parm_repeat(self, time_cursor):
@@ -2043,52 +2151,51 @@ class sequencer_class():
   # Save sequencer file
   def sequencer_save_file(self, path, num):
     # Write MIDI IN settings as JSON file
-    if self.sdcard_obj.json_write(path, 'SEQSC{:0=3d}.json'.format(num), {'channel': self.seq_channel, 'control': self.seq_control, 'score': self.seq_score, 'sign': self.seq_score_sign}):
+    if self.sdcard_obj.json_write(path, 'SEQSC%03d.json' % num, {'channel': self.seq_channel_json(), 'control': self.seq_control, 'score': self.seq_score, 'sign': self.seq_score_sign}):
       print('SAVED')
 
   # Load sequencer file
   def sequencer_load_file(self, path, num):
+    # The current score is kept until the file is parsed successfully
+    #   (not to lose the score in editing by a broken file or an SD card error)
+    fname = 'SEQSC%03d.json' % num
+    if not self.sdcard_obj.file_exists(path, fname):
+      return
+
+    # Release the indexes made from the current score to parse the file in the memory
+    #   (they are rebuilt from the score at the next use)
+    self.seq_index = None
+    self.seq_index_score = None
+    self.seq_sign_index = None
+    self.seq_sign_index_list = None
+    gc.collect()
+
     # Read MIDI IN settings JSON file
-    seq_data = self.sdcard_obj.json_read(path, 'SEQSC{:0=3d}.json'.format(num))
+    seq_data = self.sdcard_obj.json_read(path, fname)
     if not seq_data is None:
-      if 'score' in seq_data.keys():
-        if seq_data['score'] is None:
-          self.seq_score = []
-        else:
-          self.seq_score = seq_data['score']
-      else:
-        seq_data = []
-      
-      if 'sign' in seq_data.keys():
-        if seq_data['sign'] is None:
-          self.seq_score_sign = []
-        else:
-          self.seq_score_sign = seq_data['sign']
-      else:
-        self.seq_score_sign = []
+      score = seq_data.get('score')
+      self.seq_score = [] if score is None else score
 
-      if 'control' in seq_data.keys():
-        if seq_data['control'] is None:
-          self.seq_control = {'tempo': 120, 'mini_note': 4, 'time_per_bar': 4, 'disp_time': [0,12], 'disp_key': [[57,74],[57,74]], 'time_cursor': 0, 'key_cursor': [60,60], 'program':[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15], 'gmbank':[0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0]}
-        else:
-          for ky in seq_data['control'].keys():
-            if ky == 'tempo':
-              self.seq_control[ky] = int(seq_data['control'][ky])
-            else:
-              self.seq_control[ky] = seq_data['control'][ky]
-      else:
+      sign = seq_data.get('sign')
+      self.seq_score_sign = [] if sign is None else sign
+
+      control = seq_data.get('control')
+      if control is None:
         self.seq_control = {'tempo': 120, 'mini_note': 4, 'time_per_bar': 4, 'disp_time': [0,12], 'disp_key': [[57,74],[57,74]], 'time_cursor': 0, 'key_cursor': [60,60], 'program':[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15], 'gmbank':[0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0]}
+      else:
+        for ky, val in control.items():
+          if ky == 'tempo':
+            self.seq_control[ky] = int(val)
+          else:
+            self.seq_control[ky] = val
 
-      if 'channel' in seq_data.keys():
-        if not seq_data['channel'] is None:
-          self.seq_channel = seq_data['channel']
-          for ch in range(16):
-            if not 'gmbank' in self.seq_channel[ch]:
-              self.seq_channel[ch]['gmbank'] = 0
-            if not 'program' in self.seq_channel[ch]:
-              self.seq_channel[ch]['program'] = 0
-            if not 'volume' in self.seq_channel[ch]:
-              self.seq_channel[ch]['volume'] = 100
+      channel = seq_data.get('channel')
+      if not channel is None:
+        for ch in range(16):
+          ch_data = channel[ch]
+          self.seq_channel['gmbank'][ch] = ch_data.get('gmbank', 0)
+          self.seq_channel['program'][ch] = ch_data.get('program', 0)
+          self.seq_channel['volume'][ch] = ch_data.get('volume', 100)
 
       self.seq_cursor_note = self.sequencer_find_note(self.seq_edit_track, self.seq_control['time_cursor'], self.seq_control['key_cursor'][self.seq_edit_track])
       self.send_all_sequencer_settings()
@@ -2099,22 +2206,72 @@ class sequencer_class():
   def seqencer_key_name(self, key_num):
     return self.midi_obj.key_name(key_num)
 
+  # Index of the first value equal or larger than val in a sorted list
+  #   key: Compare values[i][key] instead of values[i] (None: compare values[i])
+  def bisect_left(self, values, val, key = None):
+    lo = 0
+    hi = len(values)
+    while lo < hi:
+      mid = (lo + hi) >> 1
+      if (values[mid] if key is None else values[mid][key]) < val:
+        lo = mid + 1
+      else:
+        hi = mid
+
+    return lo
+
+  # Index of the first score at note-on time equal or later than time
+  def sequencer_score_index(self, note_on_time):
+    return self.bisect_left(self.seq_score, note_on_time, 'time')
+
+  # Clear the score index to rebuild it
+  def sequencer_index_invalidate(self):
+    self.seq_index = None
+
+  # Get the score index of a MIDI channel
+  def sequencer_get_index(self, channel):
+    # Rebuild the index
+    if self.seq_index is None or not self.seq_index_score is self.seq_score:
+      self.seq_index = [{} for ch in range(16)]
+      for score in self.seq_score:
+        for note_data in score['notes']:
+          notes = self.seq_index[note_data['channel']]
+          if not note_data['note'] in notes:
+            notes[note_data['note']] = (array.array('I'), array.array('H'), [0], [], [])
+
+          times, durations, max_dur, scores, note_refs = notes[note_data['note']]
+          times.append(score['time'])
+          durations.append(note_data['duration'])
+          scores.append(score)
+          note_refs.append(note_data)
+          if note_data['duration'] > max_dur[0]:
+            max_dur[0] = note_data['duration']
+
+      self.seq_index_score = self.seq_score
+
+    return self.seq_index[channel]
+
   # Find note
   def sequencer_find_note(self, track, seq_time, seq_note):
-    channel = self.seq_track_midi[track]
-    for score in self.seq_score:
-      note_on_tm = score['time']
-      note_off_max = note_on_tm + score['max_duration']
-      if note_on_tm <= seq_time and seq_time <= note_off_max:
-        for note_data in score['notes']:
-          if note_data['channel'] == channel and note_data['note'] == seq_note:
-            if note_on_tm + note_data['duration'] > seq_time:
-              return (score, note_data)
+    notes = self.sequencer_get_index(self.seq_track_midi[track]).get(seq_note)
+    if notes is None:
+      return None
+
+    # Only the notes starting in the maximum duration before the time can be on
+    times, durations, max_dur, scores, note_refs = notes
+    for idx in range(self.bisect_left(times, seq_time - max_dur[0] + 1), len(times)):
+      note_on_tm = times[idx]
+      if note_on_tm > seq_time:
+        break
+
+      if note_on_tm + durations[idx] > seq_time:
+        return (scores[idx], note_refs[idx])
 
     return None
 
   # Update maximum duration
   def sequencer_duration_update(self, score):
+    self.sequencer_index_invalidate()
     max_dur = 0
     for note_data in score['notes']:
       max_dur = max(max_dur, note_data['duration'])
@@ -2123,53 +2280,54 @@ class sequencer_class():
 
   # Delete a note
   def sequencer_delete_note(self, score, note_data):
-    score['notes'].remove(note_data)
-    if len(score['notes']) == 0:
-      self.seq_score.remove(score)
+    self.sequencer_index_invalidate()
+    notes = score['notes']
+    for nt in range(len(notes)):
+      if notes[nt] is note_data:
+        del notes[nt]
+        break
+
+    if len(notes) == 0:
+      sc = self.sequencer_score_index(score['time'])
+      if sc < len(self.seq_score) and self.seq_score[sc] is score:
+        del self.seq_score[sc]
     else:
       self.sequencer_duration_update(score)
 
   # Add new note
+  #   velocity: Note velocity (-1: same as the neighbor note at the same time, or 127 for a new time)
   def sequencer_new_note(self, channel, note_on_time, note_key, velocity = -1, duration = 1):
-    sc = 0
-    scores = len(self.seq_score)
-    while sc < scores:
-      # Add the note to the existing score
+    self.sequencer_index_invalidate()
+    sc = self.sequencer_score_index(note_on_time)
+    if velocity > 127:
+      velocity = 127
+
+    # Add the note to the existing score
+    if sc < len(self.seq_score) and self.seq_score[sc]['time'] == note_on_time:
       current = self.seq_score[sc]
-      if current['time'] == note_on_time:
-        # Inset new note at sorted order by key
-        nt = 0
-        notes_len = len(current['notes'])
-        for nt in range(notes_len):
-          if current['notes'][nt]['note'] > note_key:
-            current['notes'].insert(nt, {'channel': channel, 'note': note_key, 'velocity': max(velocity, current['notes'][nt]['velocity']), 'duration': duration})
-            self.seq_cursor_note = current['notes'][nt]
-            if duration > self.seq_score[sc]['max_duration']:
-              self.seq_score[sc]['max_duration'] = duration
-
-            return (current, self.seq_cursor_note)
-
-        # New note is the highest tone
-        current['notes'].append({'channel': channel, 'note': note_key, 'velocity': max(velocity, current['notes'][notes_len-1]['velocity']), 'duration': duration})
-        self.seq_cursor_note = current['notes'][len(current['notes']) - 1]
-        if duration > self.seq_score[sc]['max_duration']:
-          self.seq_score[sc]['max_duration'] = duration
-
-        return (current, self.seq_cursor_note)
-
-      # Insert the note as new score at new note-on time
-      elif current['time'] > note_on_time:
-        self.seq_score.insert(sc, {'time': note_on_time, 'max_duration': duration, 'notes': [{'channel': channel, 'note': note_key, 'velocity': max(velocity, 127), 'duration': duration}]})
-        current = self.seq_score[sc]
-        self.seq_cursor_note = current['notes'][0]
-        return (current, self.seq_cursor_note)
-
-      # Next note on time
-      sc = sc + 1
-
-    # Append the note as new latest note-on time
-    self.seq_score.append({'time': note_on_time, 'max_duration': duration, 'notes': [{'channel': channel, 'note': note_key, 'velocity': max(velocity, 127), 'duration': duration}]})
-    current = self.seq_score[len(self.seq_score) - 1]
+
+      # Inset new note at sorted order by key
+      notes_len = len(current['notes'])
+      for nt in range(notes_len):
+        if current['notes'][nt]['note'] > note_key:
+          current['notes'].insert(nt, {'channel': channel, 'note': note_key, 'velocity': velocity if velocity >= 0 else current['notes'][nt]['velocity'], 'duration': duration})
+          self.seq_cursor_note = current['notes'][nt]
+          if duration > current['max_duration']:
+            current['max_duration'] = duration
+
+          return (current, self.seq_cursor_note)
+
+      # New note is the highest tone
+      current['notes'].append({'channel': channel, 'note': note_key, 'velocity': velocity if velocity >= 0 else current['notes'][notes_len-1]['velocity'], 'duration': duration})
+      self.seq_cursor_note = current['notes'][len(current['notes']) - 1]
+      if duration > current['max_duration']:
+        current['max_duration'] = duration
+
+      return (current, self.seq_cursor_note)
+
+    # Insert the note as new score at new note-on time
+    self.seq_score.insert(sc, {'time': note_on_time, 'max_duration': duration, 'notes': [{'channel': channel, 'note': note_key, 'velocity': velocity if velocity >= 0 else 127, 'duration': duration}]})
+    current = self.seq_score[sc]
     self.seq_cursor_note = current['notes'][0]
     return (current, self.seq_cursor_note)
 
@@ -2208,7 +2366,7 @@ class sequencer_class():
   # Insert time at the time cursor on a MIDI channel
   def sequencer_insert_time(self, channel, time_cursor, ins_times):
     affected = False
-    for sc_index in list(range(len(self.seq_score)-1,-1,-1)):
+    for sc_index in reversed(range(len(self.seq_score))):
       score = self.seq_score[sc_index]
 
       # Note-on time is equal or larger than the origin time to insert --> move forward
@@ -2239,6 +2397,7 @@ class sequencer_class():
                 note_data['duration'] = note_data['duration'] + ins_times
                 affected = True
 
+    self.sequencer_index_invalidate()
     return affected
 
   # Delete time at the time cursor on the all MIDI channels
@@ -2292,10 +2451,13 @@ class sequencer_class():
     for note_time, note_key, velosity, duration in notes_moved:
       self.sequencer_new_note(channel, note_time, note_key, velosity, duration)
 
+    self.sequencer_index_invalidate()
     return affected
 
   # Up or Down time resolution
   def sequencer_resolution(self, res_up):
+    self.sequencer_index_invalidate()
+    self.seq_sign_index = None
     # Reolution up
     if res_up:
       for score in self.seq_score:
@@ -2322,12 +2484,18 @@ class sequencer_class():
 
   # Get signs on score at tc(time cursor)
   def sequencer_get_repeat_control(self, tc):
-    if not self.seq_score_sign is None:
+    if self.seq_score_sign is None:
+      return None
+
+    # Rebuild the signs index by time after the signs are edited
+    if self.seq_sign_index is None or not self.seq_sign_index_list is self.seq_score_sign:
+      self.seq_sign_index = {}
       for sc_sign in self.seq_score_sign:
-        if sc_sign['time'] == tc:
-          return sc_sign
+        self.seq_sign_index[sc_sign['time']] = sc_sign
 
-    return None
+      self.seq_sign_index_list = self.seq_score_sign
+
+    return self.seq_sign_index.get(tc)
 
   # Add or change score signs at a time
   def sequencer_edit_signs(self, sign_data):
@@ -2348,6 +2516,7 @@ class sequencer_class():
         if flg == False:
           return
 
+        self.seq_sign_index = None
         idx = 0
         for idx in range(len(self.seq_score_sign)):
           if self.seq_score_sign[idx]['time'] > tm:
@@ -2371,7 +2540,8 @@ class sequencer_class():
         
         # No sign is True
         if flg == False:
-          self.seq_score_sign.remove(sign_data)
+          self.seq_sign_index = None
+          self.seq_score_sign.remove(sc_sign)
 
   # Watch MIDI-IN then send data to MIDI-OUT and put notes on the current cursor
   def midi_in_out_and_put_notes(self):
@@ -2896,7 +3066,7 @@ class sequencer_class():
         for note_data in score['notes']:
           channel = note_data['channel']
           print('SEQ NOTE ON:', time_cursor, play_slot, note_data['note'])
-          self.midi_obj.set_note_on(channel, note_data['note'], int(note_data['velocity'] * self.seq_channel[channel]['volume'] / 100))
+          self.midi_obj.set_note_on(channel, note_data['note'], int(note_data['velocity'] * self.seq_channel['volume'][channel] / 100))
           note_off_at = time_cursor + note_data['duration']
           insert_note_off(note_off_at, channel, note_data['note'])
 
@@ -3125,6 +3295,13 @@ class sequencer_message_class(sequencer_class):
     else:
       self.message_center = message_center_class()
 
+  # Program name of a MIDI channel to show on a track
+  def sequencer_program_name(self, channel):
+    if channel == 9:
+      return 'DRUM SET'
+
+    return self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': self.seq_control['gmbank'][channel], 'program_number': self.seq_control['program'][channel], 'max_len': 9})
+
   # To be called just after sequencer_class.sequencer_setup()
   def func_SEQUENCER_SETUP(self, message_data = None):
     # Setup sequencer view
@@ -3157,21 +3334,11 @@ class sequencer_message_class(sequencer_class):
     self.message_center.phone_message(self, self.message_center.MSGID_APPLICATION_SHOW_MASTER_VOLUME_VALUE, None)
 
     ch = self.seq_track_midi[0]
-    if ch == 9:
-      prg = 'DRUM SET'
-    else:
-      prg = self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': self.seq_control['gmbank'][ch], 'program_number': self.seq_control['program'][ch]})
-
-    prg = prg[:9]
+    prg = self.sequencer_program_name(ch)
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_TEXT, {'label': 'label_seq_program1', 'value': prg})
 
     ch = self.seq_track_midi[1]
-    if ch == 9:
-      prg = 'DRUM SET'
-    else:
-      prg = self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': self.seq_control['gmbank'][ch], 'program_number': self.seq_control['program'][ch]})
-
-    prg = prg[:9]
+    prg = self.sequencer_program_name(ch)
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_TEXT, {'label': 'label_seq_program2', 'value': prg})
     
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_PARM_NAME_SET_TEXT)
@@ -3259,12 +3426,7 @@ class sequencer_message_class(sequencer_class):
 
     for trk in range(2):
       ch = self.seq_track_midi[trk]
-      if ch == 9:
-        prg = 'DRUM SET'
-      else:
-        prg = self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': self.seq_control['gmbank'][ch], 'program_number': self.seq_control['program'][ch]})
-
-      prg = prg[:9]
+      prg = self.sequencer_program_name(ch)
       if trk == 0:
         self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_TEXT, {'label': 'label_seq_program1', 'value': prg})
       else:
@@ -3273,12 +3435,7 @@ class sequencer_message_class(sequencer_class):
   def func_SEQUENCER_MIDI_CHANNEL_CHANGED(self, message_data = None):
     channel = self.seq_track_midi[self.seq_edit_track]
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_TEXT, {'label': 'label_seq_parm_value', 'value': '{:02d}'.format(channel + 1)})
-    if channel == 9:
-      prg = 'DRUM SET'
-    else:
-      prg = self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': self.seq_control['gmbank'][channel], 'program_number': self.seq_control['program'][channel]})
-
-    prg = prg[:9]
+    prg = self.sequencer_program_name(channel)
     if   self.seq_edit_track == 0:
       self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_TRACK1_SET_TEXT)
       self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_TEXT, {'label': 'label_seq_program1', 'value': prg})
@@ -3605,7 +3762,7 @@ class sequencer_message_class(sequencer_class):
   def func_SEQUENCER_GET_PROGRAM_NAME(self, message_data = None):
     gm_bank = self.get_seq_gmbank(self.get_track_midi())
     program_number = self.get_seq_program(self.get_track_midi())
-    return self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': gm_bank, 'program_number': program_number})
+    return self.message_center.phone_message(self, self.message_center.MSGID_MIDI_GET_PROGRAM_NAME, {'gm_bank': gm_bank, 'program_number': program_number, 'max_len': None if message_data is None else message_data.get('max_len')})
 
   def func_SEQUENCER_SEND_CHANNEL_SETTINGS(self, message_data = None):
     self.send_sequencer_current_channel_settings(self.get_track_midi())
@@ -3782,14 +3939,14 @@ class midi_in_player_class():
   #   num: File number (0..999)
   def write_midi_in_settings(self, num):
     # Write MIDI IN settings as JSON file
-    self.sdcard_obj.json_write(self.MIDI_IN_FILE_PATH, 'MIDISET{:0=3d}.json'.format(num), self.midi_in_settings)
+    self.sdcard_obj.json_write(self.MIDI_IN_FILE_PATH, 'MIDISET%03d.json' % num, self.midi_in_settings)
 
   # Read MIDI IN settings from SD card
   #   num: File number (0..999)
   def read_midi_in_settings(self, num):
     # Read MIDI IN settings JSON file
     rdjson = None
-    rdjson = self.sdcard_obj.json_read(self.MIDI_IN_FILE_PATH, 'MIDISET{:0=3d}.json'.format(num))
+    rdjson = self.sdcard_obj.json_read(self.MIDI_IN_FILE_PATH, 'MIDISET%03d.json' % num)
     if not rdjson is None:
       # Default values
       for ch in range(16):
@@ -4113,8 +4270,12 @@ class midi_in_player_message_class(midi_in_player_class):
 # View base class for M5Stack CORE2
 #####################################
 class view_m5stack_core2():
+  screen_clears = 0           # Number of display clears in all views
+
   def __init__(self):
     self.label_list = {}      # {Label name: its object, ...}
+    self.label_text = {}      # {Label name: text drawn, ...}
+    self.label_text_clears = 0
 
   # Add label name and its object as a dictionary data.
   # Label object is generated in this function.
@@ -4130,14 +4291,25 @@ class view_m5stack_core2():
     if label_name in self.label_list.keys():
       if 'format' in message_data.keys():
         if isinstance(message_data['value'], tuple):
-          self.label_list[label_name].setText(message_data['format'].format(*message_data['value']))
+          text = message_data['format'].format(*message_data['value'])
         else:
-          self.label_list[label_name].setText(message_data['format'].format(message_data['value']))
+          text = message_data['format'].format(message_data['value'])
       else:
         if isinstance(message_data['value'], tuple):
+          self.label_text.pop(label_name, None)
           self.label_list[label_name].setText(*message_data['value'])
-        else:
-          self.label_list[label_name].setText(message_data['value'])
+          return True
+
+        text = message_data['value']
+
+      # Draw the text only if changed since the last display clear
+      if self.label_text_clears != view_m5stack_core2.screen_clears:
+        self.label_text_clears = view_m5stack_core2.screen_clears
+        self.label_text = {}
+
+      if self.label_text.get(label_name) != text:
+        self.label_text[label_name] = text
+        self.label_list[label_name].setText(text)
 
       return True
     else:
@@ -4149,11 +4321,19 @@ class view_m5stack_core2():
   def label_setVisible(self, message_data):
     label_name = message_data['label']
     if label_name in self.label_list.keys():
+      self.label_text.pop(label_name, None)
       self.label_list[label_name].setVisible(message_data['visible'])
       return True
     else:
       return False
 
+  # Set visible flag of all labels of the view
+  #   visible: True or False
+  def labels_setVisible(self, visible):
+    self.label_text = {}
+    for label in self.label_list.values():
+      label.setVisible(visible)
+
   # Set text color
   #   message_data['label']: Label name
   #   message_data['fore' ]: Fore color
@@ -4168,6 +4348,7 @@ class view_m5stack_core2():
 
   # Clear display
   def display_clear(self, color = 0x000000):
+    view_m5stack_core2.screen_clears = view_m5stack_core2.screen_clears + 1
     M5.Lcd.clear(color)
 
 ################# End of view_m5stack_core2 Definition #################
@@ -4305,22 +4486,8 @@ class view_smf_player_class(view_m5stack_core2):
   def func_SMF_PLAYER_SCREEN_VISIBILITY(self, message_data = None):
     visible = message_data['visible']
 
-    # Tile labels
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'title_smf', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'title_smf_params', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'title_general', 'visible': visible})
-
-    # SMF data labels
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_master_volume', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_file', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_fname', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_fnum', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_transp', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_volume', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_tempo', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_parameter', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_parm_value', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SMF_PLAYER_SET_VISIBLE, {'label': 'label_smf_parm_title', 'visible': visible})
+    # All labels of the view
+    self.labels_setVisible(visible)
 
 ################# End of view_smf_player_class Definition #################
 
@@ -4456,20 +4623,8 @@ class view_midi_in_player_class(view_m5stack_core2):
   def func_MIDI_IN_PLAYER_SCREEN_VISIBILITY(self, message_data = None):
     visible = message_data['visible']
 
-    # Tile labels
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'title_midi_in', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'title_midi_in_params', 'visible': visible})
-
-    # MIDI data labels
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_midi_in_set', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_midi_in_set_ctrl', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_midi_in', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_channel', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_program', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_program_name', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_midi_parameter', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_midi_parm_value', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_MIDI_IN_PLAYER_SET_VISIBLE, {'label': 'label_midi_parm_title', 'visible': visible})
+    # All labels of the view
+    self.labels_setVisible(visible)
 
 ################# End of view_midi_in_player_class Definition #################
 
@@ -4604,17 +4759,19 @@ class view_sequencer_class(view_m5stack_core2):
     area = self.data_obj.seq_draw_area[trknum]
     x = area[0]
     y = area[1]
-    xscale = int((area[2] - area[0] + 1) / (self.data_obj.seq_control['disp_time'][1] - self.data_obj.seq_control['disp_time'][0]))
+    time_s, time_e = self.data_obj.seq_control['disp_time']
+    play_s, play_e = self.data_obj.seq_play_time
+    xscale = int((area[2] - area[0] + 1) / (time_e - time_s))
 
     # Draw time line
     M5.Lcd.drawLine(x, y, area[2], y, 0x00ff40)
-    if self.data_obj.seq_play_time[0] < self.data_obj.seq_play_time[1]:
+    if play_s < play_e:
       # Play time is on screen
-      if self.data_obj.seq_play_time[0] < self.data_obj.seq_control['disp_time'][1] and self.data_obj.seq_play_time[1] > self.data_obj.seq_control['disp_time'][0]:
-        ts = self.data_obj.seq_play_time[0] if self.data_obj.seq_play_time[0] > self.data_obj.seq_control['disp_time'][0] else self.data_obj.seq_control['disp_time'][0]
-        te = self.data_obj.seq_play_time[1] if self.data_obj.seq_play_time[1] < self.data_obj.seq_control['disp_time'][1] else self.data_obj.seq_control['disp_time'][1]
-        xs = x + (ts - self.data_obj.seq_control['disp_time'][0]) * xscale
-        xe = x + (te - self.data_obj.seq_control['disp_time'][0]) * xscale
+      if play_s < time_e and play_e > time_s:
+        ts = play_s if play_s > time_s else time_s
+        te = play_e if play_e < time_e else time_e
+        xs = x + (ts - time_s) * xscale
+        xe = x + (te - time_s) * xscale
         M5.Lcd.drawLine(xs, y, xe, y, 0xff40ff)
     # Play all
     else:
@@ -4634,12 +4791,14 @@ class view_sequencer_class(view_m5stack_core2):
     w = area[2] - area[0] + 1
     y = area[1]
     h = area[3] - area[1] + 1
-    xscale = int((area[2] - area[0] + 1) / (self.data_obj.seq_control['disp_time'][1] - self.data_obj.seq_control['disp_time'][0]))
+    time_s, time_e = self.data_obj.seq_control['disp_time']
+    time_per_bar = self.data_obj.seq_control['time_per_bar']
+    xscale = int((area[2] - area[0] + 1) / (time_e - time_s))
     M5.Lcd.fillRect(x, y, w, h, 0x222222)
-    for t in range(self.data_obj.seq_control['disp_time'][0] + 1, self.data_obj.seq_control['disp_time'][1]):
+    for t in range(time_s + 1, time_e):
       # Draw vertical line as a time grid
-      color = 0xffffff if t % self.data_obj.seq_control['time_per_bar'] == 0 else 0x60a060
-      x0 = x + (t - self.data_obj.seq_control['disp_time'][0]) * xscale
+      color = 0xffffff if t % time_per_bar == 0 else 0x60a060
+      x0 = x + (t - time_s) * xscale
       M5.Lcd.drawLine(x0, y, x0, area[3], color)
 
       # Signs on score
@@ -4934,8 +5093,7 @@ class view_sequencer_class(view_m5stack_core2):
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_TEXT, {'label': 'label_seq_parm_value', 'format': '{:03d}', 'value': prg_num})
 
   def func_SEQUENCER_PROGRAM_NAME_SET_TEXT(self, message_data = None):
-    prg = self.message_center.phone_message(self, self.message_center.MSGID_SEQUENCER_GET_PROGRAM_NAME)
-    prg = prg[:9]
+    prg = self.message_center.phone_message(self, self.message_center.MSGID_SEQUENCER_GET_PROGRAM_NAME, {'max_len': 9})
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_PROGRAM_SET_TEXT, {'value': prg})
 
   def func_SEQUENCER_VOLUME_RATIO_SET_TEXT(self, message_data = None):
@@ -4951,25 +5109,24 @@ class view_sequencer_class(view_m5stack_core2):
 
     # Draw time cursor
     self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_TIME_SET_TEXT)
-    if self.data_obj.seq_control['disp_time'][0] <= self.data_obj.seq_control['time_cursor'] and self.data_obj.seq_control['time_cursor'] <= self.data_obj.seq_control['disp_time'][1]:
+    seq_control = self.data_obj.seq_control
+    time_s, time_e = seq_control['disp_time']
+    time_cursor = seq_control['time_cursor']
+    if time_s <= time_cursor and time_cursor <= time_e:
+      color = 0xffff40 if disp_time else 0x222222
       for trknum in range(2):
         area = self.data_obj.seq_draw_area[trknum]
         x = area[0]
-        w = area[2] - area[0] + 1
         y = area[1]
-        h = area[3] - area[1] + 1
-        xscale = int((area[2] - area[0] + 1) / (self.data_obj.seq_control['disp_time'][1] - self.data_obj.seq_control['disp_time'][0]))
-
-        color = 0xffff40 if disp_time else 0x222222
-        M5.Lcd.fillRect(x + (self.data_obj.seq_control['time_cursor'] - self.data_obj.seq_control['disp_time'][0]) * xscale - 3, y - 3, 6, 3, color)
+        xscale = int((area[2] - area[0] + 1) / (time_e - time_s))
+        M5.Lcd.fillRect(x + (time_cursor - time_s) * xscale - 3, y - 3, 6, 3, color)
 
     # Draw key cursor
     area = self.data_obj.seq_draw_area[edit_track]
 
     # Draw a keyboard of the track
-    key_s = self.data_obj.seq_control['disp_key'][edit_track][0]
-    key_e = self.data_obj.seq_control['disp_key'][edit_track][1]
-    note_num = self.data_obj.seq_control['key_cursor'][edit_track]
+    key_s, key_e = seq_control['disp_key'][edit_track]
+    note_num = seq_control['key_cursor'][edit_track]
     if key_s <= note_num and note_num <= key_e:
       area = self.data_obj.seq_draw_area[edit_track]
       x = area[0] - 6
@@ -5038,26 +5195,8 @@ class view_sequencer_class(view_m5stack_core2):
   def func_SEQUENCER_SCREEN_VISIBILITY(self, message_data = None):
     visible = message_data['visible']
 
-    # SEQUENCER title labels
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'title_seq_track1', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'title_seq_track2', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'title_seq_file', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'title_seq_time', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'title_seq_master_volume', 'visible': visible})
-
-    # SEQUENCER data labels
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_track1', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_track2', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_key1', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_key2', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_file', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_file_op', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_time', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_master_volume', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_parm_name', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_parm_value', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_program1', 'visible': visible})
-    self.message_center.phone_message(self, self.message_center.VIEW_SEQUENCER_SET_VISIBLE, {'label': 'label_seq_program2', 'visible': visible})
+    # All labels of the view
+    self.labels_setVisible(visible)
 
     # Draw sequencer tracks
     if visible: